@@ -0,0 +1,216 @@
+"""An in-memory agent for the 1Password service account auth token.
+
+Fetching the token with `op` takes about a second and may ask for user
+confirmation. The agent fetches the token once and serves it to fetcher
+commands over a Unix socket, so consecutive commands skip `op`.
+
+The token lives only in the agent's memory and is forgotten after a TTL. The
+agent serves only processes of the same user, which it checks through the
+socket's peer credentials.
+
+Usage: findata-agent --help
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import tempfile
+import typing
+from pathlib import Path
+
+import click
+
+from . import op
+from .tracing import traced
+
+logger = logging.getLogger("fetcher.agent")
+
+SOCKET_NAME = "findata-agent.sock"
+# How long the agent keeps the token.
+TOKEN_TTL_SECONDS_DEFAULT = 8 * 60 * 60
+# How long a client waits for the agent before falling back to `op`.
+CLIENT_TIMEOUT_SECONDS = 5
+
+
+def default_socket_path() -> Path:
+    """Returns the agent's socket path in a directory private to the user."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / SOCKET_NAME
+    return Path(tempfile.gettempdir()) / f"findata-{os.getuid()}" / SOCKET_NAME
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Returns the user ID of the process on the other side of a Unix socket.
+
+    Raises:
+        Exception: If the platform doesn't support peer credentials.
+    """
+    if hasattr(socket, "SO_PEERCRED"):
+        # Linux: struct ucred { pid_t pid; uid_t uid; gid_t gid; }
+        creds = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")
+        )
+        _, uid, _ = struct.unpack("3i", creds)
+        return uid
+    if hasattr(socket, "LOCAL_PEERCRED"):
+        # macOS: struct xucred { u_int cr_version; uid_t cr_uid; ... }
+        SOL_LOCAL = 0
+        creds = sock.getsockopt(SOL_LOCAL, socket.LOCAL_PEERCRED, 76)
+        _, uid = struct.unpack("2I", creds[:8])
+        return uid
+    raise Exception("This platform doesn't support Unix socket peer credentials.")
+
+
+class Agent:
+    """Holds the token in memory and hands it out to authorized peers."""
+
+    def __init__(
+        self,
+        fetch_token: typing.Callable[[], typing.Awaitable[str]],
+        ttl_seconds: float = TOKEN_TTL_SECONDS_DEFAULT,
+        allowed_uid: int | None = None,
+    ):
+        self._fetch_token = fetch_token
+        self._ttl_seconds = ttl_seconds
+        self._allowed_uid = os.getuid() if allowed_uid is None else allowed_uid
+        self._token: str | None = None
+        self._lock = asyncio.Lock()
+
+    def _forget_token(self) -> None:
+        logger.info("The token has expired.")
+        self._token = None
+
+    async def get_token(self) -> str:
+        """Returns the token, fetching it if it's missing or has expired."""
+        async with self._lock:
+            if self._token is None:
+                self._token = await self._fetch_token()
+                asyncio.get_running_loop().call_later(
+                    self._ttl_seconds, self._forget_token
+                )
+            return self._token
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            uid = peer_uid(writer.get_extra_info("socket"))
+            if uid != self._allowed_uid:
+                logger.warning(f"Rejected a connection from user {uid}.")
+                return
+            try:
+                request = json.loads(await reader.readline())
+                if request.get("command") != "get_token":
+                    raise Exception(f"Unknown request: {request}.")
+                response = {"token": await self.get_token()}
+            except Exception as e:
+                logger.exception("Could not handle a request.")
+                response = {"error": str(e)}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: Path) -> None:
+        """Serves requests on the socket until cancelled."""
+        socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        socket_path.unlink(missing_ok=True)
+        # Create the socket with owner-only permissions.
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(
+                self.handle_connection, path=socket_path
+            )
+        finally:
+            os.umask(old_umask)
+        logger.info(f"Listening on {socket_path}.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+async def request(socket_path: Path, command: str) -> dict:
+    """Sends a request to the agent.
+
+    Raises:
+        OSError: If the agent is not running.
+        Exception: If the agent doesn't belong to the current user or fails.
+    """
+    async with asyncio.timeout(CLIENT_TIMEOUT_SECONDS):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        try:
+            if peer_uid(writer.get_extra_info("socket")) != os.getuid():
+                raise Exception("The agent belongs to a different user.")
+            writer.write(json.dumps({"command": command}).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+        finally:
+            writer.close()
+    if "error" in response:
+        raise Exception(f"The agent has failed: {response['error']}")
+    return response
+
+
+@traced
+async def fetch_token(socket_path: Path | None = None) -> str | None:
+    """Fetches the token from the agent.
+
+    :return: The token or None if the agent is not running or has failed.
+    """
+    try:
+        response = await request(socket_path or default_socket_path(), "get_token")
+    except OSError:
+        return None
+    except Exception:
+        logger.warning("Could not fetch the token from the agent.", exc_info=True)
+        return None
+    return response["token"]
+
+
+@click.command()
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=default_socket_path,
+    show_default="$XDG_RUNTIME_DIR/findata-agent.sock",
+    help="The Unix socket to listen on.",
+)
+@click.option(
+    "--ttl",
+    default=TOKEN_TTL_SECONDS_DEFAULT,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="The number of seconds to keep the token in memory.",
+)
+@click.option(
+    "--logtostderr/--no-logtostderr", default=False, help="Whether to log to STDERR."
+)
+def main(socket_path: Path, ttl: int, logtostderr: bool) -> None:
+    """Serves the 1Password service account auth token to fetcher commands.
+
+    Fetcher commands try the agent first and fall back to `op` if it's not
+    running.
+    """
+    logging.basicConfig(level=logging.INFO if logtostderr else logging.WARNING)
+    agent = Agent(op.fetch_service_account_auth_token, ttl_seconds=ttl)
+
+    async def run():
+        # Fetch the token upfront, so that `op` can ask for confirmation now.
+        await agent.get_token()
+        await agent.serve(socket_path)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
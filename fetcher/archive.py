@@ -0,0 +1,173 @@
+"""Outputs for fetched files: a plain directory or a content-addressed archive.
+
+Fetchers save statements and receipts under names that can collide, e.g., a
+receipt's subject, and they save the same document again on every run that
+sees it. The archive stores each distinct document once, under the SHA-256 of
+its content and gzip-compressed:
+
+    ARCHIVE/objects/ab/ab12...ef.gz
+    ARCHIVE/PROVIDER/NAME.gz -> ../objects/ab/ab12...ef.gz
+    ARCHIVE/manifest.sqlite3
+
+The symlinks give the documents readable names (read them with `zcat`), and
+the manifest lists every document with its provider, date, original name and
+hash in the order they were archived. Saving a document that the provider
+already has in the archive writes nothing, so repeated runs don't grow the
+archive, and downstream tools can read only the manifest rows after the last
+one they've seen instead of rescanning the directory.
+"""
+
+import contextlib
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import typing
+from pathlib import Path, PurePath
+
+logger = logging.getLogger("fetcher.archive")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY,
+    provider TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    link TEXT NOT NULL,
+    UNIQUE (provider, hash)
+);
+"""
+
+
+class OutputProtocol(typing.Protocol):
+    def save(
+        self,
+        provider: str,
+        name: str,
+        content: bytes,
+        day: datetime.date | None = None,
+    ) -> Path:
+        """Saves a fetched file and returns its path.
+
+        :param provider str: The provider, e.g., "galaxus".
+        :param name str: The file's name, e.g., "Ihre Bestellung 123.galaxus".
+        :param day datetime.date | None: The file's date. Defaults to today.
+        """
+        ...
+
+
+class DirectoryOutput:
+    """Saves files into a directory under their names."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def save(
+        self,
+        provider: str,
+        name: str,
+        content: bytes,
+        day: datetime.date | None = None,
+    ) -> Path:
+        path = self.directory / name
+        path.write_bytes(content)
+        return path
+
+
+def object_path(digest: str) -> PurePath:
+    """Returns the path of an object relative to the archive.
+
+    >>> object_path("ab12ef")
+    PurePosixPath('objects/ab/ab12ef.gz')
+    """
+    return PurePath("objects", digest[:2], f"{digest}.gz")
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+class Archive:
+    """A content-addressed archive of fetched files."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    @contextlib.contextmanager
+    def _manifest(self) -> typing.Iterator[sqlite3.Connection]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(
+            sqlite3.connect(self.directory / "manifest.sqlite3")
+        ) as connection:
+            connection.executescript(_SCHEMA)
+            with connection:
+                yield connection
+
+    def _link(self, provider: str, name: str, digest: str) -> PurePath:
+        """Links a readable name to the object and returns the link's path."""
+        obj = self.directory / object_path(digest)
+        stem, suffix = os.path.splitext(name)
+        for link in (
+            PurePath(provider, f"{name}.gz"),
+            # The name is taken by another document.
+            PurePath(provider, f"{stem}.{digest[:8]}{suffix}.gz"),
+        ):
+            path = self.directory / link
+            target = os.path.relpath(obj, path.parent)
+            if not os.path.lexists(path):
+                path.parent.mkdir(parents=True, exist_ok=True)
+                os.symlink(target, path)
+                return link
+            if os.readlink(path) == target:
+                # An interrupted save has left the link behind.
+                return link
+        raise Exception(f"Couldn't link {provider}/{name} to {digest}.")
+
+    def save(
+        self,
+        provider: str,
+        name: str,
+        content: bytes,
+        day: datetime.date | None = None,
+    ) -> Path:
+        """Archives a file unless the provider already has it.
+
+        :return Path: The readable link to the archived file.
+        """
+        if PurePath(name).name != name or PurePath(provider).name != provider:
+            raise Exception(f"Invalid archive name: {provider}/{name}.")
+        digest = hashlib.sha256(content).hexdigest()
+        with self._manifest() as manifest:
+            row = manifest.execute(
+                "SELECT link FROM entries WHERE provider = ? AND hash = ?",
+                (provider, digest),
+            ).fetchone()
+            if row:
+                logger.info(f"{provider}/{name} is already archived as {row[0]}.")
+                return self.directory / row[0]
+
+            obj = self.directory / object_path(digest)
+            if not obj.exists():
+                # Without a timestamp, the same content always compresses to
+                # the same object.
+                _write_atomically(obj, gzip.compress(content, mtime=0))
+            link = self._link(provider, name, digest)
+            manifest.execute(
+                "INSERT INTO entries (provider, hash, day, name, link) "
+                + "VALUES (?, ?, ?, ?, ?)",
+                (
+                    provider,
+                    digest,
+                    (day or datetime.date.today()).isoformat(),
+                    name,
+                    str(link),
+                ),
+            )
+        logger.info(f"Archived {provider}/{name} as {link}.")
+        return self.directory / link
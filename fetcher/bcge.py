@@ -1,5 +1,6 @@
 """Downloads account statement from BCGE using Playwright."""
 import asyncio
+import datetime
 import logging
 from typing import NamedTuple
 
@@ -8,8 +9,11 @@ import playwright.async_api
 
 from . import op
 from .playwrightutils import intercept_download
+from .tracing import traced
 
 LOGIN_PAGE = 'https://www.bcge.ch/authen/login?lang=de'
+# The first day of the account history that I keep.
+HISTORY_START = datetime.date(2023, 7, 1)
 
 
 class Credentials(NamedTuple):
@@ -20,11 +24,12 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches the credentials from my 1Password vault."""
     item = "bcge.ch"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"])
     return Credentials(id=username, pwd=password)
 
 
+@traced
 async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     """Logs in to Charles Schwab.
 
@@ -44,25 +49,32 @@ async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     await page.wait_for_url('https://connect.bcge.ch/')
 
 
-async def trigger_statement_export(page: playwright.async_api.Page) -> None:
+@traced
+async def trigger_statement_export(page: playwright.async_api.Page,
+                                   start: datetime.date) -> None:
+    """Exports the account's transactions from `start` until today."""
     iframe = page.frame_locator("iframe")
     await iframe.get_by_role("button", name="Bewegungen ansehen").click()
     await iframe.get_by_role("button", name="Herunterladen").click()
     await iframe.get_by_text("Mit Strichpunkt getrennt (CSV)").click()
     await iframe.get_by_text("Saldo zu jeder Buchung").click()
     await iframe.get_by_text('Von').click()
-    await page.keyboard.type("01.07.2023")
+    await page.keyboard.type(start.strftime("%d.%m.%Y"))
     await asyncio.sleep(1)
     await iframe.get_by_role("button", name="Jetzt herunterladen").click()
 
 
-async def fetch_account_statement(page: playwright.async_api.Page,
-                                  creds: Credentials) -> bytes:
+@traced
+async def fetch_account_statement(
+        page: playwright.async_api.Page,
+        creds: Credentials,
+        start: datetime.date = HISTORY_START) -> bytes:
     """
     Fetches BCGE's account statement.
 
     :param page playwright.async_api.Page: A blank page.
     :param creds Credentials
+    :param start datetime.date: The first day of the statement.
     :rtype bytes: A CSV UTF-8 encoded string with the fetched
         statement.
     """
@@ -71,6 +83,6 @@ async def fetch_account_statement(page: playwright.async_api.Page,
     logging.info("Logged in to BCGE.")
     logging.info("Triggerring statement export.")
     async with intercept_download(page) as download:
-        await trigger_statement_export(page)
+        await trigger_statement_export(page, start)
     logging.info("Finished downloading the account statement.")
     return download.downloaded_content().decode('latin-1').encode('utf-8')
@@ -1,13 +1,18 @@
 """Fetches the latest account statement from Viseca."""
 import logging
 import re
-from typing import NamedTuple
+from typing import Any, NamedTuple, Optional
 
 import playwright.async_api
 
 from fetcher import playwrightutils
 
 from . import op
+from .tracing import traced
+
+# The Rechnungen tab loads the list of bills from this endpoint.
+STATEMENTS_API_URL = re.compile(
+    r'^https://api\.one\.viseca\.ch/.*/statements(?:\?|$)')
 
 
 class Credentials(NamedTuple):
@@ -18,11 +23,12 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches credentials from my 1Password vault."""
     item = "Viseca One"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"])
     return Credentials(id=username, pwd=password)
 
 
+@traced
 async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     LOGIN_PAGE = 'https://one.viseca.ch/login/login'
     logging.info("Logging in to Viseca.")
@@ -34,6 +40,7 @@ async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     logging.info("Logged in to Viseca.")
 
 
+@traced
 async def go_to_rechnungen(page: playwright.async_api.Page) -> None:
     """Goes to the Rechnungen page.
 
@@ -41,8 +48,37 @@ async def go_to_rechnungen(page: playwright.async_api.Page) -> None:
     """
     await page.get_by_role("link", name="Rechnungen", exact=True).click()
     await page.wait_for_url('https://one.viseca.ch/de/rechnungen')
-    # Wait till bill items are visible.
-    await page.locator('div.transactions-statistic').wait_for()
+
+
+def parse_statement_count(payload: Any) -> Optional[int]:
+    """Extracts the number of statements from a statements API payload.
+
+    The statements are the payload itself or its top-level `statements` list.
+
+    >>> parse_statement_count({'statements': [{'id': 1}, {'id': 2}]})
+    2
+    >>> parse_statement_count({'cards': [{'statements': []}]}) is None
+    True
+    """
+    if isinstance(payload, dict):
+        payload = payload.get('statements')
+    return len(payload) if isinstance(payload, list) else None
+
+
+def is_card_bill(text: Optional[str]) -> bool:
+    """Checks whether a statistic table's text describes a card bill.
+
+    >>> is_card_bill('Rechnung vom 20.05.2024 Karte 1107')
+    True
+    >>> is_card_bill('Gutschrift Karte 1107')
+    False
+    """
+    return (text is not None and re.search('Rechnung', text) is not None
+            and re.search('1107', text) is not None)
+
+
+class StatisticTable(NamedTuple):
+    text: Optional[str]
 
 
 async def get_bill_table_items(
@@ -51,9 +87,15 @@ async def get_bill_table_items(
 
     Assumes we are on the Rechnungen tab.
     """
-    return await (page.locator('div.statistic-table').filter(
-        has_text=re.compile('.*Rechnung.*')).filter(
-            has_text=re.compile('.*1107.*')).all())
+    # Wait till bill items are visible.
+    await page.locator('div.transactions-statistic').wait_for()
+    tables = page.locator('div.statistic-table')
+    texts = await playwrightutils.extract_all(
+        tables, StatisticTable, {'text': playwrightutils.Field()})
+    return [
+        tables.nth(i) for i, table in enumerate(texts)
+        if is_card_bill(table.text)
+    ]
 
 
 async def download_bill(
@@ -70,14 +112,30 @@ async def download_bill(
     return download.downloaded_content()
 
 
+@traced
 async def find_and_download_latest_statement(
         page: playwright.async_api.Page) -> bytes:
-    await go_to_rechnungen(page)
-    bill_table_items = await get_bill_table_items(page)
-    if not bill_table_items:
+    """Downloads the latest bill.
+
+    The bill list payload tells whether there are any statements before the
+    page renders them, so we don't wait for the whole statistics panel when
+    there are none. The payload doesn't tell card bills from other statements,
+    so the bill to download is picked from the rendered page.
+    """
+
+    async def count_rendered_bills() -> int:
+        return len(await get_bill_table_items(page))
+
+    async with playwrightutils.capture_json_response(
+            page, STATEMENTS_API_URL, parse_statement_count) as bill_count:
+        await go_to_rechnungen(page)
+        if not await playwrightutils.race_capture(bill_count,
+                                                  count_rendered_bills):
+            raise Exception("No bill items found on the Rechnungen tab.")
+    bills = await get_bill_table_items(page)
+    if not bills:
         raise Exception("No bill items found on the Rechnungen tab.")
-    latest_bill_table_item = bill_table_items[0]
-    return await download_bill(page, latest_bill_table_item)
+    return await download_bill(page, bills[0])
 
 
 async def login_and_download_latest_statement(page: playwright.async_api.Page,
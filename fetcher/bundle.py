@@ -0,0 +1,107 @@
+"""A single-file output for the receipts of one run.
+
+A backfill fetches thousands of receipts, and saving each one to its own file
+costs a file creation and a flush apiece. A bundle streams all of them into one
+gzip-compressed tar file instead, PROVIDER/NAME per receipt, and ends with an
+`index.json` member that lists every receipt with its provider, name, date,
+size and SHA-256.
+
+The bundle is written to a temporary file next to its path and renamed into
+place only once it's complete, so a failed run leaves no partial bundle. Its
+receipts can be listed with `tar -tzf` and extracted with `tar -xzf`.
+"""
+
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import logging
+import os
+import tarfile
+import typing
+from pathlib import Path
+
+logger = logging.getLogger("fetcher.bundle")
+
+INDEX_MEMBER = "index.json"
+
+
+class Bundle:
+    """An output that appends the saved files to a tar stream."""
+
+    def __init__(self, path: Path, tar: tarfile.TarFile):
+        self.path = path
+        self._tar = tar
+        self._index: list[dict[str, typing.Any]] = []
+        # The member of every content digest.
+        self._members_by_digest: dict[str, str] = {}
+        self._members: set[str] = set()
+
+    def _add_member(self, name: str, content: bytes) -> None:
+        info = tarfile.TarInfo(name)
+        info.size = len(content)
+        info.mtime = int(datetime.datetime.now().timestamp())
+        info.mode = 0o644
+        self._tar.addfile(info, io.BytesIO(content))
+
+    def save(
+        self,
+        provider: str,
+        name: str,
+        content: bytes,
+        day: datetime.date | None = None,
+    ) -> Path:
+        """Appends a file to the bundle unless it has the same content already.
+
+        :return Path: The bundle's path joined with the file's member name.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        member = f"{provider}/{name}"
+        if existing := self._members_by_digest.get(digest):
+            logger.info(f"{member} is already in {self.path} as {existing}.")
+            return self.path / existing
+        if member in self._members:
+            stem, suffix = os.path.splitext(name)
+            member = f"{provider}/{stem}.{digest[:8]}{suffix}"
+        self._add_member(member, content)
+        self._members_by_digest[digest] = member
+        self._members.add(member)
+        self._index.append(
+            {
+                "member": member,
+                "provider": provider,
+                "name": name,
+                "day": (day or datetime.date.today()).isoformat(),
+                "size": len(content),
+                "sha256": digest,
+            }
+        )
+        return self.path / member
+
+    def finish(self) -> None:
+        """Appends the index. Nothing can be saved afterwards."""
+        self._add_member(
+            INDEX_MEMBER, json.dumps(self._index, ensure_ascii=False).encode()
+        )
+        logger.info(f"Bundled {len(self._index)} files into {self.path}.")
+
+
+@contextlib.contextmanager
+def write_bundle(path: Path) -> typing.Iterator[Bundle]:
+    """Writes a bundle that appears at the path only if the block succeeds."""
+    if path.exists():
+        raise Exception(f"{path} already exists.")
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            with tarfile.open(fileobj=f, mode="w|gz") as tar:
+                bundle = Bundle(path, tar)
+                yield bundle
+                bundle.finish()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,153 @@
+"""Plumbing shared by the fetcher's Click commands."""
+
+import asyncio
+import contextlib
+import sys
+import typing
+from pathlib import Path
+
+import click
+import playwright.async_api
+
+from . import agent, gmail, op, playwrightutils, tracing
+from .archive import Archive, DirectoryOutput, OutputProtocol
+from .bundle import write_bundle
+from .playwrightutils import Browser
+from .receipts import IndexingOutput, ReceiptIndex
+from .statements import FORMATS, Statement, write_statement
+from .watermarks import WatermarkStore
+
+ARCHIVE_DIRECTORY_CFG_KEY = "archive_directory"
+DATE_TYPE = click.DateTime(formats=["%Y-%m-%d"])
+
+full_option = click.option(
+    "--full",
+    is_flag=True,
+    default=False,
+    help="Ignores the watermark of the last fetch and fetches the default range.",
+)
+
+bundle_option = click.option(
+    "--bundle",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Saves the run's receipts into this new tar.gz file instead of one file "
+    + "per receipt. Emails are archived only once the bundle is complete.",
+)
+
+format_option = click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["raw", *FORMATS]),
+    default="raw",
+    show_default=True,
+    help="Outputs the provider's own format, or its records normalized into "
+    + "JSON lines.",
+)
+
+
+def write_stdout(data: bytes) -> None:
+    """Writes the data to stdout and flushes it.
+
+    A failed write, e.g., to a closed pipe, raises here instead of at exit, so
+    that commands don't record a watermark for output that got lost.
+    """
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+
+
+def write_statement_output(
+    output_format: str, raw: bytes, normalize: typing.Callable[[bytes], Statement]
+) -> None:
+    """Writes the raw output or its normalized records to stdout."""
+    if output_format == "raw":
+        write_stdout(raw)
+    else:
+        write_statement(normalize(raw), output_format, sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+
+
+def read_config_from_context(ctx):
+    return ctx.obj["config"]
+
+
+def read_watermarks_from_context(ctx) -> WatermarkStore:
+    return WatermarkStore(ctx.obj["watermarks_file"])
+
+
+def read_output_from_context(
+    ctx, download_directory: Path | None = None
+) -> OutputProtocol:
+    """Returns where to save fetched files.
+
+    That's the archive if the config has one. Otherwise, it's the download
+    directory, which defaults to the config's.
+    """
+    config = read_config_from_context(ctx)
+    if archive_directory := config.get(ARCHIVE_DIRECTORY_CFG_KEY):
+        return Archive(Path(archive_directory))
+    return DirectoryOutput(download_directory or Path(config["download_directory"]))
+
+
+@contextlib.contextmanager
+def open_receipt_output(
+    ctx, inbox: gmail.InboxProtocol, bundle: Path | None = None
+) -> typing.Iterator[tuple[OutputProtocol, gmail.InboxProtocol]]:
+    """Yields the output for receipts and the inbox to fetch them from.
+
+    The output also indexes the receipts. With a bundle, the yielded inbox
+    archives emails only after the bundle is complete.
+    """
+    index = ctx.with_resource(
+        contextlib.closing(ReceiptIndex(ctx.obj["receipts_index"]))
+    )
+    if bundle is None:
+        yield IndexingOutput(read_output_from_context(ctx), index), inbox
+        return
+    deferred_inbox = gmail.DeferredArchiveInbox(inbox)
+    with write_bundle(bundle) as output:
+        yield IndexingOutput(output, index), deferred_inbox
+    deferred_inbox.commit()
+
+
+C = typing.TypeVar("C")
+
+
+@contextlib.asynccontextmanager
+async def new_page_with_credentials(
+    fetch_credentials: typing.Callable[[op.OpSdkClient], typing.Awaitable[C]],
+    browser_type: Browser,
+    headless: bool = False,
+    downloads_path: Path | None = None,
+) -> typing.AsyncIterator[tuple[playwright.async_api.Page, C, op.OpSdkClient]]:
+    """Opens a new page and fetches credentials concurrently.
+
+    Launching the browser and fetching credentials take seconds each, so they
+    overlap instead of running one after the other.
+
+    :param fetch_credentials: A provider's `fetch_credentials` function.
+    :return: The page, the credentials and the 1Password client.
+    """
+
+    async def connect_and_fetch_credentials() -> tuple[op.OpSdkClient, C]:
+        op_client = await connect_op()
+        return op_client, await fetch_credentials(op_client)
+
+    credentials_task = asyncio.create_task(connect_and_fetch_credentials())
+    try:
+        async with playwrightutils.new_page(
+            browser_type, headless=headless, downloads_path=downloads_path
+        ) as page:
+            op_client, credentials = await credentials_task
+            yield page, credentials, op_client
+    finally:
+        credentials_task.cancel()
+
+
+async def connect_op() -> op.OpSdkClient:
+    with tracing.span("op.fetch_token"):
+        op_service_account_auth_token = (
+            await agent.fetch_token() or await op.fetch_service_account_auth_token()
+        )
+    return await op.OpSdkClient.connect(
+        service_account_auth_token=op_service_account_auth_token
+    )
@@ -0,0 +1,5 @@
+"""The fetcher's Click commands, one module per provider.
+
+The modules are imported lazily by `fetcher.tool`, so every command in this
+package has to be registered in `fetcher.tool.COMMANDS`.
+"""
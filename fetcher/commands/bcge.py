@@ -0,0 +1,45 @@
+"""BCGE commands."""
+
+import asyncio
+import datetime
+from pathlib import PurePath
+
+import click
+
+from .. import bcge
+from ..cliutils import (
+    full_option,
+    new_page_with_credentials,
+    read_config_from_context,
+    read_watermarks_from_context,
+    write_stdout,
+)
+from ..dateutils import DateRange
+from ..playwrightutils import Browser
+
+
+@click.command()
+@full_option
+@click.pass_context
+def pull_bcge(ctx, full: bool) -> None:
+    """Fetches BCGE data and outputs a CSV file.
+
+    The statement starts a week before the last fetch, or on the first day of
+    the kept history with --full.
+    """
+    config = read_config_from_context(ctx)
+    download_directory = PurePath(config["download_directory"])
+    watermarks = read_watermarks_from_context(ctx)
+    window = watermarks.window(
+        "bcge", DateRange(bcge.HISTORY_START, datetime.date.today()), full
+    )
+
+    async def run():
+        async with new_page_with_credentials(
+            bcge.fetch_credentials, Browser.CHROMIUM, downloads_path=download_directory
+        ) as (p, credentials, _):
+            statement = await bcge.fetch_account_statement(p, credentials, window.start)
+        write_stdout(statement)
+
+    asyncio.run(run())
+    watermarks.record("bcge", window)
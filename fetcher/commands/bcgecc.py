@@ -0,0 +1,24 @@
+"""BCGE credit card commands."""
+
+import asyncio
+import sys
+
+import click
+
+from .. import bcgecc
+from ..cliutils import new_page_with_credentials
+from ..playwrightutils import Browser
+
+
+@click.command()
+def pull_bcgecc() -> None:
+    """Fetches BCGE CC data and outputs a PDF."""
+
+    async def run():
+        async with new_page_with_credentials(
+            bcgecc.fetch_credentials, Browser.FIREFOX
+        ) as (p, creds, _):
+            statement = await bcgecc.login_and_download_latest_statement(p, creds)
+        sys.stdout.buffer.write(statement)
+
+    asyncio.run(run())
@@ -0,0 +1,18 @@
+"""Coop Supercard commands."""
+
+import click
+
+from .. import coop_supercard
+
+
+@click.command()
+def coop_supercard_pull() -> None:
+    """Fetches Coop receipt PDFs from coop.ch.
+
+    This command saves `receipt *.pdf` files to the download directory.
+
+    This command just opens the Coop page in the default browser.
+    Coop starter blocking Playwright (and presumably other automation) in late
+    2024.
+    """
+    coop_supercard.fetch_receipts_manually()
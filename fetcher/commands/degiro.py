@@ -0,0 +1,158 @@
+"""Degiro commands."""
+
+import asyncio
+import datetime
+import logging
+from pathlib import Path
+
+import click
+
+from .. import dateutils, degiro, playwrightutils
+from ..cliutils import (
+    DATE_TYPE,
+    full_option,
+    new_page_with_credentials,
+    read_output_from_context,
+    read_watermarks_from_context,
+    write_stdout,
+)
+from ..playwrightutils import Browser
+
+# Window lengths in months.
+WINDOWS = {"month": 1, "quarter": 3, "year": 12}
+# The watermark of account statements. Portfolio statements are snapshots.
+ACCOUNT_WATERMARK = "degiro.account"
+
+
+@click.command()
+@full_option
+@click.pass_context
+def degiro_account_pull(ctx, full: bool) -> None:
+    """Fetches Degiro's account statement and outputs a CSV file.
+
+    The statement starts a week before the last fetch, or three months ago with
+    --full.
+    """
+    watermarks = read_watermarks_from_context(ctx)
+    window = watermarks.window(
+        ACCOUNT_WATERMARK, degiro.get_default_window(datetime.date.today()), full
+    )
+    asyncio.run(degiro_pull_single(degiro.StatementType.ACCOUNT, window))
+    watermarks.record(ACCOUNT_WATERMARK, window)
+
+
+@click.command()
+def degiro_portfolio_pull() -> None:
+    """Fetches Degiro's portfolio statement and outputs a CSV file."""
+    asyncio.run(degiro_pull_single(degiro.StatementType.PORTFOLIO))
+
+
+@click.command()
+@click.option(
+    "--statement",
+    "statements",
+    multiple=True,
+    type=click.Choice([t.name for t in degiro.StatementType], case_sensitive=False),
+    help="The statement to fetch. Can be repeated (default: all).",
+)
+@click.option(
+    "--from-date",
+    type=DATE_TYPE,
+    help="The first day of account statements "
+    + "(default: a week before the last fetch or three months ago).",
+)
+@click.option(
+    "--to-date",
+    type=DATE_TYPE,
+    help="The last day of account statements (default: today).",
+)
+@click.option(
+    "--window",
+    type=click.Choice(list(WINDOWS)),
+    help="Splits account statements into calendar windows of this length.",
+)
+@click.option(
+    "--download-directory",
+    help="The target download directory (default: the config's). "
+    + "Ignored if the config has an archive.",
+    type=click.Path(exists=True, file_okay=False, writable=True),
+)
+@click.option(
+    "--max-concurrency",
+    default=playwrightutils.DEFAULT_MAX_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="The maximum number of statements to export concurrently.",
+)
+@full_option
+@click.pass_context
+def degiro_pull(
+    ctx,
+    statements: tuple[str, ...],
+    from_date,
+    to_date,
+    window: str | None,
+    download_directory,
+    max_concurrency: int,
+    full: bool,
+) -> None:
+    """Fetches multiple Degiro statements with a single login.
+
+    The statements are saved as degiro_account_FROM_TO.csv and
+    degiro_portfolio_TODAY.csv.
+
+    Example use:
+
+        degiro-pull --statement=account --from-date=2024-01-01 --window=month \\
+          --download-directory=.
+    """
+    today = datetime.date.today()
+    watermarks = read_watermarks_from_context(ctx)
+    default_window = degiro.get_default_window(today)
+    if not from_date:
+        default_window = watermarks.window(ACCOUNT_WATERMARK, default_window, full)
+    start = from_date.date() if from_date else default_window.start
+    end = to_date.date() if to_date else default_window.end
+    windows = (
+        dateutils.split_by_months(start, end, WINDOWS[window])
+        if window
+        else [dateutils.DateRange(start, end)]
+    )
+    statement_types = [degiro.StatementType[s.upper()] for s in statements] or list(
+        degiro.StatementType
+    )
+    requests = degiro.make_statement_requests(statement_types, windows)
+    output = read_output_from_context(
+        ctx, Path(download_directory) if download_directory else None
+    )
+
+    async def run():
+        async with new_page_with_credentials(
+            degiro.fetch_credentials, Browser.FIREFOX, headless=False
+        ) as (page, creds, op_client):
+            await degiro.login(page, creds, op_client)
+            statements = await degiro.fetch_statements(
+                page.context, requests, max_concurrency
+            )
+        for request, statement in zip(requests, statements, strict=True):
+            path = output.save(
+                "degiro", degiro.statement_filename(request, today), statement, today
+            )
+            logging.info(f"Saved {path}.")
+
+    asyncio.run(run())
+    if degiro.StatementType.ACCOUNT in statement_types:
+        watermarks.record(ACCOUNT_WATERMARK, dateutils.DateRange(start, end))
+
+
+async def degiro_pull_single(
+    statement_type: degiro.StatementType,
+    window: dateutils.DateRange | None = None,
+) -> None:
+    async with new_page_with_credentials(
+        degiro.fetch_credentials, Browser.FIREFOX, headless=False
+    ) as (page, creds, op_client):
+        await degiro.login(page, creds, op_client)
+        statement = await degiro.fetch_statement(page, statement_type, window)
+
+    write_stdout(statement)
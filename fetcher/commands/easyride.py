@@ -0,0 +1,23 @@
+"""EasyRide commands."""
+
+import asyncio
+
+import click
+
+from .. import easyride, gmail
+from ..cliutils import connect_op, read_output_from_context
+
+
+@click.command()
+@click.pass_context
+def pull_easyride_receipts(ctx) -> None:
+    """Fetches EasyRide receipt PDFs."""
+    output = read_output_from_context(ctx)
+
+    async def run():
+        easyride.fetch_and_archive_receipts(
+            await gmail.fetch_credentials(await connect_op()),
+            output,
+        )
+
+    asyncio.run(run())
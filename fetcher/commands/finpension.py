@@ -0,0 +1,33 @@
+"""Finpension commands."""
+
+import asyncio
+import datetime
+
+import click
+
+from .. import finpension, statements
+from ..cliutils import format_option, new_page_with_credentials, write_statement_output
+from ..playwrightutils import Browser
+
+
+@click.command()
+@format_option
+def pull_finpension(output_format: str) -> None:
+    """Prints Finpension’s portfolio total.
+
+    It will print a line with the value like "12123.12\n"."""
+
+    async def run():
+        async with new_page_with_credentials(
+            finpension.fetch_credentials, Browser.FIREFOX, headless=False
+        ) as (page, creds, _):
+            value = await finpension.login_and_fetch_current_total(page, creds)
+        write_statement_output(
+            output_format,
+            f"{value}\n".encode(),
+            lambda raw: statements.from_finpension(
+                raw.decode().strip(), datetime.date.today()
+            ),
+        )
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+"""Digitec-Galaxus commands."""
+
+import asyncio
+import contextlib
+from pathlib import Path
+
+import click
+
+from .. import galaxus, gmail
+from ..cliutils import bundle_option, connect_op, open_receipt_output
+
+
+@click.command()
+@bundle_option
+@click.pass_context
+def pull_galaxus(ctx, bundle: Path | None) -> None:
+    """Fetches Digitec-Galaxus receipts in text format."""
+
+    async def run():
+        with contextlib.closing(
+            gmail.connect(await gmail.fetch_credentials(await connect_op()))
+        ) as inbox:
+            with open_receipt_output(ctx, inbox, bundle) as (output, inbox):
+                for bill in galaxus.fetch_and_archive_bills(inbox):
+                    output.save(
+                        "galaxus", bill.subject + ".galaxus", bill.payload.encode()
+                    )
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+"""Google Play commands."""
+
+import asyncio
+import contextlib
+from pathlib import Path
+
+import click
+
+from .. import gmail, google_play_mail
+from ..cliutils import bundle_option, connect_op, open_receipt_output
+
+
+@click.command()
+@bundle_option
+@click.pass_context
+def pull_google_play_mail(ctx, bundle: Path | None) -> None:
+    """Fetches Google Play receipts in text format."""
+
+    async def run():
+        with contextlib.closing(
+            gmail.connect(await gmail.fetch_credentials(await connect_op()))
+        ) as inbox:
+            with open_receipt_output(ctx, inbox, bundle) as (output, inbox):
+                for bill in google_play_mail.fetch_and_archive_bills(inbox):
+                    output.save(
+                        "google_play", bill.subject + ".email", bill.payload.encode()
+                    )
+
+    asyncio.run(run())
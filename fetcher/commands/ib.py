@@ -0,0 +1,238 @@
+"""Interactive Brokers commands."""
+
+import asyncio
+import csv
+import datetime
+import decimal
+import sys
+import tempfile
+import typing
+from pathlib import Path
+
+import click
+
+from .. import ib, playwrightutils
+from ..cliutils import (
+    DATE_TYPE,
+    full_option,
+    new_page_with_credentials,
+    read_watermarks_from_context,
+    write_stdout,
+)
+from ..dateutils import DateRange
+from ..playwrightutils import Browser
+
+ACTIVITY_WATERMARK = "ib.activity"
+
+
+@click.command()
+@click.pass_context
+@click.option("--amount", required=True)
+@click.argument("wire_instructions_csv", type=click.File("r"))
+def cs_send_wire_to_ib(ctx, amount: str, wire_instructions_csv: typing.TextIO) -> None:
+    """Sends a wire transfer to Interactive Brokers.
+
+    Example use:
+
+        cs-send-wire-to-ib --amount=21.37 WIRE_INSTRUCTIONS_CSV
+    """
+    raise NotImplementedError()
+
+
+def decode_ib_wire_instructions(csvf: typing.TextIO) -> dict[str, str]:
+    """
+    Decodes IB wire instructions
+
+    :param csv typing.TextIO
+    :rtype dict[str, str]
+    """
+    result = dict()
+    for row in csv.DictReader(csvf):
+        result[row["key"]] = row["value"]
+    return result
+
+
+@click.command()
+def ib_cancel_pending_deposits() -> None:
+    """Cancels all pending deposits.
+
+    Outputs a CSV with wire instructions.
+
+    Example use:
+
+        ib-cancel-pending-deposits
+    """
+
+    async def run():
+        async with new_page_with_credentials(
+            ib.fetch_credentials, Browser.FIREFOX, headless=False
+        ) as (page, credentials, _):
+            await ib.login(page, credentials)
+            await ib.cancel_pending_deposits(page)
+
+    asyncio.run(run())
+
+
+@click.command()
+@full_option
+@click.pass_context
+def ib_activity_pull(ctx, full: bool) -> None:
+    """Pulls Interactive Brokers' activity statement.
+
+    The statement starts a week before the last pull, or a quarter ago with
+    --full. Outputs the statement CSV to stdout.
+    """
+    today = datetime.date.today()
+    watermarks = read_watermarks_from_context(ctx)
+    window = watermarks.window(
+        ACTIVITY_WATERMARK, DateRange(ib.quarter_ago(today), today), full
+    )
+    # The last pull may be older than the longest statement the portal allows.
+    windows = ib.split_into_statement_windows(window.start, window.end)
+    downloads_path = Path("/tmp")
+
+    async def run():
+        async with new_page_with_credentials(
+            ib.fetch_credentials,
+            Browser.FIREFOX,
+            headless=False,
+            downloads_path=downloads_path,
+        ) as (page, credentials, _):
+            await ib.login(page, credentials)
+            if len(windows) == 1:
+                statement = await ib.fetch_statement(
+                    page, ib.StatementType.ACTIVITY, window
+                )
+            else:
+                with tempfile.TemporaryDirectory() as statements_directory:
+                    statement = ib.stitch_activity_statements(
+                        await ib.fetch_statements(
+                            page.context,
+                            ib.StatementType.ACTIVITY,
+                            windows,
+                            Path(statements_directory),
+                        )
+                    )
+            write_stdout(statement)
+
+    asyncio.run(run())
+    watermarks.record(ACTIVITY_WATERMARK, window)
+
+
+@click.command()
+@click.option(
+    "--from-date",
+    required=True,
+    type=DATE_TYPE,
+    help="The first day of the backfill.",
+)
+@click.option(
+    "--to-date",
+    type=DATE_TYPE,
+    help="The last day of the backfill (default: today).",
+)
+@click.option(
+    "--max-concurrency",
+    default=playwrightutils.DEFAULT_MAX_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="The maximum number of statements to download concurrently.",
+)
+def ib_activity_backfill(from_date, to_date, max_concurrency: int) -> None:
+    """Pulls Interactive Brokers' activity statement for any date range.
+
+    The range is split into windows accepted by the portal. The window
+    statements are stitched into one CSV, which is output to stdout.
+
+    Example use:
+
+        ib-activity-backfill --from-date=2020-01-01 > activity.csv
+    """
+    start = from_date.date()
+    end = to_date.date() if to_date else datetime.date.today()
+    if start > end:
+        raise click.BadParameter(
+            f"{start} is after the last day {end}.", param_hint="--from-date"
+        )
+    windows = ib.split_into_statement_windows(start, end)
+    downloads_path = Path("/tmp")
+
+    async def run(statements_directory: Path) -> list[Path]:
+        async with new_page_with_credentials(
+            ib.fetch_credentials,
+            Browser.FIREFOX,
+            headless=False,
+            downloads_path=downloads_path,
+        ) as (page, credentials, _):
+            await ib.login(page, credentials)
+            return await ib.fetch_statements(
+                page.context,
+                ib.StatementType.ACTIVITY,
+                windows,
+                statements_directory,
+                max_concurrency,
+            )
+
+    # The window statements are saved to disk and stitched from there, so that
+    # a multi-year backfill isn't held in memory.
+    with tempfile.TemporaryDirectory() as statements_directory:
+        statements = asyncio.run(run(Path(statements_directory)))
+        write_stdout(ib.stitch_activity_statements(statements))
+
+
+@click.command()
+@click.option(
+    "--source", required=True, type=click.Choice(["CS", "BCGE"], case_sensitive=False)
+)
+@click.option("--amount", required=True)
+def ib_set_up_incoming_deposit(source, amount) -> None:
+    """Sets up an incoming deposit on Interactive Brokers.
+
+    Outputs a CSV with wire instructions.
+
+    Example use:
+
+        ib-set-up-incoming-deposit --source=cs --amount=21.37
+    """
+    ib_source: ib.DepositSource = (
+        ib.DepositSource.BCGE if source == "BCGE" else ib.DepositSource.CHARLES_SCHWAB
+    )
+
+    async def run() -> ib.SourceBankDepositInformation:
+        async with new_page_with_credentials(
+            ib.fetch_credentials, Browser.FIREFOX, headless=False
+        ) as (page, credentials, _):
+            await ib.login(page, credentials)
+            instructions: ib.SourceBankDepositInformation = await ib.deposit(
+                page, ib_source, decimal.Decimal(amount)
+            )
+            return instructions
+
+    instructions = asyncio.run(run())
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=["key", "value"], delimiter=",")
+    writer.writeheader()
+    writer.writerow(
+        {
+            "key": "transfer_to",
+            "value": instructions.transfer_to,
+        }
+    )
+    writer.writerow(
+        {
+            "key": "iban",
+            "value": instructions.iban,
+        }
+    )
+    writer.writerow(
+        {
+            "key": "beneficiary_bank",
+            "value": instructions.beneficiary_bank,
+        }
+    )
+    writer.writerow(
+        {
+            "key": "for_further_credit",
+            "value": instructions.for_further_credit,
+        }
+    )
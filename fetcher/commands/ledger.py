@@ -0,0 +1,63 @@
+"""Commands for the per-account ledgers of statement rows."""
+
+import contextlib
+import csv
+import sys
+import typing
+
+import click
+
+from ..ledger import Ledger, parse_statement
+
+
+@click.command()
+@click.argument("account")
+@click.argument("statement", type=click.File("rb"), default="-")
+@click.option(
+    "--delimiter",
+    default=",",
+    show_default=True,
+    help="The statement's field delimiter, e.g., ';' for mBank.",
+)
+@click.option(
+    "--header-rows",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="The number of header rows at the top of the statement.",
+)
+@click.pass_context
+def ledger_merge(
+    ctx, account: str, statement: typing.BinaryIO, delimiter: str, header_rows: int
+) -> None:
+    """Merges a CSV statement into the account's ledger.
+
+    Reads the statement from STATEMENT or STDIN and adds only the rows that the
+    ledger doesn't have yet, e.g.:
+
+        fetcher pull-bcge | fetcher ledger-merge bcge
+    """
+    header, rows = parse_statement(statement.read(), header_rows, delimiter)
+    with contextlib.closing(
+        Ledger.open(ctx.obj["ledger_directory"], account)
+    ) as ledger:
+        added = ledger.merge(header, rows, delimiter)
+        click.echo(f"Added {added} of {len(rows)} rows to {account}.", err=True)
+
+
+@click.command()
+@click.argument("account")
+@click.pass_context
+def ledger_export(ctx, account: str) -> None:
+    """Outputs the ledger rows added since the last export as a CSV file.
+
+    The header rows come first. Rows are exported once, unless the export fails.
+    """
+    with contextlib.closing(
+        Ledger.open(ctx.obj["ledger_directory"], account)
+    ) as ledger:
+        with ledger.export() as rows:
+            writer = csv.writer(sys.stdout, delimiter=ledger.delimiter)
+            writer.writerows(ledger.header)
+            writer.writerows(rows)
+            sys.stdout.flush()
@@ -0,0 +1,24 @@
+"""mBank commands."""
+
+import asyncio
+
+import click
+
+from .. import mbank, statements
+from ..cliutils import format_option, new_page_with_credentials, write_statement_output
+from ..playwrightutils import Browser
+
+
+@click.command()
+@format_option
+def pull_mbank(output_format: str) -> None:
+    """Fetches mBank's data and outputs a CSV file."""
+
+    async def run():
+        async with new_page_with_credentials(
+            mbank.fetch_credentials, Browser.FIREFOX
+        ) as (p, creds, _):
+            statement = await mbank.login_and_fetch_history(p, creds)
+        write_statement_output(output_format, statement, statements.from_mbank)
+
+    asyncio.run(run())
@@ -0,0 +1,26 @@
+"""Patreon commands."""
+
+import asyncio
+import contextlib
+from pathlib import Path
+
+import click
+
+from .. import gmail, patreon
+from ..cliutils import bundle_option, connect_op, open_receipt_output
+
+
+@click.command()
+@bundle_option
+@click.pass_context
+def pull_patreon(ctx, bundle: Path | None) -> None:
+    """Fetches Patreon receipts in text format."""
+
+    async def run():
+        with contextlib.closing(
+            gmail.connect(await gmail.fetch_credentials(await connect_op()))
+        ) as inbox:
+            with open_receipt_output(ctx, inbox, bundle) as (output, inbox):
+                patreon.fetch_and_archive_receipts(inbox, output)
+
+    asyncio.run(run())
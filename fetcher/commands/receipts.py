@@ -0,0 +1,74 @@
+"""Commands for the full-text index of receipts."""
+
+import contextlib
+import os
+import sqlite3
+from pathlib import Path
+
+import click
+
+from ..cliutils import DATE_TYPE
+from ..receipts import ReceiptIndex, read_receipt_file
+
+
+@click.command()
+@click.argument(
+    "paths",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, path_type=Path),
+)
+@click.pass_context
+def receipts_index(ctx, paths: tuple[Path, ...]) -> None:
+    """Indexes saved receipt files for receipts-search.
+
+    PATHS are receipt files or directories to search for them, e.g., the
+    download directory or the archive. Fetchers index new receipts themselves,
+    so this is only needed for receipts saved before the index existed.
+    """
+    files: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            for directory, _, names in os.walk(path):
+                files.extend(Path(directory, name) for name in names)
+        else:
+            files.append(path)
+    with contextlib.closing(ReceiptIndex(ctx.obj["receipts_index"])) as index:
+        added = index.add_all(filter(None, map(read_receipt_file, files)))
+    click.echo(f"Indexed {added} new receipts.", err=True)
+
+
+@click.command()
+@click.argument("query")
+@click.option(
+    "--provider",
+    type=click.Choice(["galaxus", "google_play", "patreon", "ubereats"]),
+    help="Only searches this provider's receipts.",
+)
+@click.option("--from-date", type=DATE_TYPE, help="The first day of the receipts.")
+@click.option("--to-date", type=DATE_TYPE, help="The last day of the receipts.")
+@click.option("--limit", default=20, show_default=True, type=click.IntRange(min=1))
+@click.pass_context
+def receipts_search(
+    ctx, query: str, provider: str | None, from_date, to_date, limit: int
+) -> None:
+    """Searches the receipts, best matches first.
+
+    QUERY is an SQLite FTS5 query, e.g., 'omega' or '"uber eats" OR pizza'.
+    """
+    with contextlib.closing(ReceiptIndex(ctx.obj["receipts_index"])) as index:
+        try:
+            hits = index.search(
+                query,
+                provider,
+                from_date.date() if from_date else None,
+                to_date.date() if to_date else None,
+                limit,
+            )
+        except sqlite3.OperationalError as e:
+            raise click.BadParameter(str(e), param_hint="QUERY") from e
+    for hit in hits:
+        click.echo(
+            f"{str(hit.day or '?'):<10} {hit.provider:<11} {hit.amount or '?':>12}  "
+            + f"{hit.subject}\n{'':>37}{hit.snippet}"
+        )
@@ -0,0 +1,68 @@
+"""Revolut commands."""
+
+import asyncio
+import datetime
+import tempfile
+from pathlib import Path
+
+import click
+
+from .. import playwrightutils, revolut
+from ..cliutils import (
+    full_option,
+    read_config_from_context,
+    read_output_from_context,
+    read_watermarks_from_context,
+)
+from ..dateutils import DateRange
+from ..playwrightutils import Browser
+
+
+@click.command()
+@click.option(
+    "--download-directory",
+    help="The target download directory (default: the config's). "
+    + "Ignored if the config has an archive.",
+    type=click.Path(exists=True, file_okay=False, writable=True),
+)
+@click.option(
+    "--max-concurrency",
+    default=playwrightutils.DEFAULT_MAX_CONCURRENCY,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="The maximum number of statements to download concurrently.",
+)
+@full_option
+@click.pass_context
+def revolut_pull(ctx, download_directory, max_concurrency: int, full: bool) -> None:
+    """Fetches Revolut data into CSV files.
+
+    The statements start at the month of a week before the last pull, or three
+    months ago with --full. The files are named revolut_CURRENCY_FROM_TO.csv."""
+    config = read_config_from_context(ctx)
+    output = read_output_from_context(
+        ctx, Path(download_directory) if download_directory else None
+    )
+    today = datetime.date.today()
+    watermarks = read_watermarks_from_context(ctx)
+    window = watermarks.window(
+        "revolut", DateRange(revolut.three_months_ago(today), today), full
+    )
+
+    async def run(download_directory: Path):
+        async with playwrightutils.new_page(
+            browser_type=Browser.FIREFOX, downloads_path=download_directory
+        ) as p:
+            return await revolut.login_and_download_statements(
+                p,
+                download_directory,
+                config["revolut_currencies"],
+                max_concurrency,
+                window.start,
+            )
+
+    # Revolut saves downloads itself, so they go through a scratch directory.
+    with tempfile.TemporaryDirectory() as scratch_directory:
+        for path in asyncio.run(run(Path(scratch_directory))):
+            output.save("revolut", path.name, path.read_bytes(), today)
+    watermarks.record("revolut", window)
@@ -0,0 +1,26 @@
+"""Splitwise commands."""
+
+import asyncio
+import datetime
+
+import click
+
+from .. import splitwise, statements
+from ..cliutils import connect_op, format_option, write_statement_output
+
+
+@click.command()
+@format_option
+def pull_splitwise(output_format: str) -> None:
+    """Fetches the Splitwise statement."""
+
+    async def run():
+        creds = await splitwise.fetch_credentials(await connect_op())
+        csv = splitwise.export_balances_to_csv(splitwise.fetch_balances(creds))
+        write_statement_output(
+            output_format,
+            csv,
+            lambda raw: statements.from_splitwise(raw, datetime.date.today()),
+        )
+
+    asyncio.run(run())
@@ -0,0 +1,42 @@
+"""Commands for the run metrics history."""
+
+import click
+
+from .. import metrics
+
+
+@click.command()
+@click.option(
+    "--command",
+    "commands",
+    multiple=True,
+    help="Only shows steps of this command. Can be repeated (default: all).",
+)
+@click.pass_context
+def stats(ctx, commands: tuple[str, ...]) -> None:
+    """Prints p50/p95 durations of provider steps from the run history.
+
+    The (run) step stands for whole runs. A step's duration in a run is the
+    total of all its calls in that run.
+    """
+    records = metrics.read_history(ctx.obj["metrics_directory"])
+    if commands:
+        records = [r for r in records if r["command"] in commands]
+    summaries = metrics.summarize(records)
+    if not summaries:
+        click.echo("No runs recorded yet.", err=True)
+        return
+    step_width = max(len(s.step) for s in summaries)
+    click.echo(
+        f"{'step':<{step_width}} {'runs':>5} {'fails':>5} "
+        + f"{'p50 [s]':>8} {'p95 [s]':>8}"
+    )
+    command = None
+    for s in summaries:
+        if s.command != command:
+            command = s.command
+            click.echo(f"\n{command}")
+        click.echo(
+            f"{s.step:<{step_width}} {s.runs:>5} {s.failures:>5} "
+            + f"{s.p50_seconds:>8.2f} {s.p95_seconds:>8.2f}"
+        )
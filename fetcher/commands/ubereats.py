@@ -0,0 +1,27 @@
+"""Uber Eats commands."""
+
+import asyncio
+import contextlib
+from pathlib import Path
+
+import click
+
+from .. import gmail, ubereats
+from ..cliutils import bundle_option, connect_op, open_receipt_output
+
+
+@click.command()
+@bundle_option
+@click.pass_context
+def pull_uber_eats(ctx, bundle: Path | None) -> None:
+    """Fetches Uber Eats receipts in text format."""
+
+    async def run():
+        with contextlib.closing(
+            gmail.connect(await gmail.fetch_credentials(await connect_op()))
+        ) as inbox:
+            with open_receipt_output(ctx, inbox, bundle) as (output, inbox):
+                for title, content in ubereats.fetch_and_archive_bills(inbox):
+                    output.save("ubereats", title + ".ubereats", content.encode())
+
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+"""Utilities for splitting date ranges into statement windows."""
+
+import datetime
+from typing import NamedTuple
+
+date = datetime.date
+
+
+class DateRange(NamedTuple):
+    """An inclusive range of days."""
+
+    start: date
+    end: date
+
+
+def add_months(day: date, months: int) -> date:
+    """Returns the first day of the month `months` after `day`'s month.
+
+    >>> add_months(date(2023, 11, 15), 3)
+    datetime.date(2024, 2, 1)
+    """
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def split_by_months(start: date, end: date, months: int = 1) -> list[DateRange]:
+    """Splits [start, end] into windows aligned to calendar months.
+
+    >>> split_by_months(date(2024, 1, 15), date(2024, 3, 10))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [DateRange(start=datetime.date(2024, 1, 15), end=datetime.date(2024, 1, 31)),
+     DateRange(start=datetime.date(2024, 2, 1), end=datetime.date(2024, 2, 29)),
+     DateRange(start=datetime.date(2024, 3, 1), end=datetime.date(2024, 3, 10))]
+    >>> split_by_months(date(2024, 1, 15), date(2024, 5, 10), months=3)
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [DateRange(start=datetime.date(2024, 1, 15), end=datetime.date(2024, 3, 31)),
+     DateRange(start=datetime.date(2024, 4, 1), end=datetime.date(2024, 5, 10))]
+    """
+    if months < 1:
+        raise ValueError(f"months must be positive, got {months}.")
+    if start > end:
+        raise ValueError(f"The start date {start} is after the end date {end}.")
+    windows = []
+    window_start = start
+    while window_start <= end:
+        next_start = add_months(window_start, months)
+        window_end = min(next_start - datetime.timedelta(days=1), end)
+        windows.append(DateRange(window_start, window_end))
+        window_start = next_start
+    return windows
+
+
+def split_by_days(start: date, end: date, max_days: int) -> list[DateRange]:
+    """Splits [start, end] into consecutive windows of at most max_days days.
+
+    >>> split_by_days(date(2024, 1, 1), date(2024, 1, 25), 10)
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [DateRange(start=datetime.date(2024, 1, 1), end=datetime.date(2024, 1, 10)),
+     DateRange(start=datetime.date(2024, 1, 11), end=datetime.date(2024, 1, 20)),
+     DateRange(start=datetime.date(2024, 1, 21), end=datetime.date(2024, 1, 25))]
+    """
+    if max_days < 1:
+        raise ValueError(f"max_days must be positive, got {max_days}.")
+    if start > end:
+        raise ValueError(f"The start date {start} is after the end date {end}.")
+    windows = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + datetime.timedelta(days=max_days - 1), end)
+        windows.append(DateRange(window_start, window_end))
+        window_start = window_end + datetime.timedelta(days=1)
+    return windows
@@ -1,19 +1,41 @@
 """Fetches account statements from Degiro."""
+import asyncio
+import contextlib
+import functools
 import logging
+import time
+import urllib.parse
 from datetime import date, timedelta
 from enum import Enum
-from typing import NamedTuple, Optional
+from typing import Iterator, NamedTuple, Optional
 
 import playwright.async_api
 
 from . import op
-from .playwrightutils import intercept_download
+from .contextextra import async_closing
+from .dateutils import DateRange
+from .playwrightutils import (
+    DEFAULT_MAX_CONCURRENCY,
+    Download,
+    HttpSession,
+    export_session_state,
+    fetch_with_browser_fallback,
+    intercept_download,
+    map_on_new_pages,
+    new_http_session,
+)
+from .tracing import span, traced
 
 Page = playwright.async_api.Page
 PlaywrightTimeOutError = playwright.async_api.TimeoutError
 
 logger = logging.getLogger('fetcher.degiro')
 
+TRADER_PAGE = "https://trader.degiro.nl/trader/#/markets"
+# A TOTP with less validity left is replaced with the next one before
+# submission, so that it doesn't expire in transit.
+MIN_TOTP_VALIDITY_SECONDS = 5
+
 
 class Credentials(NamedTuple):
     id: str
@@ -29,17 +51,16 @@ class StatementType(Enum):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches Degiro credentials from my 1Password vault."""
     item = "degiro.nl"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"])
     return Credentials(id=username, pwd=password)
 
 
-async def fetch_totp(op_client: op.OpSdkClient) -> str:
+@traced
+async def fetch_totp(op_client: op.OpSdkClient) -> op.Totp:
     """Fetches Degiro TOTP from my 1Password vault."""
-    vault_id = await op_client.get_vault_id(op.FINDATA_VAULT)
-    item_id = await op_client.get_item_id(vault_id, "degiro.nl")
     try:
-        return await op_client.get_totp(vault_id, item_id)
+        return await op_client.get_item_totp(op.FINDATA_VAULT, "degiro.nl")
     except Exception as e:
         raise Exception("Failed to fetch the Degiro TOTP.") from e
 
@@ -50,29 +71,68 @@ async def dismiss_cookies_consent_dialog(page: Page,
         timeout=timeout / timedelta(milliseconds=1) if timeout else None)
 
 
+@contextlib.contextmanager
+def log_duration(step: str) -> Iterator[None]:
+    start = time.monotonic()
+    try:
+        with span(step):
+            yield
+    finally:
+        logger.info(f"{step} took {time.monotonic() - start:.2f}s.")
+
+
+async def fresh_totp(totp: op.Totp, op_client: op.OpSdkClient) -> op.Totp:
+    """Returns a TOTP that stays valid for long enough to submit it.
+
+    If the TOTP is about to expire, waits for the next period and fetches
+    the next code.
+    """
+    remaining_seconds = totp.remaining_seconds(time.time())
+    if remaining_seconds >= MIN_TOTP_VALIDITY_SECONDS:
+        return totp
+    logger.info(f"The TOTP expires in {remaining_seconds:.1f}s. Refreshing.")
+    await asyncio.sleep(remaining_seconds)
+    return await fetch_totp(op_client)
+
+
+@traced
 async def login(page: Page, creds: Credentials,
                 op_client: op.OpSdkClient) -> None:
-    """Logs in to Degiro."""
+    """Logs in to Degiro.
+
+    Fetches the TOTP while the login page loads.
+    """
     logger.info("Logging in to Degiro.")
-    await page.goto("https://trader.degiro.nl/login/chde/#/login")
+    totp_task = asyncio.create_task(fetch_totp(op_client))
     try:
-        logging.info("Waiting for a cookie consent dialog.")
-        await dismiss_cookies_consent_dialog(page,
-                                             timeout=timedelta(seconds=2))
-    except PlaywrightTimeOutError:
-        logging.info("The cookie consent dialog hasn't appeared. Proceeding.")
-        # If there's no cookie consent dialog, then just proceed.
-        pass
-    logger.info("Entering login credentials.")
-    await page.locator("#username").fill(creds.id)
-    password_input = page.locator("#password")
-    await password_input.fill(creds.pwd)
-    await password_input.press("Enter")
+        with log_duration("Loading the login page"):
+            await page.goto("https://trader.degiro.nl/login/chde/#/login")
+        try:
+            logging.info("Waiting for a cookie consent dialog.")
+            await dismiss_cookies_consent_dialog(page,
+                                                 timeout=timedelta(seconds=2))
+        except PlaywrightTimeOutError:
+            logging.info(
+                "The cookie consent dialog hasn't appeared. Proceeding.")
+            # If there's no cookie consent dialog, then just proceed.
+            pass
+        logger.info("Entering login credentials.")
+        with log_duration("Entering login credentials"):
+            await page.locator("#username").fill(creds.id)
+            password_input = page.locator("#password")
+            await password_input.fill(creds.pwd)
+            await password_input.press("Enter")
+            totp_input = page.get_by_placeholder("012345")
+            await totp_input.wait_for()
+        with log_duration("Waiting for the TOTP"):
+            totp = await fresh_totp(await totp_task, op_client)
+    finally:
+        totp_task.cancel()
     logger.info("Entering TOTP.")
-    totp_input = page.get_by_placeholder("012345")
-    await totp_input.fill(await fetch_totp(op_client))
-    await totp_input.press("Enter")
-    await page.wait_for_url("https://trader.degiro.nl/trader/#/markets")
+    with log_duration("Entering TOTP"):
+        await totp_input.fill(totp.code)
+        await totp_input.press("Enter")
+        await page.wait_for_url(TRADER_PAGE)
 
 
 def get_three_months_ago(start_date: date) -> date:
@@ -90,40 +150,225 @@ def get_account_overview_url(from_date: date, to_date: date) -> str:
         )
 
 
-async def go_to_account_page(page: Page) -> None:
-    logging.info("Going to account page.")
+def get_default_window(today: date) -> DateRange:
+    return DateRange(get_three_months_ago(today), today)
+
+
+async def go_to_account_page(page: Page, window: DateRange) -> None:
+    logging.info(f"Going to account page for {window.start} - {window.end}.")
     await page.goto(
-        get_account_overview_url(
-            from_date=get_three_months_ago(date.today()),
-            to_date=date.today(),
-        ))
+        get_account_overview_url(from_date=window.start, to_date=window.end))
 
 
 async def go_to_portfolio_page(page: Page) -> None:
     logging.info("Going to portfolio page.")
+    if not page.url.startswith("https://trader.degiro.nl/trader/"):
+        # A fresh page of a logged-in context.
+        await page.goto(TRADER_PAGE)
     await page.get_by_role("link", name="Portfolio", exact=True).click()
 
 
-async def export_csv(page: Page) -> bytes:
+async def export_csv_download(page: Page) -> Download:
     logging.info("Exporting Degiro CSV.")
     async with intercept_download(page) as download:
         await page.get_by_role("button", name="Export").click()
         await page.get_by_role("link", name="CSV").click()
-    return download.downloaded_content()
+    return download
 
 
-async def fetch_statement(page: Page, statement_type: StatementType) -> bytes:
+async def export_csv(page: Page) -> bytes:
+    return (await export_csv_download(page)).downloaded_content()
+
+
+@traced
+async def fetch_statement(page: Page,
+                          statement_type: StatementType,
+                          window: Optional[DateRange] = None) -> bytes:
     """
     Fetches a statement from Degiro.
 
     :param page: A logged-in page.
     :param statement_type
+    :param window: The period of an account statement. Defaults to the last
+        three months. Portfolio statements ignore it.
     :return: A CSV file.
     """
     if statement_type == StatementType.ACCOUNT:
-        await go_to_account_page(page)
+        await go_to_account_page(page, window
+                                 or get_default_window(date.today()))
     elif statement_type == StatementType.PORTFOLIO:
         await go_to_portfolio_page(page)
     else:
         raise Exception("Unknown statement type: {0}.".format(statement_type))
     return await export_csv(page)
+
+
+class StatementRequest(NamedTuple):
+    statement_type: StatementType
+    # The period of an account statement. Portfolio statements have none.
+    window: Optional[DateRange] = None
+
+
+def make_statement_requests(
+        statement_types: list[StatementType],
+        windows: list[DateRange]) -> list[StatementRequest]:
+    """Creates the requests for the given statement types and windows.
+
+    A portfolio statement is a snapshot, so it is requested only once.
+    """
+    requests: list[StatementRequest] = []
+    for statement_type in dict.fromkeys(statement_types):
+        if statement_type == StatementType.ACCOUNT:
+            requests.extend(
+                StatementRequest(statement_type, window) for window in windows)
+        else:
+            requests.append(StatementRequest(statement_type))
+    return requests
+
+
+def statement_filename(request: StatementRequest, today: date) -> str:
+    """
+    Returns the file name for a statement.
+
+    >>> statement_filename(StatementRequest(StatementType.ACCOUNT,
+    ...     DateRange(date(2024, 1, 1), date(2024, 1, 31))), date(2024, 5, 5))
+    'degiro_account_2024-01-01_2024-01-31.csv'
+    >>> statement_filename(StatementRequest(StatementType.PORTFOLIO),
+    ...                    date(2024, 5, 5))
+    'degiro_portfolio_2024-05-05.csv'
+    """
+    name = request.statement_type.value.lower()
+    if request.window is None:
+        return f'degiro_{name}_{today.isoformat()}.csv'
+    return (f'degiro_{name}_{request.window.start.isoformat()}' +
+            f'_{request.window.end.isoformat()}.csv')
+
+
+@traced
+async def fetch_statements(
+        context: playwright.async_api.BrowserContext,
+        requests: list[StatementRequest],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> list[bytes]:
+    """
+    Fetches multiple statements from Degiro in one session.
+
+    Every statement is exported on its own page of the context, so the
+    session is reused instead of logging in again for each statement. Account
+    statements of more than one window are mostly downloaded over HTTP (see
+    fetch_account_statements).
+
+    :param context: A logged-in context.
+    :param requests: The statements to fetch.
+    :param max_concurrency: The maximum number of concurrent exports.
+    :return: The CSV files in the order of `requests`.
+    """
+
+    async def fetch(page: Page, request: StatementRequest) -> bytes:
+        return await fetch_statement(page, request.statement_type,
+                                     request.window)
+
+    windows = [r.window for r in requests if r.window is not None]
+    if len(windows) < 2:
+        return await map_on_new_pages(context, fetch, requests,
+                                      max_concurrency)
+    account_statements = iter(await fetch_account_statements(
+        context, windows, max_concurrency))
+    portfolio_statements = iter(await map_on_new_pages(
+        context, fetch, [r for r in requests if r.window is None],
+        max_concurrency))
+    return [
+        next(account_statements)
+        if r.window is not None else next(portfolio_statements)
+        for r in requests
+    ]
+
+
+async def fetch_account_statements(context: playwright.async_api.BrowserContext,
+                                   windows: list[DateRange],
+                                   max_concurrency: int) -> list[bytes]:
+    """Fetches account statements, all but the first over HTTP.
+
+    The first statement is exported in the browser. The other windows are
+    downloaded from its export URL with the browser's session, which skips a
+    page load and export dialog per window. A window whose download fails or
+    doesn't look like an account statement is exported in the browser.
+
+    :return: The CSV files in the order of `windows`.
+    """
+    async with async_closing(await context.new_page()) as page:
+        await go_to_account_page(page, windows[0])
+        first = await export_csv_download(page)
+        state = await export_session_state(context, first.request)
+    header = header_line(first.downloaded_content())
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def http_fetch(session: HttpSession, window: DateRange) -> bytes:
+        url = account_statement_url(first.url, windows[0], window)
+        if url is None:
+            raise Exception(f"Can't rewrite the export URL {first.url}.")
+        async with semaphore:
+            statement = await session.get(url)
+        if header_line(statement) != header:
+            raise Exception(f"{url} didn't return an account statement.")
+        return statement
+
+    async def browser_fetch(window: DateRange) -> bytes:
+        async with semaphore, async_closing(await context.new_page()) as page:
+            return await fetch_statement(page, StatementType.ACCOUNT, window)
+
+    async with new_http_session(state) as session:
+        statements = await asyncio.gather(*[
+            fetch_with_browser_fallback(
+                functools.partial(http_fetch, session, window),
+                functools.partial(browser_fetch, window))
+            for window in windows[1:]
+        ])
+    return [first.downloaded_content(), *statements]
+
+
+def header_line(statement: bytes) -> bytes:
+    return statement.split(b'\n', 1)[0].strip()
+
+
+# Date formats that export URLs may carry, most likely first.
+URL_DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d', '%d.%m.%Y']
+
+
+def account_statement_url(url: str, window: DateRange,
+                          new_window: DateRange) -> Optional[str]:
+    """Rewrites the export URL of one account statement for another window.
+
+    The export URL carries the window's first and last days as query
+    parameters. The browser export of the first window shows their names and
+    format, so the URLs of the other windows are derived from it rather than
+    guessed.
+
+    >>> account_statement_url(
+    ...     'https://trader.degiro.nl/reporting/secure/v3/cashAccountReport/csv'
+    ...     '?intAccount=1&fromDate=01%2F01%2F2024&toDate=31%2F01%2F2024',
+    ...     DateRange(date(2024, 1, 1), date(2024, 1, 31)),
+    ...     DateRange(date(2024, 2, 1), date(2024, 2, 29)))
+    ... # doctest: +ELLIPSIS
+    'https://.../csv?intAccount=1&fromDate=01%2F02%2F2024&toDate=29%2F02%2F2024'
+
+    :return: The new URL or None if the URL doesn't carry exactly one
+        parameter with each day of `window`.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or window.start == window.end:
+        return None
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    for date_format in URL_DATE_FORMATS:
+        days = {
+            window.start.strftime(date_format):
+            new_window.start.strftime(date_format),
+            window.end.strftime(date_format):
+            new_window.end.strftime(date_format),
+        }
+        matches = [value for _, value in query if value in days]
+        if sorted(matches) != sorted(days):
+            continue
+        new_query = [(name, days.get(value, value)) for name, value in query]
+        return urllib.parse.urlunsplit(
+            parts._replace(query=urllib.parse.urlencode(new_query)))
+    return None
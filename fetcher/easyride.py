@@ -1,19 +1,20 @@
 # -*- coding: utf-8 -*-
 """This module EasyRide Quittung from Gmail."""
 import contextlib
-from pathlib import PurePath
 
 from . import gmail
+from .archive import OutputProtocol
+from .tracing import traced
 
 
-def save_file(file_part, target_dir: PurePath) -> None:
+def save_file(file_part, output: OutputProtocol) -> None:
     filename, payload = gmail.fetch_file(file_part)
-    with open(target_dir / filename, 'wb') as f:
-        f.write(payload)
+    output.save('easyride', filename, payload)
 
 
+@traced
 def fetch_and_archive_receipts(creds: gmail.Credentials,
-                               download_dir: PurePath) -> None:
+                               output: OutputProtocol) -> None:
     with contextlib.closing(gmail.connect(creds)) as inbox:
         receipt_mail_numbers = inbox.search_inbox("EasyRide Kaufquittung")
         receipt_mail_numbers.extend(inbox.search_inbox("EasyRide Quittung"))
@@ -21,5 +22,5 @@ def fetch_and_archive_receipts(creds: gmail.Credentials,
         for receipt_mail_no in receipt_mail_numbers:
             msg = inbox.fetch(receipt_mail_no)
             pdf_part = list(msg.walk())[4]
-            save_file(pdf_part, download_dir)
+            save_file(pdf_part, output)
             inbox.archive(receipt_mail_no)
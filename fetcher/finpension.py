@@ -5,6 +5,9 @@ from typing import NamedTuple
 import playwright.async_api
 
 from . import op
+from .tracing import traced
+
+DASHBOARD_URL = 'https://app.finpension.ch/dashboard'
 
 
 class Credentials(NamedTuple):
@@ -15,11 +18,12 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches credentials from my 1Password vault."""
     item = "finpension.ch"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"])
     return Credentials(phone_number=username, password=password)
 
 
+@traced
 async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     """Logs in to Finpension.
 
@@ -34,9 +38,10 @@ async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     await page.locator('[name="mobile_number"]').type(creds.phone_number)
     await page.locator('[name="password"]').type(creds.password)
     await page.keyboard.press('Enter')
-    await page.wait_for_url('https://app.finpension.ch/dashboard')
+    await page.wait_for_url(DASHBOARD_URL)
 
 
+@traced
 async def fetch_current_total(
         logged_in_page: playwright.async_api.Page) -> str:
     """
@@ -47,7 +52,6 @@ async def fetch_current_total(
                 "12'174.52 CHF"
 
     """
-    DASHBOARD_URL = 'https://app.finpension.ch/dashboard'
     if logged_in_page.url != DASHBOARD_URL:
         await logged_in_page.goto(DASHBOARD_URL)
     value = await logged_in_page.locator('.dashboard-product__value'
@@ -55,3 +59,18 @@ async def fetch_current_total(
     # Turn "12'174.52\xa0CHF" into 12174.52
     return unicodedata.normalize('NFKC',
                                  value).replace("'", "").removesuffix(" CHF")
+
+
+@traced
+async def login_and_fetch_current_total(page: playwright.async_api.Page,
+                                        creds: Credentials) -> str:
+    """
+    Logs in and fetches the current total.
+
+    :param page playwright.async_api.Page: A blank page.
+    :param creds Credentials
+    :rtype str: A normalized string representing the total account value,
+                e.g., "12174.52"
+    """
+    await login(page, creds)
+    return await fetch_current_total(page)
@@ -7,7 +7,8 @@ from email.header import decode_header
 from imaplib import IMAP4, IMAP4_SSL
 from typing import NamedTuple, Tuple
 
-from . import op
+from . import metrics, op
+from .tracing import traced
 
 
 class InboxProtocol(typing.Protocol):
@@ -34,8 +35,8 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches Gmail credentials from my 1Password vault."""
     item = "Gmail"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    app_password = await op_client.read(op.FINDATA_VAULT, item, "credential")
+    username, app_password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "credential"])
     return Credentials(id=username, pwd=app_password)
 
 
@@ -48,6 +49,7 @@ class Gmail:
         self.imap.close()
         self.imap.logout()
 
+    @traced
     def fetch(self, num) -> email.message.Message:
         """Fetches the email with the given number.
 
@@ -60,8 +62,10 @@ class Gmail:
         if raw_email is None or isinstance(raw_email, bytes):
             raise Exception('I expected raw_email part to be a tuple.'
                             ' Rewrite your fetching code.')
+        metrics.increment('messages_fetched')
         return email.message_from_bytes(raw_email[1])
 
+    @traced
     def archive(self, num) -> None:
         """Archives the email with the given number.
 
@@ -71,7 +75,9 @@ class Gmail:
         if ret_code != 'OK':
             raise Exception('Could not archive the email: ' +
                             str((ret_code, ret_msg)))
+        metrics.increment('messages_archived')
 
+    @traced
     def search_inbox(self, subject: str) -> list[bytes]:
         """
         Searches for emails with the given subject in the inbox.
@@ -86,6 +92,35 @@ class Gmail:
         return ret[1][0].split()
 
 
+class DeferredArchiveInbox:
+    """An inbox that archives emails only when it's committed.
+
+    Fetchers archive an email right after they hand out its receipt. If the
+    receipt is saved somewhere that only persists later, e.g., a bundle, the
+    archiving has to wait until then, or a failed run would lose receipts.
+    """
+
+    def __init__(self, inbox: InboxProtocol):
+        self.inbox = inbox
+        self.pending: list = []
+
+    def fetch(self, num) -> email.message.Message:
+        return self.inbox.fetch(num)
+
+    def archive(self, num) -> None:
+        self.pending.append(num)
+
+    def search_inbox(self, subject: str) -> list[bytes]:
+        return self.inbox.search_inbox(subject)
+
+    def commit(self) -> None:
+        """Archives the emails archived so far."""
+        for num in self.pending:
+            self.inbox.archive(num)
+        self.pending.clear()
+
+
+@traced
 def connect(creds: Credentials) -> Gmail:
     """Connects to a Gmail account."""
     imap = IMAP4_SSL('imap.gmail.com')
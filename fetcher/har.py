@@ -0,0 +1,165 @@
+"""HAR recording and replay of provider flows.
+
+A flow recorded into a HAR file can be replayed offline: the browser gets its
+responses from the HAR instead of the network. This lets flow changes and
+performance be checked without the live portals.
+
+Recorded HARs are sanitized: credentials, session secrets and the responses of
+login endpoints are removed, but the other responses, e.g., statements, stay.
+Keep HAR files out of the repository.
+"""
+
+import contextlib
+import enum
+import json
+import logging
+import os
+import re
+import typing
+import urllib.parse
+from pathlib import Path
+
+logger = logging.getLogger("fetcher.har")
+
+XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+HAR_DIRECTORY_DEFAULT = Path(XDG_CACHE_HOME) / "findata" / "har"
+
+# Headers that carry credentials or session secrets.
+SENSITIVE_HEADERS = frozenset(
+    {
+        "authorization",
+        "cookie",
+        "proxy-authorization",
+        "set-cookie",
+        "x-csrf-token",
+        "x-xsrf-token",
+    }
+)
+# Custom headers that carry tokens, e.g., X-Auth-Token or X-CSRF-Header.
+SENSITIVE_HEADER_PATTERN = re.compile(r"x-(?:csrf|xsrf)|x-.*token$")
+# Query parameters that carry credentials or session secrets.
+SENSITIVE_PARAMETER_PATTERN = re.compile(
+    r".*(?:token|session|secret|passw|signature|auth).*|sid|key|api_?key|code|otp"
+)
+# Endpoints whose responses carry session tokens or account details.
+AUTH_URL_PATTERN = re.compile(r".*/(?:auth|login|logon|signin|session|oauth|token)")
+REDACTED = "REDACTED"
+
+
+class HarMode(enum.Enum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class Har(typing.NamedTuple):
+    path: Path
+    mode: HarMode
+
+
+_har: Har | None = None
+
+
+def current_har() -> Har | None:
+    """Returns the HAR that new browser contexts should record or replay."""
+    return _har
+
+
+@contextlib.contextmanager
+def use_har(har: Har) -> typing.Iterator[None]:
+    """Makes new browser contexts record or replay the HAR."""
+    global _har
+    previous, _har = _har, har
+    try:
+        yield
+    finally:
+        _har = previous
+
+
+def _is_sensitive_header(name: str) -> bool:
+    name = name.lower()
+    return name in SENSITIVE_HEADERS or bool(SENSITIVE_HEADER_PATTERN.match(name))
+
+
+def _sanitize_headers(headers: list[dict]) -> list[dict]:
+    return [h for h in headers if not _is_sensitive_header(h["name"])]
+
+
+def _is_sensitive_parameter(name: str) -> bool:
+    return bool(SENSITIVE_PARAMETER_PATTERN.fullmatch(name.lower()))
+
+
+def sanitize_url(url: str) -> str:
+    """Redacts the values of query parameters that carry secrets.
+
+    The rest of the URL is kept byte for byte, because replay matches URLs
+    exactly.
+
+    >>> sanitize_url("https://bank.test/api?sessionId=abc&from=2024-01-01")
+    'https://bank.test/api?sessionId=REDACTED&from=2024-01-01'
+    >>> sanitize_url("https://bank.test/csv?from=2024-01-01T00:00:00&ids=1,2"
+    ...              "&q=a%20b&flag#top")
+    'https://bank.test/csv?from=2024-01-01T00:00:00&ids=1,2&q=a%20b&flag#top'
+    """
+    base, question_mark, rest = url.partition("?")
+    query, hash_mark, fragment = rest.partition("#")
+    parameters = []
+    for parameter in query.split("&"):
+        name, equals, _ = parameter.partition("=")
+        if equals and _is_sensitive_parameter(urllib.parse.unquote_plus(name)):
+            parameter = f"{name}={REDACTED}"
+        parameters.append(parameter)
+    return base + question_mark + "&".join(parameters) + hash_mark + fragment
+
+
+def sanitize_har(har: dict) -> dict:
+    """Removes credentials and session secrets from a HAR.
+
+    Request bodies are removed, because login forms post credentials. Replay
+    then matches POST requests by URL and method only. Secret query parameters
+    are redacted, so requests with them no longer replay. Responses of
+    authentication endpoints lose their bodies, which carry session tokens.
+
+    >>> sanitize_har({"log": {"entries": [{
+    ...     "request": {"url": "https://bank.test/login?token=t",
+    ...                 "headers": [{"name": "Cookie", "value": "s=1"},
+    ...                             {"name": "Accept", "value": "*/*"}],
+    ...                 "cookies": [{"name": "s", "value": "1"}],
+    ...                 "postData": {"text": "password=hunter2"}},
+    ...     "response": {"headers": [{"name": "Set-Cookie", "value": "s=2"}],
+    ...                  "cookies": [{"name": "s", "value": "2"}],
+    ...                  "content": {"mimeType": "application/json",
+    ...                              "text": '{"session": "s=2"}'}}}]}})
+    ... # doctest: +NORMALIZE_WHITESPACE
+    {'log': {'entries': [{'request': {'url':
+    'https://bank.test/login?token=REDACTED', 'headers': [{'name': 'Accept',
+    'value': '*/*'}], 'cookies': []}, 'response': {'headers': [],
+    'cookies': [], 'content': {'size': 0, 'mimeType': 'application/json'}}}]}}
+    """
+    for entry in har["log"]["entries"]:
+        request, response = entry["request"], entry["response"]
+        request["headers"] = _sanitize_headers(request.get("headers", []))
+        request["cookies"] = []
+        request.pop("postData", None)
+        url = request["url"] = sanitize_url(request["url"])
+        if AUTH_URL_PATTERN.match(urllib.parse.urlsplit(url).path):
+            response["content"] = {
+                "size": 0,
+                "mimeType": response.get("content", {}).get("mimeType", ""),
+            }
+        for parameter in request.get("queryString", []):
+            if _is_sensitive_parameter(parameter["name"]):
+                parameter["value"] = REDACTED
+        response["headers"] = _sanitize_headers(response.get("headers", []))
+        response["cookies"] = []
+    return har
+
+
+def sanitize_har_file(path: Path) -> None:
+    """Sanitizes a HAR file in place."""
+    with open(path, "r") as f:
+        har = json.load(f)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(sanitize_har(har), f)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved the sanitized HAR to {path}.")
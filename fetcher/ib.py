@@ -1,16 +1,33 @@
 """An interface for Interactive Brokers."""
 
+import codecs
+import collections
+import contextlib
+import csv
 import datetime
+import io
 import logging
+import mmap
+import os
 import re
+import typing
 from decimal import Decimal
 from enum import Enum
+from pathlib import Path
 from typing import NamedTuple
 
 import playwright.async_api
 
 from . import op
-from .playwrightutils import intercept_download
+from .dateutils import DateRange, split_by_days
+from .playwrightutils import (
+    DEFAULT_MAX_CONCURRENCY,
+    Field,
+    extract_all,
+    intercept_download,
+    map_on_new_pages,
+)
+from .tracing import traced
 
 logger = logging.getLogger("fetcher.ib")
 
@@ -34,11 +51,13 @@ class StatementType(Enum):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches the credentials from my 1Password vault."""
     item = "Interactive Brokers"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"]
+    )
     return Credentials(id=username, pwd=password)
 
 
+@traced
 async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     """Logs into Interactive Brokers.
 
@@ -74,6 +93,7 @@ class SourceBankDepositInformation(NamedTuple):
     for_further_credit: str
 
 
+@traced
 async def deposit(
     page: playwright.async_api.Page, source: DepositSource, amount: Decimal
 ) -> SourceBankDepositInformation:
@@ -94,40 +114,47 @@ async def deposit(
     await page.get_by_placeholder("Required").click()
     await page.keyboard.type(str(amount))
     await page.get_by_role("link", name="Get Transfer Instructions").click()
+    # The instructions move money, so they're read from what the page shows.
+    return await scrape_deposit_information(page)
+
+
+class DepositInformationRow(NamedTuple):
+    labels: list[str | None]
+
+    def key_value(self) -> tuple[str, str]:
+        assert (
+            len(self.labels) == 2
+        ), f"Expected two labels per row but got {self.labels}."
+        key, value = self.labels
+        assert key and value, f"Expected labels {self.labels} to have text."
+        return (key, value)
+
+
+DEPOSIT_INFORMATION_ROW_FIELDS = {"labels": Field("label", multiple=True)}
 
+
+async def scrape_deposit_information(
+    page: playwright.async_api.Page,
+) -> SourceBankDepositInformation:
+    """Reads wire instructions from the rendered deposit page."""
     # Wait for the instructions to appear.
     await page.get_by_text(
         "Provide the following information" + " to your bank to initiate the transfer."
     ).click()
 
-    #  await page.get_by_text("Transfer Funds to Beneficiary/Account Title"
-    #                         ).click()
-    async def extract_data_from_row(
-        row: playwright.async_api.Locator,
-    ) -> tuple[str, str]:
-        labels = await row.locator("label").all()
-        tmp = []
-        for label in labels:
-            text_content = await label.text_content()
-            assert text_content, f"Expected a label f{label} to have text."
-            tmp.append(text_content.strip())
-        assert len(tmp) == 2, f"Expected two labels per row but got f{labels}."
-        return (tmp[0], tmp[1])
-
-    deposit_information_dict = {}
-
-    all_rows = await page.locator("wire-destination wire-destination-bank .row").all()
-    for row in all_rows:
-        data_tuple = await extract_data_from_row(row)
-        deposit_information_dict[data_tuple[0]] = data_tuple[1]
-
-    for_further_benefit_row = page.locator(
-        "wire-destination" + " destination-further-benefit-to .row"
-    ).first
-    for_further_benefit_tuple = await extract_data_from_row(for_further_benefit_row)
-    deposit_information_dict[for_further_benefit_tuple[0]] = for_further_benefit_tuple[
-        1
-    ]
+    bank_rows = await extract_all(
+        page.locator("wire-destination wire-destination-bank .row"),
+        DepositInformationRow,
+        DEPOSIT_INFORMATION_ROW_FIELDS,
+    )
+    further_benefit_rows = await extract_all(
+        page.locator("wire-destination destination-further-benefit-to .row").first,
+        DepositInformationRow,
+        DEPOSIT_INFORMATION_ROW_FIELDS,
+    )
+    deposit_information_dict = dict(
+        row.key_value() for row in bank_rows + further_benefit_rows
+    )
 
     return SourceBankDepositInformation(
         transfer_to=deposit_information_dict[
@@ -141,6 +168,7 @@ async def deposit(
     )
 
 
+@traced
 async def cancel_pending_deposits(page: playwright.async_api.Page) -> None:
     """
     Cancels all pending deposits.
@@ -173,14 +201,33 @@ def quarter_ago(day: datetime.date) -> datetime.date:
     return day - datetime.timedelta(days=90)
 
 
+# The longest custom date range the statements page accepts.
+MAX_STATEMENT_DAYS = 365
+
+
+def split_into_statement_windows(
+    start: datetime.date, end: datetime.date
+) -> list[DateRange]:
+    """Splits a date range into windows accepted by the statements page."""
+    return split_by_days(start, end, MAX_STATEMENT_DAYS)
+
+
+@traced
 async def fetch_statement(
-    page: playwright.async_api.Page, statement_type: StatementType
+    page: playwright.async_api.Page,
+    statement_type: StatementType,
+    window: DateRange | None = None,
 ) -> bytes:
     """Fetches Interactive Brokers's account statement.
 
     :param page playwright.async_api.Page: A page in a logged in state.
+    :param window DateRange | None: The statement period. Defaults to the last
+        quarter. It must not be longer than MAX_STATEMENT_DAYS.
     :return bytes: The statement CSV file.
     """
+    if window is None:
+        today = datetime.date.today()
+        window = DateRange(quarter_ago(today), today)
     logger.info("Visiting the statements page.")
     await page.goto(
         IB_DOMAIN + "/AccountManagement/AmAuthentication" + "?action=Statements"
@@ -195,13 +242,203 @@ async def fetch_statement(
         "combobox"
     ).select_option("string:DATE_RANGE")
 
-    today = datetime.date.today()
-    quarter_ago_str = quarter_ago(today).strftime("%Y-%m-%d")
-    for _ in range(2):
-        # For some reason, doing it only once doesn't work.
-        await page.locator('input[name="fromDate"]').fill(quarter_ago_str)
-        await page.keyboard.press("Enter")
+    for name, day in (("fromDate", window.start), ("toDate", window.end)):
+        for _ in range(2):
+            # For some reason, doing it only once doesn't work.
+            await page.locator(f'input[name="{name}"]').fill(day.strftime("%Y-%m-%d"))
+            await page.keyboard.press("Enter")
 
     async with intercept_download(page) as download:
         await page.get_by_role("button", name="Download CSV").click()
     return download.downloaded_content()
+
+
+@traced
+async def fetch_statements(
+    context: playwright.async_api.BrowserContext,
+    statement_type: StatementType,
+    windows: list[DateRange],
+    directory: Path,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> list[Path]:
+    """Fetches statements for multiple windows in one session.
+
+    Each statement is saved as soon as it's downloaded, so that a multi-year
+    range isn't held in memory.
+
+    :param context playwright.async_api.BrowserContext: A logged-in context.
+    :param windows list[DateRange]: The statement periods.
+    :param directory Path: The directory to save the statements into.
+    :param max_concurrency int: The maximum number of concurrent downloads.
+    :return list[Path]: The statement CSV files in the order of `windows`.
+    """
+
+    async def fetch(page: playwright.async_api.Page, window: DateRange) -> Path:
+        logger.info(f"Fetching the statement for {window.start} - {window.end}.")
+        path = directory / (
+            f"{statement_type.name.lower()}_{window.start}_{window.end}.csv"
+        )
+        path.write_bytes(await fetch_statement(page, statement_type, window))
+        return path
+
+    return await map_on_new_pages(context, fetch, windows, max_concurrency)
+
+
+# Sections that summarize a statement's period rather than list its activity.
+# Each window has its own version of them, so the stitched statement keeps only
+# the latest window's.
+SUMMARY_SECTIONS = frozenset(
+    {
+        "Statement",
+        "Account Information",
+        "Net Asset Value",
+        "Change in NAV",
+        "Mark-to-Market Performance Summary",
+        "Realized & Unrealized Performance Summary",
+        "Cash Report",
+        "Open Positions",
+        "Forex Balances",
+        "Net Stock Position Summary",
+        "Codes",
+        "Notes/Legal Notes",
+        "Base Currency Exchange Rate",
+    }
+)
+
+Row = tuple[str, ...]
+
+
+def stitch_activity_statements(paths: list[Path]) -> bytes:
+    """Stitches activity statement CSVs into one.
+
+    An activity statement consists of sections, e.g., "Trades" or "Dividends".
+    Every row starts with the section name followed by the row type, e.g.,
+    "Header" or "Data". A section may have multiple headers, each followed by
+    its rows.
+
+    The result keeps sections and headers in the order of their first
+    appearance. Rows under each header keep the order of `statements`. A row
+    that a statement repeats, e.g., two equal fills on one day, is kept as many
+    times as it appears, but windows that both contain it don't add it again.
+    SUMMARY_SECTIONS come from the last statement that has them.
+
+    :param paths list[Path]: Activity statement CSVs ordered by date. They are
+        memory-mapped and read section by section.
+    :return bytes: The stitched CSV.
+    """
+    # section -> header -> (row, occurrence within its statement)
+    sections: dict[str, dict[Row, dict[tuple[Row, int], None]]] = {}
+    for path in paths:
+        occurrences: collections.Counter[tuple[Row, Row]] = collections.Counter()
+        with ActivityStatement.open(path) as activity:
+            for name in activity.sections:
+                if name in SUMMARY_SECTIONS:
+                    # Replaces the previous window's summary in place.
+                    sections[name] = {}
+                section = sections.setdefault(name, {})
+                header: Row = ()
+                for row in map(tuple, activity.rows(name)):
+                    if row[1:2] == ("Header",):
+                        header = row
+                        section.setdefault(header, {})
+                        continue
+                    occurrence = occurrences[header, row]
+                    occurrences[header, row] += 1
+                    section.setdefault(header, {})[row, occurrence] = None
+
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    for headers in sections.values():
+        for header, rows in headers.items():
+            if header:
+                writer.writerow(header)
+            writer.writerows(row for row, _ in rows)
+    return output.getvalue().encode("utf-8")
+
+
+Span = tuple[int, int]
+
+
+def _section_name(line: bytes) -> bytes:
+    if line.startswith(b'"'):
+        return line[1 : line.find(b'"', 1)]
+    return line.split(b",", 1)[0].rstrip(b"\r\n")
+
+
+def index_sections(data: bytes | mmap.mmap) -> dict[str, list[Span]]:
+    """Finds the byte ranges of an activity statement's sections.
+
+    Scans the statement once, line by line, without parsing the fields. A
+    section's rows are usually contiguous, but a section that appears more than
+    once gets a range per appearance. Quoted fields may span lines.
+
+    >>> index_sections(b'\\xef\\xbb\\xbfTrades,Header,Symbol\\n'
+    ...                b'Trades,Data,VT\\n\\n"Dividends",Data,"VT,\\nCash"\\n')
+    {'Trades': [(3, 39)], 'Dividends': [(40, 68)]}
+    """
+    sections: dict[str, list[Span]] = {}
+    start = 3 if data[:3] == codecs.BOM_UTF8 else 0
+    current: list[Span] | None = None
+    section_start = start
+    position = start
+    quoted = False
+    while position < len(data):
+        end = data.find(b"\n", position)
+        end = len(data) if end < 0 else end + 1
+        line = data[position:end]
+        if not quoted and line.strip():
+            spans = sections.setdefault(_section_name(line).decode("utf-8"), [])
+            if spans is not current:
+                if current is not None:
+                    current.append((section_start, position))
+                current, section_start = spans, position
+        elif not quoted and current is not None:
+            # A blank line ends the section's range.
+            current.append((section_start, position))
+            current = None
+        if line.count(b'"') % 2:
+            quoted = not quoted
+        position = end
+    if current is not None:
+        current.append((section_start, position))
+    return sections
+
+
+class ActivityStatement:
+    """An activity statement file whose sections are read on demand.
+
+    The file is memory-mapped, so only the pages of the read sections are
+    loaded, and opening a multi-year statement costs one scan for the index.
+
+        with ActivityStatement.open(path) as statement:
+            for row in statement.rows("Dividends"):
+                ...
+    """
+
+    def __init__(self, data: bytes | mmap.mmap):
+        self._data = data
+        self.sections = index_sections(data)
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, path: Path) -> typing.Iterator["ActivityStatement"]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # An empty file can't be memory-mapped.
+                yield cls(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield cls(data)
+
+    def _lines(self, section: str) -> typing.Iterator[str]:
+        for start, end in self.sections.get(section, []):
+            position = start
+            while position < end:
+                line_end = self._data.find(b"\n", position, end)
+                line_end = end if line_end < 0 else line_end + 1
+                yield self._data[position:line_end].decode("utf-8")
+                position = line_end
+
+    def rows(self, section: str) -> typing.Iterator[list[str]]:
+        """Lazily parses a section's rows, including its headers."""
+        return (row for row in csv.reader(self._lines(section)) if row)
@@ -0,0 +1,170 @@
+"""A deduplicating local store of statement rows, one per account.
+
+Fetchers download overlapping windows, so consecutive statements repeat rows.
+A ledger keeps every distinct row once: merging a statement appends only the
+rows it hasn't seen, and an export returns only the rows added since the last
+export, so downstream ingestion handles each row once.
+
+Rows are identified by a fingerprint of their fields and their occurrence
+number within the statement. Two identical rows in one statement, e.g., two
+equal card payments on the same day, stay two rows, and a later statement that
+repeats both adds nothing.
+
+A ledger is an SQLite database. The fingerprints have a unique index, so a
+merge costs an index lookup per statement row and never rescans the ledger.
+"""
+
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import logging
+import re
+import sqlite3
+import typing
+from pathlib import Path
+
+logger = logging.getLogger("fetcher.ledger")
+
+_ACCOUNT_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    seq INTEGER PRIMARY KEY,
+    fingerprint BLOB NOT NULL UNIQUE,
+    fields TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+Row = list[str]
+
+
+def fingerprint(fields: typing.Sequence[str], occurrence: int) -> bytes:
+    """Returns the fingerprint of the occurrence-th copy of a row.
+
+    >>> fingerprint(["2024-01-01", "-5.00"], 0).hex()
+    'ce14a9701cc285d533e293a0411a63d7'
+    >>> fingerprint(["2024-01-01", "-5.00"], 0) != fingerprint(
+    ...     ["2024-01-01", "-5.00"], 1)
+    True
+    """
+    payload = "\x1f".join(fields) + f"\x1e{occurrence}"
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+def parse_statement(
+    data: bytes, header_rows: int = 1, delimiter: str = ","
+) -> tuple[list[Row], list[Row]]:
+    """Splits a CSV statement into its header and data rows.
+
+    Blank rows are dropped.
+
+    >>> parse_statement(b"Date,Amount\\r\\n2024-01-01,-5.00\\r\\n\\r\\n")
+    ([['Date', 'Amount']], [['2024-01-01', '-5.00']])
+    """
+    reader = csv.reader(
+        io.StringIO(data.decode("utf-8-sig"), newline=""), delimiter=delimiter
+    )
+    rows = [row for row in reader if any(row)]
+    return rows[:header_rows], rows[header_rows:]
+
+
+class Ledger:
+    """The deduplicated rows of one account."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    @staticmethod
+    def open(directory: Path, account: str) -> "Ledger":
+        """Opens the account's ledger in the directory, creating it if needed."""
+        if not _ACCOUNT_PATTERN.fullmatch(account):
+            raise Exception(f"Invalid account name: {account!r}.")
+        return Ledger(directory / f"{account}.sqlite3")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _get_meta(self, key: str) -> typing.Any:
+        row = self._connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, key: str, value: typing.Any) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value)),
+        )
+
+    @property
+    def header(self) -> list[Row]:
+        """The header rows of the account's statements."""
+        return self._get_meta("header") or []
+
+    @property
+    def delimiter(self) -> str:
+        return self._get_meta("delimiter") or ","
+
+    def merge(
+        self, header: list[Row], rows: typing.Iterable[Row], delimiter: str = ","
+    ) -> int:
+        """Appends the rows that the ledger doesn't have yet.
+
+        :param header list[Row]: The statement's header rows. They must match
+            the header of previously merged statements.
+        :param rows Iterable[Row]: The statement's data rows.
+        :return int: The number of added rows.
+        """
+        known_header = self._get_meta("header")
+        if known_header is not None and known_header != header:
+            raise Exception(
+                f"The statement's header {header} differs from "
+                + f"the ledger's header {known_header}."
+            )
+
+        def fingerprinted_rows() -> typing.Iterator[tuple[bytes, str]]:
+            occurrences: dict[tuple[str, ...], int] = {}
+            for row in rows:
+                key = tuple(row)
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                yield fingerprint(row, occurrence), json.dumps(row)
+
+        with self._connection:
+            if known_header is None:
+                self._set_meta("header", header)
+                self._set_meta("delimiter", delimiter)
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO rows (fingerprint, fields) VALUES (?, ?)",
+                fingerprinted_rows(),
+            )
+            added = self._connection.total_changes - before
+        logger.info(f"Added {added} new rows to {self.path}.")
+        return added
+
+    def count(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    @contextlib.contextmanager
+    def export(self) -> typing.Iterator[typing.Iterator[Row]]:
+        """Streams the rows added since the last export, in merge order.
+
+        The export counts as done only if the block exits without an
+        exception. Otherwise, the next export returns the same rows again.
+        """
+        exported = self._get_meta("exported_seq") or 0
+        (last,) = self._connection.execute("SELECT MAX(seq) FROM rows").fetchone()
+        cursor = self._connection.execute(
+            "SELECT fields FROM rows WHERE seq > ? AND seq <= ? ORDER BY seq",
+            (exported, last or 0),
+        )
+        yield (json.loads(fields) for (fields,) in cursor)
+        if last is not None:
+            with self._connection:
+                self._set_meta("exported_seq", last)
@@ -6,6 +6,7 @@ import playwright.async_api
 from fetcher import playwrightutils
 
 from . import op
+from .tracing import traced
 
 
 class Credentials(NamedTuple):
@@ -16,8 +17,8 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches credentials from my 1Password vault."""
     item = "mbank.pl"
-    username = await op_client.read(op.FINDATA_VAULT, item, "username")
-    password = await op_client.read(op.FINDATA_VAULT, item, "password")
+    username, password = await op_client.read_fields(
+        op.FINDATA_VAULT, item, ["username", "password"])
     return Credentials(id=username, pwd=password)
 
 
@@ -25,6 +26,7 @@ MBANK_LOGIN_PAGE = 'https://online.mbank.pl/pl/Login/history'
 HISTORY_PAGE = 'https://online.mbank.pl/history'
 
 
+@traced
 async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     await page.goto(MBANK_LOGIN_PAGE)
     await page.get_by_role("textbox", name="Identyfikator").click()
@@ -38,6 +40,7 @@ async def login(page: playwright.async_api.Page, creds: Credentials) -> None:
     await page.wait_for_url(HISTORY_PAGE)
 
 
+@traced
 async def fetch_csv_history(page: playwright.async_api.Page) -> bytes:
     """Fetches Mbank's transaction history.
 
@@ -61,6 +64,7 @@ def check_decoding(bs: bytes, encoding: str) -> bool:
         return False
 
 
+@traced
 def transform_and_strip_mbanks_csv(raw_csv: bytes) -> bytes:
     if check_decoding(raw_csv, 'utf-8'):
         csv = raw_csv.decode('utf-8')
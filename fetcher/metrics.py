@@ -0,0 +1,276 @@
+"""Per-run metrics for long-term performance tracking.
+
+Every command run produces a record with the run's duration and outcome, the
+durations and failures of its traced steps, and counters such as downloaded
+bytes. The record is appended to an append-only JSONL history. If a textfile
+directory is configured, the record is also exported there as a Prometheus
+textfile, one per command, for node_exporter's textfile collector.
+"""
+
+import contextlib
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import typing
+from pathlib import Path
+
+from . import tracing
+
+logger = logging.getLogger("fetcher.metrics")
+
+HISTORY_FILE = "history.jsonl"
+METRIC_PREFIX = "findata"
+
+
+class StepStats(typing.NamedTuple):
+    calls: int
+    total_seconds: float
+
+
+class Run:
+    """Collects the metrics of a single command run."""
+
+    def __init__(self, command: str):
+        self.command = command
+        self.started_at = time.time()
+        self.duration_seconds = 0.0
+        self.error: str | None = None
+        # Whether the run did no provider work, e.g., it only printed help.
+        self.discarded = False
+        self.steps: dict[str, StepStats] = {}
+        self.failures: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self._blamed_errors: set[int] = set()
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def on_span(self, name: str, seconds: float, error: BaseException | None) -> None:
+        with self._lock:
+            calls, total = self.steps.get(name, StepStats(0, 0.0))
+            self.steps[name] = StepStats(calls + 1, total + seconds)
+            # Blame only the innermost step an error passes through.
+            if isinstance(error, Exception) and id(error) not in self._blamed_errors:
+                self._blamed_errors.add(id(error))
+                self.failures[name] = self.failures.get(name, 0) + 1
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def fail(self, error: BaseException) -> None:
+        self.error = repr(error)
+
+    def finish(self) -> None:
+        self.duration_seconds = time.monotonic() - self._start
+
+    def to_record(self) -> dict:
+        return {
+            "command": self.command,
+            "started_at": datetime.datetime.fromtimestamp(
+                self.started_at, datetime.timezone.utc
+            ).isoformat(),
+            "duration_seconds": self.duration_seconds,
+            "status": "ok" if self.error is None else "error",
+            "error": self.error,
+            "steps": {
+                name: {"calls": s.calls, "total_seconds": s.total_seconds}
+                for name, s in self.steps.items()
+            },
+            "failures": self.failures,
+            "counters": self.counters,
+        }
+
+
+_run: Run | None = None
+
+
+def current_run() -> Run | None:
+    return _run
+
+
+def increment(counter: str, value: int = 1) -> None:
+    """Adds to a counter of the current run, if any.
+
+    :param counter str: The counter's name, e.g., "bytes_downloaded".
+    """
+    if _run is not None:
+        _run.increment(counter, value)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus_text(record: dict) -> str:
+    """Formats a run record in the Prometheus text exposition format.
+
+    Step failures and the run's counters count events of the run, so they're
+    counters. They restart from zero with every run of the command.
+
+    >>> print(to_prometheus_text({"command": "pull-bcge",
+    ...     "started_at": "2024-01-01T00:00:00+00:00", "duration_seconds": 2.5,
+    ...     "status": "ok", "steps": {"bcge.login": {"calls": 1,
+    ...     "total_seconds": 1.5}}, "failures": {"bcge.login": 1},
+    ...     "counters": {"bytes_downloaded": 10}}), end="")
+    # TYPE findata_run_duration_seconds gauge
+    findata_run_duration_seconds{command="pull-bcge"} 2.5
+    # TYPE findata_run_success gauge
+    findata_run_success{command="pull-bcge"} 1
+    # TYPE findata_run_timestamp_seconds gauge
+    findata_run_timestamp_seconds{command="pull-bcge"} 1704067200.0
+    # TYPE findata_step_duration_seconds gauge
+    findata_step_duration_seconds{command="pull-bcge",step="bcge.login"} 1.5
+    # TYPE findata_step_failures_total counter
+    findata_step_failures_total{command="pull-bcge",step="bcge.login"} 1
+    # TYPE findata_bytes_downloaded_total counter
+    findata_bytes_downloaded_total{command="pull-bcge"} 10
+    """
+    command = f'command="{_escape_label(record["command"])}"'
+    started_at = datetime.datetime.fromisoformat(record["started_at"])
+    # name -> (type, samples)
+    metrics: dict[str, tuple[str, list[tuple[str, float]]]] = {
+        "run_duration_seconds": ("gauge", [(command, record["duration_seconds"])]),
+        "run_success": ("gauge", [(command, int(record["status"] == "ok"))]),
+        "run_timestamp_seconds": ("gauge", [(command, started_at.timestamp())]),
+    }
+    for step, stats in record["steps"].items():
+        labels = f'{command},step="{_escape_label(step)}"'
+        metrics.setdefault("step_duration_seconds", ("gauge", []))[1].append(
+            (labels, stats["total_seconds"])
+        )
+    for step, count in record["failures"].items():
+        labels = f'{command},step="{_escape_label(step)}"'
+        metrics.setdefault("step_failures_total", ("counter", []))[1].append(
+            (labels, count)
+        )
+    for counter, value in record["counters"].items():
+        metrics[f"{counter}_total"] = ("counter", [(command, value)])
+    lines = []
+    for name, (metric_type, samples) in metrics.items():
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{METRIC_PREFIX}_{name}{{{labels}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def save_run(record: dict, directory: Path, textfile_directory: Path | None) -> None:
+    """Appends the record to the history and exports it as a textfile.
+
+    :param textfile_directory: Where to export the textfile. None skips it.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / HISTORY_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    if textfile_directory is None:
+        return
+    textfile_directory.mkdir(parents=True, exist_ok=True)
+    prom_path = textfile_directory / f"{record['command']}.prom"
+    tmp_path = prom_path.with_suffix(".prom.tmp")
+    tmp_path.write_text(to_prometheus_text(record))
+    # The textfile collector may read at any time, so replace atomically.
+    os.replace(tmp_path, prom_path)
+
+
+@contextlib.contextmanager
+def record_run(
+    command: str, directory: Path, textfile_directory: Path | None = None
+) -> typing.Iterator[Run]:
+    """Collects the metrics of a run and saves them on exit.
+
+    Call `Run.fail` or set `Run.discarded` before exit to mark the outcome.
+
+    :param textfile_directory: Where to export the Prometheus textfile. None
+        exports none.
+    """
+    global _run
+    run = _run = Run(command)
+    try:
+        with tracing.listen(run.on_span):
+            yield run
+    finally:
+        _run = None
+        run.finish()
+        if not run.discarded:
+            try:
+                save_run(run.to_record(), directory, textfile_directory)
+            except OSError:
+                logger.warning("Could not save the run's metrics.", exc_info=True)
+
+
+def read_history(directory: Path) -> list[dict]:
+    """Reads all run records, skipping malformed lines."""
+    records = []
+    try:
+        with open(directory / HISTORY_FILE) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    logger.warning(f"Skipping a malformed history line: {line!r}")
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Returns the p-th percentile with linear interpolation.
+
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 50)
+    2.5
+    >>> percentile([1.0, 2.0, 3.0, 4.0], 95)
+    3.85
+    >>> percentile([7.0], 95)
+    7.0
+    """
+    if not values:
+        raise ValueError("Can't compute a percentile of no values.")
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class StepSummary(typing.NamedTuple):
+    command: str
+    step: str
+    runs: int
+    failures: int
+    p50_seconds: float
+    p95_seconds: float
+
+
+# The pseudo-step that stands for a whole run in summaries.
+RUN_STEP = "(run)"
+
+
+def summarize(records: list[dict]) -> list[StepSummary]:
+    """Summarizes per-run step durations by command and step.
+
+    A step's duration in a run is the total of all its calls in that run.
+    """
+    durations: dict[tuple[str, str], list[float]] = {}
+    failures: dict[tuple[str, str], int] = {}
+    for record in records:
+        command = record["command"]
+        durations.setdefault((command, RUN_STEP), []).append(record["duration_seconds"])
+        if record["status"] != "ok":
+            failures[(command, RUN_STEP)] = failures.get((command, RUN_STEP), 0) + 1
+        for step, stats in record["steps"].items():
+            durations.setdefault((command, step), []).append(stats["total_seconds"])
+        for step, count in record["failures"].items():
+            failures[(command, step)] = failures.get((command, step), 0) + count
+    return [
+        StepSummary(
+            command=command,
+            step=step,
+            runs=len(values),
+            failures=failures.get((command, step), 0),
+            p50_seconds=percentile(values, 50),
+            p95_seconds=percentile(values, 95),
+        )
+        for (command, step), values in sorted(durations.items())
+    ]
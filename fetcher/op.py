@@ -1,14 +1,60 @@
 """A wrapper for the 1Password CLI."""
-import subprocess
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
 
 from onepassword.client import Client  # type: ignore
 
+from .tracing import traced
+
+logger = logging.getLogger('fetcher.op')
+
+XDG_CACHE_HOME = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+    "~/.cache")
+ID_INDEX_DEFAULT = Path(XDG_CACHE_HOME) / "findata" / "op-id-index.json"
+# How long the ID index is trusted before it's rebuilt.
+ID_INDEX_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# The SDK raises untyped errors. These messages tell that a vault or item ID
+# doesn't exist (anymore), e.g., because the item was recreated.
+STALE_ID_ERROR = re.compile(r'not found|no .* matched|invalid .*\bid\b',
+                            re.IGNORECASE)
+
 # The vault where the 1Password items accessible by the findata service account
 # are stored.
 FINDATA_VAULT = "Automated Findata"
 
+# Secrets resolved in this process, by reference. This lets commands that run
+# in one process share secrets without resolving them again. The secrets are
+# never persisted.
+_resolved_secrets: dict[str, str] = {}
+
+
+def secret_reference(vault: str, item: str, field: str) -> str:
+    """Returns a 1Password secret reference.
+
+    >>> secret_reference(FINDATA_VAULT, "bcge.ch", "password")
+    'op://Automated Findata/bcge.ch/password'
+    """
+    return f"op://{vault}/{item}/{field}"
+
+
+# op item get --vault="Automated Findata" "Service Account Auth Token Findata" --reveal --fields label="credential"
+FETCH_SERVICE_ACCOUNT_AUTH_TOKEN_COMMAND = [
+    "op", "item", "get", "--vault", FINDATA_VAULT,
+    "Service Account Auth Token Findata", "--reveal", "--fields",
+    "label=credential"
+]
+
 
-def fetch_service_account_auth_token() -> str:
+@traced
+async def fetch_service_account_auth_token() -> str:
     """Fetches the 1Password service account auth token for Findata.
 
     This function uses the `op` command line tool.
@@ -20,27 +66,138 @@ def fetch_service_account_auth_token() -> str:
         Exception: If the 1Password service account auth token could not be
             fetched.
     """
-    # op item get --vault="Automated Findata" "Service Account Auth Token Findata" --reveal --fields label="credential"
-    op_read = subprocess.run([
-        "op", "item", "get", "--vault", FINDATA_VAULT,
-        "Service Account Auth Token Findata", "--reveal", "--fields",
-        "label=credential"
-    ],
-                             capture_output=True,
-                             text=True)
-    if op_read.returncode != 0:
+    process = await asyncio.create_subprocess_exec(
+        *FETCH_SERVICE_ACCOUNT_AUTH_TOKEN_COMMAND,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE)
+    stdout, _ = await process.communicate()
+    if process.returncode != 0:
         raise Exception(
             "Could not fetch the 1Password service account auth token.")
-    return op_read.stdout.strip()
+    return stdout.decode().strip()
+
+
+# The TOTP period used when an item doesn't specify one (RFC 6238).
+DEFAULT_TOTP_PERIOD_SECONDS = 30
+
+
+class Totp(NamedTuple):
+    code: str
+    period_seconds: int
+    # The Unix time at which the code was fetched.
+    fetched_at: float
+
+    def remaining_seconds(self, now: float) -> float:
+        """Returns how long the code stays valid.
+
+        >>> Totp('123456', 30, fetched_at=60.0).remaining_seconds(now=65.0)
+        25.0
+        >>> Totp('123456', 30, fetched_at=60.0).remaining_seconds(now=95.0)
+        0.0
+        """
+        expiry = (self.fetched_at // self.period_seconds +
+                  1) * self.period_seconds
+        return max(expiry - now, 0.0)
+
+
+def totp_period_seconds(totp_field_value: str) -> int:
+    """Returns the period of a TOTP field.
+
+    The field's value is either an otpauth URI or a bare secret.
+
+    >>> totp_period_seconds('otpauth://totp/Degiro?secret=ABC&period=60')
+    60
+    >>> totp_period_seconds('ABCDEFGH')
+    30
+    """
+    query = urllib.parse.urlparse(totp_field_value).query
+    periods = urllib.parse.parse_qs(query).get('period')
+    return int(periods[0]) if periods else DEFAULT_TOTP_PERIOD_SECONDS
+
+
+def is_stale_id_error(error: Exception) -> bool:
+    """Checks whether an SDK error rejects a vault or item ID.
+
+    >>> is_stale_id_error(Exception("error getting item: item not found"))
+    True
+    >>> is_stale_id_error(Exception("Could not fetch Totp: invalid secret."))
+    False
+    """
+    return STALE_ID_ERROR.search(str(error)) is not None
+
+
+class IdIndex():
+    """A persisted index of vault and item titles to their IDs.
+
+    The index holds only identifiers, which are not secret. It is loaded
+    lazily on the first lookup and discarded once older than the TTL.
+    """
+
+    def __init__(self,
+                 path: Path = ID_INDEX_DEFAULT,
+                 ttl_seconds: float = ID_INDEX_TTL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self._path = path
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._index: Optional[dict] = None
+
+    def _empty_index(self) -> dict:
+        return {"created": self._clock(), "vaults": {}, "items": {}}
+
+    def _load(self) -> dict:
+        if self._index is not None:
+            return self._index
+        try:
+            with open(self._path, 'r') as f:
+                index = json.load(f)
+            if self._clock() - index["created"] > self._ttl_seconds:
+                logger.info("The 1Password ID index has expired.")
+                index = self._empty_index()
+        except (OSError, ValueError, KeyError, TypeError):
+            index = self._empty_index()
+        self._index = index
+        return index
+
+    def _save(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._load(), f)
+        os.replace(tmp_path, self._path)
+
+    def vault_id(self, vault_name: str) -> str | None:
+        return self._load()["vaults"].get(vault_name)
+
+    def item_id(self, vault_id: str, item_name: str) -> str | None:
+        return self._load()["items"].get(vault_id, {}).get(item_name)
+
+    def set_vault_ids(self, vault_ids: dict[str, str]) -> None:
+        """Replaces the indexed vaults."""
+        self._load()["vaults"] = vault_ids
+        self._save()
+
+    def set_item_ids(self, vault_id: str, item_ids: dict[str, str]) -> None:
+        """Replaces the indexed items of a vault."""
+        self._load()["items"][vault_id] = item_ids
+        self._save()
+
+    def invalidate(self) -> None:
+        self._index = self._empty_index()
+        self._save()
 
 
 class OpSdkClient():
     """A wrapper for the 1Password SDK client."""
 
-    def __init__(self, op_sdk_client: Client):
+    def __init__(self,
+                 op_sdk_client: Client,
+                 id_index: Optional[IdIndex] = None):
         self._op_sdk_client = op_sdk_client
+        self._id_index = id_index or IdIndex()
 
     @staticmethod
+    @traced
     async def connect(service_account_auth_token: str) -> 'OpSdkClient':
         """Creates a new 1Password SDK client and authenticates it."""
         client = await Client.authenticate(auth=service_account_auth_token,
@@ -50,28 +207,108 @@ class OpSdkClient():
 
     async def read(self, vault: str, item: str, field: str) -> str:
         """Reads a field from an item in a vault."""
-        return await self._op_sdk_client.secrets.resolve(
-            f"op://{vault}/{item}/{field}")
+        return (await self.read_fields(vault, item, [field]))[0]
 
+    async def read_fields(self, vault: str, item: str,
+                          fields: list[str]) -> list[str]:
+        """Reads fields from an item in a vault."""
+        return await self.read_many(
+            [secret_reference(vault, item, field) for field in fields])
+
+    @traced
+    async def read_many(self, references: list[str]) -> list[str]:
+        """Resolves secret references.
+
+        Resolves all references not resolved before in this process with a
+        single SDK call.
+
+        Raises:
+            Exception: If any of the references could not be resolved.
+        """
+        unresolved = [
+            r for r in dict.fromkeys(references) if r not in _resolved_secrets
+        ]
+        if unresolved:
+            response = await self._op_sdk_client.secrets.resolve_all(
+                unresolved)
+            resolved = {}
+            for reference in unresolved:
+                individual_response = response.individual_responses[
+                    reference]
+                if individual_response.content is None:
+                    raise Exception(f"Could not resolve {reference}: " +
+                                    f"{individual_response.error}.")
+                resolved[reference] = individual_response.content.secret
+            _resolved_secrets.update(resolved)
+        return [_resolved_secrets[r] for r in references]
+
+    @traced
     async def get_vault_id(self, vault_name: str) -> str | None:
-        async for vault in await self._op_sdk_client.vaults.list():
-            if vault.title == vault_name:
-                return vault.id
-        return None
+        """Looks up a vault ID, listing the vaults only on an index miss."""
+        vault_id = self._id_index.vault_id(vault_name)
+        if vault_id is None:
+            vaults = await self._op_sdk_client.vaults.list()
+            self._id_index.set_vault_ids({v.title: v.id for v in vaults})
+            vault_id = self._id_index.vault_id(vault_name)
+        return vault_id
 
+    @traced
     async def get_item_id(self, vault_id, item_name: str) -> str | None:
-        async for item in await self._op_sdk_client.items.list(vault_id):
-            if item.title == item_name:
-                return item.id
-        return None
+        """Looks up an item ID, listing the items only on an index miss."""
+        item_id = self._id_index.item_id(vault_id, item_name)
+        if item_id is None:
+            items = await self._op_sdk_client.items.list(vault_id)
+            self._id_index.set_item_ids(vault_id,
+                                        {i.title: i.id
+                                         for i in items})
+            item_id = self._id_index.item_id(vault_id, item_name)
+        return item_id
+
+    @traced
+    async def get_item_totp(self, vault_name: str, item_name: str) -> Totp:
+        """Fetches the TOTP of an item.
+
+        With a warm ID index, this is a single SDK call. If a lookup misses or
+        the SDK rejects the indexed IDs as stale, the index is rebuilt once.
+        Other errors propagate.
+
+        Raises:
+            Exception: If the TOTP could not be fetched.
+        """
+        try:
+            totp = await self._get_item_totp(vault_name, item_name)
+        except Exception as e:
+            if not is_stale_id_error(e):
+                raise
+            totp = None
+        if totp is None:
+            logger.info("Could not find the item. Rebuilding the ID index.")
+            self._id_index.invalidate()
+            totp = await self._get_item_totp(vault_name, item_name)
+        if totp is None:
+            raise Exception(f"Could not find the {item_name} item " +
+                            f"in the {vault_name} vault.")
+        return totp
+
+    async def _get_item_totp(self, vault_name: str,
+                             item_name: str) -> Totp | None:
+        """Returns None if the vault or the item can't be found."""
+        vault_id = await self.get_vault_id(vault_name)
+        if vault_id is None:
+            return None
+        item_id = await self.get_item_id(vault_id, item_name)
+        if item_id is None:
+            return None
+        return await self.get_totp(vault_id, item_id)
 
-    async def get_totp(self, vault_id, item_id) -> str:
+    async def get_totp(self, vault_id, item_id) -> Totp:
         """Fetches the TOTP of an item in a vault.
 
         Raises:
             Exception: If the TOTP could not be fetched.
         """
         item = await self._op_sdk_client.items.get(vault_id, item_id)
+        fetched_at = time.time()
         for f in item.fields:
             if f.field_type == "Totp":
                 if f.details.content.error_message is not None:
@@ -79,6 +316,8 @@ class OpSdkClient():
                         f'Could not fetch Totp: {f.details.content.error_message}.'
                     )
                 else:
-                    return f.details.content.code
+                    return Totp(code=f.details.content.code,
+                                period_seconds=totp_period_seconds(f.value),
+                                fetched_at=fetched_at)
         raise Exception(
             "Could not find the TOTP field for the 1Password item.")
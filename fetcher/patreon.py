@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
 """This module fetches the Patreon monthly receipt email."""
-import contextlib
 import email.message
 import time
-from pathlib import PurePath
 
 from . import gmail
+from .archive import OutputProtocol
+from .tracing import traced
 
 
 def get_text_payload(msg: email.message.Message) -> str:
@@ -18,20 +18,18 @@ def get_text_payload(msg: email.message.Message) -> str:
             "because Patreon message has an unexpected layout.", e)
 
 
-def save_file(content, target_dir: PurePath) -> None:
+def save_file(content, output: OutputProtocol) -> None:
     filename = 'patreon_{timestamp:d}.txt'.format(timestamp=int(time.time() *
                                                                 1000))
-    with open(target_dir / filename, 'w') as f:
-        f.write(content)
+    output.save('patreon', filename, content.encode())
 
 
-def fetch_and_archive_receipts(creds: gmail.Credentials,
-                               download_dir: PurePath) -> None:
-    with contextlib.closing(gmail.connect(creds)) as inbox:
-        receipt_mail_numbers = inbox.search_inbox(
-            "Your Patreon receipt is here")
-        for receipt_mail_number in receipt_mail_numbers:
-            msg = inbox.fetch(receipt_mail_number)
-            payload = get_text_payload(msg)
-            save_file(payload, download_dir)
-            inbox.archive(receipt_mail_number)
+@traced
+def fetch_and_archive_receipts(inbox: gmail.InboxProtocol,
+                               output: OutputProtocol) -> None:
+    receipt_mail_numbers = inbox.search_inbox("Your Patreon receipt is here")
+    for receipt_mail_number in receipt_mail_numbers:
+        msg = inbox.fetch(receipt_mail_number)
+        payload = get_text_payload(msg)
+        save_file(payload, output)
+        inbox.archive(receipt_mail_number)
@@ -1,15 +1,22 @@
 """A collection of utilities for working with Playwright."""
 
+import asyncio
 import contextlib
+import logging
 import pathlib
+import re
 import typing
 from enum import Enum
-from typing import Optional
+from typing import NamedTuple, Optional
 
 import playwright.async_api
 from playwright.async_api import async_playwright
 
+from . import metrics, tracing
 from .contextextra import async_closing
+from .har import Har, HarMode, current_har, sanitize_har_file
+
+logger = logging.getLogger("fetcher.playwrightutils")
 
 
 class Browser(Enum):
@@ -34,14 +41,20 @@ class Download:
 
     def __init__(self, download_info):
         self.download_info = download_info
+        # The URL of the downloaded resource and the request that fetched it, if
+        # the page made one. Downloads of blob: URLs have no request.
+        self.url = ""
+        self.request: Optional[playwright.async_api.Request] = None
 
     async def wait_for_download(self):
         download = await self.download_info.value
+        self.url = download.url
         download_path = await download.path()
         if not download_path:
             raise Exception("The download interception has failed.")
         with open(download_path, "rb") as f:
             self.value = f.read()
+        metrics.increment("bytes_downloaded", len(self.value))
 
     def downloaded_content(self) -> bytes:
         """Returns the bytes of the downloaded file."""
@@ -55,10 +68,108 @@ async def intercept_download(
     """An async context manager that waits for a download to finish.
 
     Returns the object representing the downloaded content."""
-    async with page.expect_download() as download_info:
-        download = Download(download_info)
-        yield download
-    await download.wait_for_download()
+    requests: dict[str, playwright.async_api.Request] = {}
+
+    def remember(request: playwright.async_api.Request) -> None:
+        requests[request.url] = request
+
+    page.on("request", remember)
+    try:
+        with tracing.span("playwright.download"):
+            async with page.expect_download() as download_info:
+                download = Download(download_info)
+                yield download
+            await download.wait_for_download()
+    finally:
+        page.remove_listener("request", remember)
+    download.request = requests.get(download.url)
+
+
+T = typing.TypeVar("T")
+R = typing.TypeVar("R")
+
+# The default number of pages that may work concurrently in one context.
+DEFAULT_MAX_CONCURRENCY = 3
+
+
+async def map_on_new_pages(
+    context: playwright.async_api.BrowserContext,
+    fn: typing.Callable[[playwright.async_api.Page, T], typing.Awaitable[R]],
+    items: typing.Iterable[T],
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> list[R]:
+    """Runs `fn` on a fresh page of the context for every item.
+
+    The pages share the context's cookies, so a single login is enough for all
+    of them. At most `max_concurrency` pages are open at any time.
+
+    :param context playwright.async_api.BrowserContext: A (logged-in) context.
+    :param fn: The job to run. It receives a blank page and the item.
+    :param items: The items to process.
+    :param max_concurrency int: The maximum number of concurrently open pages.
+    :return list[R]: The results in the order of `items`.
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be positive, got {max_concurrency}.")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(item: T) -> R:
+        async with semaphore, async_closing(await context.new_page()) as page:
+            return await fn(page, item)
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(run(item)) for item in items]
+    return [task.result() for task in tasks]
+
+
+class Field(NamedTuple):
+    """Specifies how to read a record field from a DOM element."""
+
+    # A CSS selector relative to the element. Empty selects the element itself.
+    selector: str = ""
+    # The attribute to read. None reads the stripped text content.
+    attribute: Optional[str] = None
+    # Whether to read all matching elements into a list.
+    multiple: bool = False
+
+
+# Reads fields from every element in the browser.
+_EXTRACT_ALL_JS = """(elements, fields) => elements.map(element =>
+  Object.fromEntries(Object.entries(fields).map(([name, field]) => {
+    const matches = field.selector
+      ? Array.from(element.querySelectorAll(field.selector))
+      : [element];
+    const read = e => {
+      if (e === undefined) return null;
+      if (field.attribute !== null) return e.getAttribute(field.attribute);
+      return e.textContent.trim();
+    };
+    return [name, field.multiple ? matches.map(read) : read(matches[0])];
+  })))"""
+
+RecordT = typing.TypeVar("RecordT", bound=tuple)
+
+
+async def extract_all(
+    locator: playwright.async_api.Locator,
+    record_type: typing.Callable[..., RecordT],
+    fields: dict[str, Field],
+) -> list[RecordT]:
+    """Reads records from all elements matched by the locator.
+
+    All fields of all elements are read in a single round trip to the
+    browser, unlike awaiting `text_content` for each cell.
+
+    :param locator playwright.async_api.Locator
+    :param record_type: A record type, e.g., a NamedTuple, constructed with
+        fields as keyword arguments.
+    :param fields dict[str, Field]: Field specifications by name.
+    :return list[RecordT]: A record for each element in document order.
+    """
+    rows = await locator.evaluate_all(
+        _EXTRACT_ALL_JS, {name: field._asdict() for name, field in fields.items()}
+    )
+    return [record_type(**row) for row in rows]
 
 
 @contextlib.asynccontextmanager
@@ -66,6 +177,7 @@ async def new_stack(
     browser_type: Browser,
     headless: bool = False,
     downloads_path: Optional[pathlib.Path] = None,
+    har: Optional[Har] = None,
 ) -> typing.AsyncIterator[
     tuple[
         playwright.async_api.Playwright,
@@ -80,17 +192,44 @@ async def new_stack(
     :param headless bool: Whether to run a fixed-viewport headless browser or a
     :param downloads_path Optional[pathlib.Path]: The path used for downloads.
     responsive one. Defaults to False.
+    :param har Optional[Har]: A HAR to record the context's traffic into, or to
+        replay the context's traffic from. Defaults to `har.current_har()`.
+        Replay aborts requests missing from the HAR, so it never hits the
+        network.
     """
-    async with (
-        async_playwright() as pw,
-        async_closing(
-            await get_browser_type(pw, browser_type).launch(
-                headless=headless, downloads_path=downloads_path
+    har = har or current_har()
+    async with contextlib.AsyncExitStack() as stack:
+        with tracing.span("playwright.start"):
+            pw = await stack.enter_async_context(async_playwright())
+        with tracing.span("playwright.launch", browser=browser_type.name):
+            browser = await stack.enter_async_context(
+                async_closing(
+                    await get_browser_type(pw, browser_type).launch(
+                        headless=headless, downloads_path=downloads_path
+                    )
+                )
+            )
+        record_har_path = None
+        if har is not None and har.mode == HarMode.RECORD:
+            record_har_path = har.path
+            # Playwright writes the HAR when the context closes.
+            stack.callback(sanitize_har_file, har.path)
+        context = await stack.enter_async_context(
+            async_closing(
+                await browser.new_context(
+                    no_viewport=not headless,
+                    record_har_path=record_har_path,
+                    record_har_content="embed",
+                )
             )
-        ) as browser,
-        async_closing(await browser.new_context(no_viewport=not headless)) as context,
-        async_closing(await context.new_page()) as page,
-    ):
+        )
+        if har is not None and har.mode == HarMode.REPLAY:
+            await context.route_from_har(har.path, not_found="abort")
+        trace_path = tracing.playwright_trace_path()
+        if trace_path:
+            await context.tracing.start(screenshots=True, snapshots=True)
+            stack.push_async_callback(context.tracing.stop, path=trace_path)
+        page = await stack.enter_async_context(async_closing(await context.new_page()))
         yield (pw, browser, context, page)
 
 
@@ -109,3 +248,208 @@ async def new_page(
     """
     async with new_stack(browser_type, headless, downloads_path) as (_, _, _, page):
         yield page
+
+
+class SessionState(NamedTuple):
+    """The authentication state of a browser context."""
+
+    storage_state: playwright.async_api.StorageState
+    headers: dict[str, str]
+
+
+# Headers that the HTTP session sets itself.
+_CONNECTION_HEADERS = frozenset({"connection", "content-length", "cookie", "host"})
+
+
+async def export_session_state(
+    context: playwright.async_api.BrowserContext,
+    request: Optional[playwright.async_api.Request] = None,
+) -> SessionState:
+    """Exports the cookies and headers of a (logged-in) context.
+
+    Some portals bind a session to the user agent or check the referer, so the
+    headers that the portal saw are exported too. They are those of `request`
+    if given, e.g., the request of a browser download. Otherwise, they are the
+    user agent, languages and URL of the context's first page.
+    """
+    headers = {}
+    if request is not None:
+        headers = {
+            name: value
+            for name, value in (await request.all_headers()).items()
+            if name.lower() not in _CONNECTION_HEADERS
+        }
+    elif context.pages:
+        page = context.pages[0]
+        user_agent, languages = await page.evaluate(
+            "[navigator.userAgent, navigator.languages]"
+        )
+        headers["User-Agent"] = user_agent
+        if languages:
+            headers["Accept-Language"] = ",".join(languages)
+        if page.url.startswith("http"):
+            headers["Referer"] = page.url
+    return SessionState(storage_state=await context.storage_state(), headers=headers)
+
+
+QueryParams = dict[str, str | float | bool]
+
+
+class HttpSession:
+    """An HTTP client that reuses the authentication of a browser context.
+
+    The underlying request context keeps connections alive, so repeated
+    requests to the same portal skip connection setup.
+    """
+
+    def __init__(self, request_context: playwright.async_api.APIRequestContext):
+        self._request_context = request_context
+
+    async def get(self, url: str, params: Optional[QueryParams] = None) -> bytes:
+        """Fetches the body of a resource.
+
+        :raises Exception: If the response status is not 2xx.
+        """
+        response = await self._request_context.get(url, params=params)
+        try:
+            if not response.ok:
+                raise Exception(f"Could not fetch {url}: HTTP {response.status}.")
+            body = await response.body()
+            metrics.increment("bytes_downloaded", len(body))
+            return body
+        finally:
+            await response.dispose()
+
+    async def download(
+        self,
+        url: str,
+        path: pathlib.Path,
+        params: Optional[QueryParams] = None,
+    ) -> None:
+        """Saves a resource to a file."""
+        content = await self.get(url, params)
+        await asyncio.to_thread(path.write_bytes, content)
+
+
+@contextlib.asynccontextmanager
+async def new_http_session(
+    state: SessionState, pw: Optional[playwright.async_api.Playwright] = None
+) -> typing.AsyncIterator[HttpSession]:
+    """Opens an HTTP session authenticated with the given state.
+
+    The session doesn't depend on the browser, so the browser may be closed
+    while the session is in use. Without `pw`, it starts its own Playwright.
+    """
+    async with contextlib.AsyncExitStack() as stack:
+        if pw is None:
+            pw = await stack.enter_async_context(async_playwright())
+        request_context = await pw.request.new_context(
+            storage_state=state.storage_state, extra_http_headers=state.headers
+        )
+        stack.push_async_callback(request_context.dispose)
+        yield HttpSession(request_context)
+
+
+async def fetch_with_browser_fallback(
+    http_fetch: typing.Callable[[], typing.Awaitable[R]],
+    browser_fetch: typing.Callable[[], typing.Awaitable[R]],
+) -> R:
+    """Fetches through HTTP and falls back to the browser on failure.
+
+    Direct export endpoints are not documented by the portals and can change
+    without notice, so the browser flow stays the source of truth. While a HAR
+    is recorded or replayed, only the browser is used, because HTTP sessions
+    bypass the HAR.
+    """
+    if current_har() is not None:
+        return await browser_fetch()
+    try:
+        return await http_fetch()
+    except Exception:
+        logger.warning(
+            "The HTTP fetch has failed. Falling back to the browser.", exc_info=True
+        )
+        return await browser_fetch()
+
+
+@contextlib.asynccontextmanager
+async def capture_json_response(
+    page: playwright.async_api.Page,
+    url: re.Pattern[str],
+    parse: typing.Callable[[typing.Any], Optional[T]],
+) -> typing.AsyncIterator[asyncio.Future[T]]:
+    """Captures data from a backend JSON response.
+
+    Portals render their pages from XHR/JSON responses. Reading the data from
+    the response lets a fetcher continue as soon as the payload arrives
+    instead of waiting for the page to render it.
+
+    Enter the context before triggering the request, e.g., before navigation.
+
+    :param page playwright.async_api.Page
+    :param url re.Pattern[str]: A pattern matched against response URLs.
+    :param parse: Extracts the data from a JSON payload. Returns None if the
+        payload doesn't contain the data.
+    :return: A future resolved with the first data extracted by `parse`.
+    """
+    future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+    tasks: set[asyncio.Task] = set()
+
+    async def handle(response: playwright.async_api.Response) -> None:
+        try:
+            payload = await response.json()
+        except Exception:
+            # Not a JSON response or the page has navigated away.
+            return
+        try:
+            value = parse(payload)
+        except Exception:
+            logger.debug(f"Could not parse the response from {response.url}.")
+            return
+        if value is not None and not future.done():
+            future.set_result(value)
+
+    def on_response(response: playwright.async_api.Response) -> None:
+        if future.done() or not url.search(response.url):
+            return
+        task = asyncio.create_task(handle(response))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    page.on("response", on_response)
+    try:
+        yield future
+    finally:
+        page.remove_listener("response", on_response)
+        for task in tasks:
+            task.cancel()
+        future.cancel()
+
+
+async def race_capture(
+    capture: asyncio.Future[T],
+    fallback: typing.Callable[[], typing.Awaitable[T]],
+) -> T:
+    """Returns the captured data or the fallback's, whichever comes first.
+
+    Backend endpoints change without notice, so every capture has a DOM-based
+    fallback. It runs concurrently with the capture instead of after a timeout,
+    so a capture that never matches costs nothing. The loser is cancelled.
+
+    :param capture: A future from `capture_json_response`.
+    :param fallback: Fetches the data some other way.
+    :raises: The fallback's exception if it fails before the capture arrives.
+    """
+    fallback_task = asyncio.ensure_future(fallback())
+    try:
+        await asyncio.wait(
+            [capture, fallback_task], return_when=asyncio.FIRST_COMPLETED
+        )
+        if capture.done() and not capture.cancelled():
+            return capture.result()
+        logger.info("The response capture hasn't arrived. Using the fallback.")
+        return fallback_task.result()
+    finally:
+        fallback_task.cancel()
+        capture.cancel()
+
@@ -0,0 +1,139 @@
+"""CPU and allocation profiling of fetcher commands.
+
+The profilers run around the whole command, including its event loop, so all
+asyncio tasks are covered. A suspended coroutine doesn't accumulate time, and
+each resumption counts as a call.
+
+cProfile also sees worker threads (e.g., `asyncio.to_thread`), but it merges
+their calls into the main thread's stacks. Prefer the allocation profile or a
+trace (`--trace`) for thread-heavy steps.
+"""
+
+import contextlib
+import cProfile
+import enum
+import logging
+import pstats
+import threading
+import tracemalloc
+import typing
+from pathlib import Path
+
+logger = logging.getLogger("fetcher.profiling")
+
+# The number of frames tracemalloc stores per allocation.
+ALLOC_TRACEBACK_FRAMES = 5
+# How often the allocation profiler checks for a new peak.
+ALLOC_SAMPLE_SECONDS = 0.01
+# How much the traced memory must grow past the last peak snapshot to take a
+# new one. Snapshots are slow, so they're not taken on every small growth.
+ALLOC_PEAK_GROWTH = 1.1
+
+
+class Profiler(enum.Enum):
+    CPU = "cpu"
+    ALLOC = "alloc"
+
+    @property
+    def file_suffix(self) -> str:
+        return ".pstats" if self is Profiler.CPU else ".tracemalloc"
+
+
+@contextlib.contextmanager
+def profile_cpu(output: Path, top: int, stream: typing.TextIO) -> typing.Iterator[None]:
+    """Profiles CPU time with cProfile.
+
+    Writes the stats to `output` (open it with `python -m pstats`) and the top
+    functions by own time to `stream`.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output)
+        stream.write(f"CPU profile saved to {output}. Top {top} by own time:\n")
+        pstats.Stats(profiler, stream=stream).sort_stats(
+            pstats.SortKey.TIME
+        ).print_stats(top)
+
+
+class _PeakSnapshots:
+    """Keeps a tracemalloc snapshot of the highest traced memory seen."""
+
+    def __init__(self) -> None:
+        self.snapshot: tracemalloc.Snapshot | None = None
+        self.size = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self) -> None:
+        current, _ = tracemalloc.get_traced_memory()
+        if self.snapshot is None or current > self.size * ALLOC_PEAK_GROWTH:
+            self.snapshot = tracemalloc.take_snapshot()
+            self.size = current
+
+    def _run(self) -> None:
+        while not self._stopped.wait(ALLOC_SAMPLE_SECONDS):
+            self.sample()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+        self.sample()
+
+
+@contextlib.contextmanager
+def profile_alloc(
+    output: Path, top: int, stream: typing.TextIO
+) -> typing.Iterator[None]:
+    """Profiles memory allocations with tracemalloc.
+
+    A background thread samples the traced memory every ALLOC_SAMPLE_SECONDS
+    and snapshots the allocations whenever it reaches a new peak, so the
+    profile shows what was alive at the peak rather than at exit. Peaks shorter
+    than the sampling interval may be missed.
+
+    Writes the peak snapshot to `output` (load it with
+    `tracemalloc.Snapshot.load`) and its top lines and the exact peak to
+    `stream`.
+    """
+    tracemalloc.start(ALLOC_TRACEBACK_FRAMES)
+    peaks = _PeakSnapshots()
+    peaks.start()
+    try:
+        yield
+    finally:
+        peaks.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peaks.snapshot is not None
+        snapshot = peaks.snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ]
+        )
+        snapshot.dump(str(output))
+        stream.write(
+            f"Allocation profile saved to {output}. "
+            + f"Peak traced memory: {peak / 1024:.1f} KiB. "
+            + f"Top {top} lines by memory at the sampled peak "
+            + f"({peaks.size / 1024:.1f} KiB):\n"
+        )
+        for stat in snapshot.statistics("lineno")[:top]:
+            stream.write(f"  {stat}\n")
+
+
+def profile(
+    profiler: Profiler, output: Path, top: int, stream: typing.TextIO
+) -> typing.ContextManager[None]:
+    """Profiles the enclosed block with the given profiler."""
+    if profiler is Profiler.CPU:
+        return profile_cpu(output, top, stream)
+    return profile_alloc(output, top, stream)
@@ -0,0 +1,270 @@
+"""A full-text index of fetched receipts.
+
+The mail fetchers save receipts as small text files: NAME.galaxus,
+NAME.email (Google Play), NAME.ubereats and patreon_TIMESTAMP.txt. The index
+keeps each receipt's provider, date, amount, subject and text in an SQLite
+database with an FTS5 table, so a search doesn't read any receipt file.
+
+Receipts are indexed as they're saved (see `IndexingOutput`). Older files can
+be read with `read_receipt_file` and indexed in bulk with `ReceiptIndex.add_all`.
+Indexing the same receipt again is a no-op.
+"""
+
+import datetime
+import email.utils
+import gzip
+import hashlib
+import re
+import sqlite3
+import typing
+from pathlib import Path
+
+from .archive import OutputProtocol
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS receipts (
+    id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL UNIQUE,
+    provider TEXT NOT NULL,
+    day TEXT,
+    amount TEXT,
+    subject TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipts_day ON receipts (day);
+CREATE VIRTUAL TABLE IF NOT EXISTS receipts_fts USING fts5(
+    subject,
+    text,
+    content='receipts',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+# An amount with its currency, e.g., "CHF 15.90" or "$5.00".
+_AMOUNT = re.compile(r"(?:[A-Z]{3} ?|[$€£])\d[\d',]*\.\d{2}")
+_GOOGLE_PLAY_DATE = re.compile(r"Order date: (\w+ \d{1,2}, \d{4})")
+_GOOGLE_PLAY_TOTAL = re.compile(r"Total: (\S+ [\d',.]+)")
+
+
+class Receipt(typing.NamedTuple):
+    provider: str
+    subject: str
+    text: str
+    day: datetime.date | None
+    amount: str | None
+
+
+class Hit(typing.NamedTuple):
+    provider: str
+    day: datetime.date | None
+    amount: str | None
+    subject: str
+    snippet: str
+
+
+def _parse_email_date(value: str) -> datetime.date | None:
+    try:
+        return email.utils.parsedate_to_datetime(value).date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _last_amount(text: str) -> str | None:
+    amounts = _AMOUNT.findall(text)
+    return amounts[-1] if amounts else None
+
+
+def provider_of(name: str) -> str | None:
+    """Returns the provider of a receipt file's name or None if it isn't one.
+
+    >>> provider_of("Danke für deine Bestellung 85231628.galaxus.gz")
+    'galaxus'
+    >>> provider_of("patreon_1681296049000.txt")
+    'patreon'
+    >>> provider_of("revolut_CHF_2024-01-01_2024-03-31.csv") is None
+    True
+    """
+    name = name.removesuffix(".gz")
+    if name.startswith("patreon_") and name.endswith(".txt"):
+        return "patreon"
+    return {
+        ".galaxus": "galaxus",
+        ".email": "google_play",
+        ".ubereats": "ubereats",
+    }.get(Path(name).suffix)
+
+
+def parse_receipt(provider: str, name: str, text: str) -> Receipt:
+    """Extracts the date and the amount of a saved receipt.
+
+    :param provider str: The receipt's provider, see `provider_of`.
+    :param name str: The receipt file's name.
+    :param text str: The receipt file's content.
+
+    >>> parse_receipt(
+    ...     "galaxus",
+    ...     "Danke für deine Bestellung 85231628.galaxus",
+    ...     "Wed, 12 Apr 2023 10:40:49 +0000\\nOmega 3\\nGesamtbetrag\\n39.20\\n",
+    ... )[3:]
+    (datetime.date(2023, 4, 12), '39.20')
+    >>> parse_receipt(
+    ...     "ubereats", "Wed, 12 Apr 2023 18:01:02 +0200.ubereats",
+    ...     "PaymentsVisa ****1234 CHF 20.50",
+    ... )[3:]
+    (datetime.date(2023, 4, 12), 'CHF 20.50')
+    """
+    name = name.removesuffix(".gz")
+    subject = name.rsplit(".", 1)[0]
+    day: datetime.date | None = None
+    amount: str | None = None
+    if provider == "galaxus":
+        day = _parse_email_date(text.split("\n", 1)[0])
+        lines = text.splitlines()
+        if "Gesamtbetrag" in lines[:-1]:
+            amount = lines[lines.index("Gesamtbetrag") + 1]
+    elif provider == "google_play":
+        if match := _GOOGLE_PLAY_DATE.search(text):
+            try:
+                day = datetime.datetime.strptime(match[1], "%B %d, %Y").date()
+            except ValueError:
+                pass
+        if match := _GOOGLE_PLAY_TOTAL.search(text):
+            amount = match[1].rstrip(".,")
+    elif provider == "ubereats":
+        # The fetcher names Uber Eats receipts after the email's date.
+        day = _parse_email_date(subject)
+        amount = _last_amount(text)
+    elif provider == "patreon":
+        timestamp = subject.removeprefix("patreon_")
+        if timestamp.isdigit():
+            day = datetime.date.fromtimestamp(int(timestamp) / 1000)
+        amount = _last_amount(text)
+    return Receipt(provider, subject, text, day, amount)
+
+
+class ReceiptIndex:
+    """An SQLite full-text index of receipts."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def add(self, receipt: Receipt) -> bool:
+        """Indexes the receipt and returns whether it wasn't indexed before."""
+        return self.add_all([receipt]) == 1
+
+    def add_all(self, receipts: typing.Iterable[Receipt]) -> int:
+        """Indexes the receipts in one transaction.
+
+        :return int: The number of receipts that weren't indexed before.
+        """
+        added = 0
+        with self._connection:
+            for receipt in receipts:
+                digest = hashlib.sha256(
+                    f"{receipt.provider}\0{receipt.subject}\0{receipt.text}".encode()
+                ).digest()
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO receipts "
+                    + "(hash, provider, day, amount, subject, text) "
+                    + "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        digest,
+                        receipt.provider,
+                        receipt.day.isoformat() if receipt.day else None,
+                        receipt.amount,
+                        receipt.subject,
+                        receipt.text,
+                    ),
+                )
+                if not cursor.rowcount:
+                    continue
+                self._connection.execute(
+                    "INSERT INTO receipts_fts (rowid, subject, text) "
+                    + "VALUES (?, ?, ?)",
+                    (cursor.lastrowid, receipt.subject, receipt.text),
+                )
+                added += 1
+        return added
+
+    def search(
+        self,
+        query: str,
+        provider: str | None = None,
+        start: datetime.date | None = None,
+        end: datetime.date | None = None,
+        limit: int = 20,
+    ) -> list[Hit]:
+        """Returns the receipts that match an FTS5 query, best matches first.
+
+        :param query str: An FTS5 query, e.g., `omega` or `"uber eats" OR pizza`.
+        :param start datetime.date | None: The first day of the receipts.
+        :param end datetime.date | None: The last day of the receipts.
+        """
+        conditions = ["receipts_fts MATCH ?"]
+        parameters: list[typing.Any] = [query]
+        if provider:
+            conditions.append("r.provider = ?")
+            parameters.append(provider)
+        if start:
+            conditions.append("r.day >= ?")
+            parameters.append(start.isoformat())
+        if end:
+            conditions.append("r.day <= ?")
+            parameters.append(end.isoformat())
+        rows = self._connection.execute(
+            "SELECT r.provider, r.day, r.amount, r.subject, "
+            + "snippet(receipts_fts, 1, '[', ']', '…', 8) "
+            + "FROM receipts_fts JOIN receipts AS r ON r.id = receipts_fts.rowid "
+            + f"WHERE {' AND '.join(conditions)} ORDER BY rank LIMIT ?",
+            (*parameters, limit),
+        ).fetchall()
+        return [
+            Hit(
+                provider,
+                datetime.date.fromisoformat(day) if day else None,
+                amount,
+                subject,
+                " ".join(snippet.split()),
+            )
+            for provider, day, amount, subject, snippet in rows
+        ]
+
+
+def read_receipt_file(path: Path) -> Receipt | None:
+    """Reads a saved receipt file, possibly an archive link.
+
+    :return Receipt | None: The receipt or None if the file isn't one.
+    """
+    provider = provider_of(path.name)
+    if provider is None:
+        return None
+    content = path.read_bytes()
+    if path.suffix == ".gz":
+        content = gzip.decompress(content)
+    return parse_receipt(provider, path.name, content.decode("utf-8"))
+
+
+class IndexingOutput:
+    """An output that also indexes the receipts that it saves."""
+
+    def __init__(self, output: OutputProtocol, index: ReceiptIndex):
+        self.output = output
+        self.index = index
+
+    def save(
+        self,
+        provider: str,
+        name: str,
+        content: bytes,
+        day: datetime.date | None = None,
+    ) -> Path:
+        path = self.output.save(provider, name, content, day)
+        if provider_of(name) == provider:
+            self.index.add(parse_receipt(provider, name, content.decode("utf-8")))
+        return path
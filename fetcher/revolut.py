@@ -3,12 +3,18 @@ import asyncio
 import pathlib
 import re
 from datetime import date, timedelta
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 import playwright
 import playwright.async_api
 
+from .playwrightutils import DEFAULT_MAX_CONCURRENCY, map_on_new_pages
+from .tracing import traced
 
+HOME_PAGE = 'https://app.revolut.com/home'
+
+
+@traced
 async def login(page: playwright.async_api.Page) -> None:
     """
     Logs in to Revolut.
@@ -18,7 +24,7 @@ async def login(page: playwright.async_api.Page) -> None:
     """
     await page.goto('https://app.revolut.com/start')
     # Assuming that the user uses the QR code login method.
-    await page.wait_for_url('https://app.revolut.com/home')
+    await page.wait_for_url(HOME_PAGE)
 
 
 async def accept_cookies_on_revolut(page: playwright.async_api.Page) -> None:
@@ -48,6 +54,14 @@ def date_to_month_year(d: date) -> MonthYear:
     return MonthYear(month=(d.month - 1), year=d.year)
 
 
+def month_year_to_date(my: MonthYear) -> date:
+    """
+    >>> month_year_to_date(MonthYear(month=0, year=2022))
+    datetime.date(2022, 1, 1)
+    """
+    return date(my.year, my.month + 1, 1)
+
+
 def three_months_ago(start_date: date) -> date:
     """
     >>> three_months_ago(date(2022, 4, 4))
@@ -78,9 +92,55 @@ def monthYearToRevolutLabel(my: MonthYear) -> str:
     return f"{months[my.month]} {my.year}"
 
 
+def statement_filename(currency: str, from_date: date, to_date: date,
+                       suggested_filename: str) -> str:
+    """
+    Returns a deterministic name for a downloaded statement.
+
+    Revolut's suggested names do not always contain the currency, so
+    statements downloaded concurrently could overwrite each other.
+
+    >>> statement_filename('CHF', date(2022, 1, 1), date(2022, 4, 4),
+    ...                    'account-statement_2022-01-01_2022-04-04.csv')
+    'revolut_CHF_2022-01-01_2022-04-04.csv'
+    """
+    suffix = pathlib.PurePath(suggested_filename).suffix
+    return (f'revolut_{currency}_{from_date.isoformat()}' +
+            f'_{to_date.isoformat()}{suffix}')
+
+
+async def go_to_statement_dialog(page: playwright.async_api.Page) -> None:
+    """Opens the statement dialog.
+
+    Assumes that the page's context is logged in.
+    """
+    if page.url != HOME_PAGE:
+        await page.goto(HOME_PAGE)
+    await page.get_by_role("button", name="Statement").click()
+
+
+async def select_year(page: playwright.async_api.Page, year: int) -> None:
+    """Moves the opened month picker to the given year."""
+    heading = page.locator('div[role="grid"] [role="heading"]')
+    year_string = await heading.text_content()
+    if not year_string:
+        return
+    years_back = int(year_string) - year
+    if years_back > 0:
+        # Issue all clicks in a single input action instead of reading the
+        # heading back after each one.
+        await page.get_by_role("button",
+                               name="Previous").click(click_count=years_back)
+    await heading.filter(has_text=str(year)).wait_for()
+
+
+@traced
 async def download_statement(page: playwright.async_api.Page, currency: str,
                              current_year: int, from_my: MonthYear):
-    """Downloads a single statement."""
+    """Downloads a single statement.
+
+    Assumes that the statement dialog is open.
+    """
     await page.get_by_role("tab", name="Excel").click()
     await page.get_by_role("button", name=re.compile("account")).click()
     await page.get_by_role("button", name=currency).click()
@@ -93,18 +153,7 @@ async def download_statement(page: playwright.async_api.Page, currency: str,
         has_text=re.compile("Starting on")).filter(
             has_text=re.compile(f"{current_year}")).last.click())
 
-    async def get_current_selected_year() -> int | None:
-        year_string = await page.locator('div[role="grid"] [role="heading"]'
-                                         ).text_content()
-        if not year_string:
-            return None
-        return int(year_string)
-
-    current_selected_year = await get_current_selected_year()
-
-    while current_selected_year and current_selected_year > from_my.year:
-        await page.get_by_role("button", name="Previous").click()
-        current_selected_year = await get_current_selected_year()
+    await select_year(page, from_my.year)
 
     await page.locator(f'div[aria-label="{monthYearToRevolutLabel(from_my)}"]'
                        ).click()
@@ -123,27 +172,56 @@ async def download_statement(page: playwright.async_api.Page, currency: str,
             await page.get_by_role("button", name="Download").click()
 
 
-async def download_statements(page: playwright.async_api.Page,
-                              download_dir: pathlib.Path,
-                              currencies: list[str]) -> None:
-    """Downloads Revolut's account statements."""
+@traced
+async def download_statements(
+        context: playwright.async_api.BrowserContext,
+        download_dir: pathlib.Path,
+        currencies: list[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        from_date: Optional[date] = None) -> list[pathlib.Path]:
+    """Downloads Revolut's account statements.
+
+    Every currency is downloaded on its own page of the logged-in context.
+
+    :param context playwright.async_api.BrowserContext: A logged-in context.
+    :param download_dir pathlib.Path: The directory to save the statements to.
+    :param currencies list[str]: The currencies of the accounts to download.
+    :param max_concurrency int: The maximum number of concurrent downloads.
+    :param from_date Optional[date]: The first day of the statements. Revolut
+        starts statements at a month, so it is rounded down to one. Defaults to
+        three months ago.
+    :return list[pathlib.Path]: The saved statements in currency order.
+    """
     today = date.today()
-    for currency in currencies:
+    from_my = date_to_month_year(from_date or three_months_ago(today))
+
+    async def download_currency_statement(page: playwright.async_api.Page,
+                                          currency: str) -> pathlib.Path:
+        await go_to_statement_dialog(page)
         async with page.expect_download() as download_info:
             await download_statement(page,
                                      currency=currency,
                                      current_year=today.year,
-                                     from_my=date_to_month_year(
-                                         three_months_ago(today)))
+                                     from_my=from_my)
         download = await download_info.value
-        await download.save_as(download_dir / download.suggested_filename)
-
-
-async def login_and_download_statements(page: playwright.async_api.Page,
-                                        download_dir: pathlib.Path,
-                                        currencies: list[str]) -> None:
+        path = download_dir / statement_filename(
+            currency, month_year_to_date(from_my), today,
+            download.suggested_filename)
+        await download.save_as(path)
+        return path
+
+    return await map_on_new_pages(context, download_currency_statement,
+                                  currencies, max_concurrency)
+
+
+async def login_and_download_statements(
+        page: playwright.async_api.Page,
+        download_dir: pathlib.Path,
+        currencies: list[str],
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        from_date: Optional[date] = None) -> list[pathlib.Path]:
     """Logs in and downloads Revolut's account statements."""
     await login(page)
     await accept_cookies_on_revolut(page)
-    await page.get_by_role("button", name="Statement").click()
-    await download_statements(page, download_dir, currencies)
+    return await download_statements(page.context, download_dir, currencies,
+                                     max_concurrency, from_date)
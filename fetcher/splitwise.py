@@ -7,6 +7,7 @@ from typing import List, NamedTuple, Tuple
 import splitwise  # type: ignore
 
 from . import op
+from .tracing import traced
 
 
 class Credentials(NamedTuple):
@@ -18,11 +19,8 @@ class Credentials(NamedTuple):
 async def fetch_credentials(op_client: op.OpSdkClient) -> Credentials:
     """Fetches credentials from my 1Password vault."""
     op_item = "Splitwise"
-    consumer_key = await op_client.read(op.FINDATA_VAULT, op_item,
-                                        "consumer key")
-    consumer_secret = await op_client.read(op.FINDATA_VAULT, op_item,
-                                           "credential")
-    api_key = await op_client.read(op.FINDATA_VAULT, op_item, "api key")
+    consumer_key, consumer_secret, api_key = await op_client.read_fields(
+        op.FINDATA_VAULT, op_item, ["consumer key", "credential", "api key"])
     return Credentials(consumer_key=consumer_key,
                        consumer_secret=consumer_secret,
                        api_key=api_key)
@@ -40,6 +38,7 @@ def fetch_balance(friend: splitwise.Friend) -> Tuple[str, str, List[Money]]:
     ])
 
 
+@traced
 def fetch_balances(creds: Credentials) -> List[Tuple[str, str, Money]]:
     """Fetches Splitwise balance.
 
@@ -4,50 +4,226 @@ Fetch my accounting data from various sources.
 Usage: python -m fetcher.tool --help
 """
 
-import asyncio
-import contextlib
-import csv
-import decimal
+import importlib
 import json
 import logging
 import os
 import sys
 import typing
-from pathlib import Path, PurePath
+from pathlib import Path
 
 import click
-from playwright.async_api import async_playwright
-
-from . import (
-    bcge,
-    bcgecc,
-    coop_supercard,
-    degiro,
-    easyride,
-    finpension,
-    galaxus,
-    gmail,
-    google_play_mail,
-    ib,
-    mbank,
-    op,
-    patreon,
-    playwrightutils,
-    revolut,
-    splitwise,
-    ubereats,
-)
-from .playwrightutils import Browser
+from click.shell_completion import CompletionItem
+from click.utils import make_default_short_help
 
-pw = async_playwright
+from . import har, metrics, profiling, tracing
 
 LOGGING_FILE_CFG_KEY = "logging_file"
+LEDGER_DIRECTORY_CFG_KEY = "ledger_directory"
+METRICS_DIRECTORY_CFG_KEY = "metrics_directory"
+METRICS_TEXTFILE_DIRECTORY_CFG_KEY = "metrics_textfile_directory"
+RECEIPTS_INDEX_CFG_KEY = "receipts_index"
+WATERMARKS_FILE_CFG_KEY = "watermarks_file"
 
 XDG_CONFIG_HOME = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
 FETCHER_CONFIG_DEFAULT: str = os.path.join(XDG_CONFIG_HOME, "findata", "fetcher.json")
 
 
-@click.group()
+class LazyCommand(typing.NamedTuple):
+    """A registry entry of a command that is imported on first use."""
+
+    # The command's location, e.g., "fetcher.commands.bcge:pull_bcge".
+    import_path: str
+    # The first sentence of the command's docstring for `--help` listings.
+    short_help: str
+
+
+# All commands of the CLI by name.
+#
+# Provider modules pull in Playwright, BeautifulSoup, and API clients, which
+# take hundreds of milliseconds to import, so each command is imported only
+# when it's invoked.
+COMMANDS: dict[str, LazyCommand] = {
+    "coop-supercard-pull": LazyCommand(
+        "fetcher.commands.coop_supercard:coop_supercard_pull",
+        "Fetches Coop receipt PDFs from coop.ch.",
+    ),
+    "cs-send-wire-to-ib": LazyCommand(
+        "fetcher.commands.ib:cs_send_wire_to_ib",
+        "Sends a wire transfer to Interactive Brokers.",
+    ),
+    "degiro-account-pull": LazyCommand(
+        "fetcher.commands.degiro:degiro_account_pull",
+        "Fetches Degiro's account statement and outputs a CSV file.",
+    ),
+    "degiro-portfolio-pull": LazyCommand(
+        "fetcher.commands.degiro:degiro_portfolio_pull",
+        "Fetches Degiro's portfolio statement and outputs a CSV file.",
+    ),
+    "degiro-pull": LazyCommand(
+        "fetcher.commands.degiro:degiro_pull",
+        "Fetches multiple Degiro statements with a single login.",
+    ),
+    "ib-activity-backfill": LazyCommand(
+        "fetcher.commands.ib:ib_activity_backfill",
+        "Pulls Interactive Brokers' activity statement for any date range.",
+    ),
+    "ib-activity-pull": LazyCommand(
+        "fetcher.commands.ib:ib_activity_pull",
+        "Pulls Interactive Brokers' activity statement.",
+    ),
+    "ib-cancel-pending-deposits": LazyCommand(
+        "fetcher.commands.ib:ib_cancel_pending_deposits",
+        "Cancels all pending deposits.",
+    ),
+    "ib-set-up-incoming-deposit": LazyCommand(
+        "fetcher.commands.ib:ib_set_up_incoming_deposit",
+        "Sets up an incoming deposit on Interactive Brokers.",
+    ),
+    "ledger-export": LazyCommand(
+        "fetcher.commands.ledger:ledger_export",
+        "Outputs the ledger rows added since the last export as a CSV file.",
+    ),
+    "ledger-merge": LazyCommand(
+        "fetcher.commands.ledger:ledger_merge",
+        "Merges a CSV statement into the account's ledger.",
+    ),
+    "pull-bcge": LazyCommand(
+        "fetcher.commands.bcge:pull_bcge",
+        "Fetches BCGE data and outputs a CSV file.",
+    ),
+    "pull-bcgecc": LazyCommand(
+        "fetcher.commands.bcgecc:pull_bcgecc",
+        "Fetches BCGE CC data and outputs a PDF.",
+    ),
+    "pull-easyride-receipts": LazyCommand(
+        "fetcher.commands.easyride:pull_easyride_receipts",
+        "Fetches EasyRide receipt PDFs.",
+    ),
+    "pull-finpension": LazyCommand(
+        "fetcher.commands.finpension:pull_finpension",
+        "Prints Finpension’s portfolio total.",
+    ),
+    "pull-galaxus": LazyCommand(
+        "fetcher.commands.galaxus:pull_galaxus",
+        "Fetches Digitec-Galaxus receipts in text format.",
+    ),
+    "pull-google-play-mail": LazyCommand(
+        "fetcher.commands.google_play_mail:pull_google_play_mail",
+        "Fetches Google Play receipts in text format.",
+    ),
+    "pull-mbank": LazyCommand(
+        "fetcher.commands.mbank:pull_mbank",
+        "Fetches mBank's data and outputs a CSV file.",
+    ),
+    "pull-patreon": LazyCommand(
+        "fetcher.commands.patreon:pull_patreon",
+        "Fetches Patreon receipts in text format.",
+    ),
+    "pull-splitwise": LazyCommand(
+        "fetcher.commands.splitwise:pull_splitwise",
+        "Fetches the Splitwise statement.",
+    ),
+    "pull-uber-eats": LazyCommand(
+        "fetcher.commands.ubereats:pull_uber_eats",
+        "Fetches Uber Eats receipts in text format.",
+    ),
+    "receipts-index": LazyCommand(
+        "fetcher.commands.receipts:receipts_index",
+        "Indexes saved receipt files for receipts-search.",
+    ),
+    "receipts-search": LazyCommand(
+        "fetcher.commands.receipts:receipts_search",
+        "Searches the receipts, best matches first.",
+    ),
+    "revolut-pull": LazyCommand(
+        "fetcher.commands.revolut:revolut_pull",
+        "Fetches Revolut data into CSV files.",
+    ),
+    "stats": LazyCommand(
+        "fetcher.commands.stats:stats",
+        "Prints p50/p95 durations of provider steps from the run history.",
+    ),
+}
+
+# Commands whose runs are not recorded in the metrics history.
+UNMETERED_COMMANDS = {
+    "ledger-export",
+    "ledger-merge",
+    "receipts-index",
+    "receipts-search",
+    "stats",
+}
+
+
+class LazyGroup(click.Group):
+    """A group that imports its commands only when they're invoked.
+
+    `--help` listings and shell completion read the registry, so they don't
+    import any command.
+    """
+
+    def __init__(self, *args, lazy_commands: dict[str, LazyCommand], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted(self.lazy_commands)
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        lazy_command = self.lazy_commands.get(cmd_name)
+        if lazy_command is None:
+            return None
+        module_name, attribute = lazy_command.import_path.split(":")
+        command = getattr(importlib.import_module(module_name), attribute)
+        if not isinstance(command, click.Command):
+            raise Exception(f"{lazy_command.import_path} is not a Click command.")
+        return command
+
+    def format_commands(
+        self, ctx: click.Context, formatter: click.HelpFormatter
+    ) -> None:
+        if not self.lazy_commands:
+            return
+        limit = formatter.width - 6 - max(len(name) for name in self.lazy_commands)
+        rows = [
+            (name, make_default_short_help(self.lazy_commands[name].short_help, limit))
+            for name in self.list_commands(ctx)
+        ]
+        with formatter.section("Commands"):
+            formatter.write_dl(rows)
+
+    def shell_complete(
+        self, ctx: click.Context, incomplete: str
+    ) -> list[CompletionItem]:
+        results = [
+            CompletionItem(name, help=self.lazy_commands[name].short_help)
+            for name in self.list_commands(ctx)
+            if name.startswith(incomplete)
+        ]
+        # Complete the group's own options without listing the commands again.
+        results.extend(click.Command.shell_complete(self, ctx, incomplete))
+        return results
+
+
+class FetcherGroup(LazyGroup):
+    """The CLI's group. It records the outcome of every run in its metrics."""
+
+    def invoke(self, ctx: click.Context) -> typing.Any:
+        try:
+            return super().invoke(ctx)
+        except (click.exceptions.Exit, click.ClickException):
+            # Help and usage errors do no provider work.
+            if run := metrics.current_run():
+                run.discarded = True
+            raise
+        except BaseException as e:
+            if run := metrics.current_run():
+                run.fail(e)
+            raise
+
+
+@click.group(cls=FetcherGroup, lazy_commands=COMMANDS)
 @click.option(
     "--config_file",
     default=FETCHER_CONFIG_DEFAULT,
@@ -58,8 +234,65 @@ FETCHER_CONFIG_DEFAULT: str = os.path.join(XDG_CONFIG_HOME, "findata", "fetcher.
 @click.option(
     "--logtostderr/--no-logtostderr", default=False, help="Whether to log to STDERR."
 )
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Saves a trace of the run's steps to this file. "
+    + "Open it in chrome://tracing or https://ui.perfetto.dev.",
+)
+@click.option(
+    "--trace-playwright/--no-trace-playwright",
+    default=False,
+    help="With --trace, also saves a Playwright trace to TRACE.playwright.zip. "
+    + "Open it with `playwright show-trace`.",
+)
+@click.option(
+    "--profile",
+    "profiler",
+    type=click.Choice([p.value for p in profiling.Profiler]),
+    help="Profiles the command: cpu with cProfile, alloc with tracemalloc. "
+    + "Prints the top entries to STDERR.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="The profile file (default: COMMAND.pstats or COMMAND.tracemalloc).",
+)
+@click.option(
+    "--profile-top",
+    default=25,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="The number of profile entries to print.",
+)
+@click.option(
+    "--record-har",
+    type=click.Path(dir_okay=False, writable=True, path_type=Path),
+    help="Records the browser traffic into this HAR file, without credentials "
+    + "and cookies. The file still contains financial data.",
+)
+@click.option(
+    "--replay-har",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Replays the browser traffic from this HAR file instead of the network. "
+    + "The run is not recorded in the metrics.",
+)
 @click.pass_context
-def cli(ctx, config_file: typing.TextIO, logtostderr: bool):
+def cli(
+    ctx,
+    config_file: typing.TextIO,
+    logtostderr: bool,
+    trace_file: Path | None,
+    trace_playwright: bool,
+    profiler: str | None,
+    profile_output: Path | None,
+    profile_top: int,
+    record_har: Path | None,
+    replay_har: Path | None,
+):
+    if record_har and replay_har:
+        raise click.UsageError("--record-har and --replay-har are exclusive.")
     config = json.load(config_file)
     assert isinstance(config, dict)
 
@@ -71,357 +304,55 @@ def cli(ctx, config_file: typing.TextIO, logtostderr: bool):
     stderr.setLevel(logging.INFO if logtostderr else logging.WARNING)
     logging.getLogger("").addHandler(stderr)
 
-
-def read_config_from_context(ctx):
-    return ctx.obj["config"]
-
-
-@cli.command()
-@click.pass_context
-def pull_bcge(ctx) -> None:
-    """Fetches BCGE data and outputs a CSV file."""
-    config = read_config_from_context(ctx)
-    download_directory = PurePath(config["download_directory"])
-
-    async def run():
-        credentials = await bcge.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(
-            Browser.CHROMIUM, downloads_path=download_directory
-        ) as p:
-            statement = await bcge.fetch_account_statement(p, credentials)
-        sys.stdout.buffer.write(statement)
-
-    asyncio.run(run())
-
-
-@cli.command()
-def pull_bcgecc() -> None:
-    """Fetches BCGE CC data and outputs a PDF."""
-
-    async def run():
-        creds = await bcgecc.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(Browser.FIREFOX) as p:
-            statement = await bcgecc.login_and_download_latest_statement(p, creds)
-        sys.stdout.buffer.write(statement)
-
-    asyncio.run(run())
-
-
-@cli.command()
-def coop_supercard_pull() -> None:
-    """Fetches Coop receipt PDFs from coop.ch.
-
-    This command saves `receipt *.pdf` files to the download directory.
-
-    This command just opens the Coop page in the default browser.
-    Coop starter blocking Playwright (and presumably other automation) in late
-    2024.
-    """
-    coop_supercard.fetch_receipts_manually()
-
-
-@cli.command()
-@click.pass_context
-@click.option("--amount", required=True)
-@click.argument("wire_instructions_csv", type=click.File("r"))
-def cs_send_wire_to_ib(ctx, amount: str, wire_instructions_csv: typing.TextIO) -> None:
-    """Sends a wire transfer to Interactive Brokers.
-
-    Example use:
-
-        cs-send-wire-to-ib --amount=21.37 WIRE_INSTRUCTIONS_CSV
-    """
-    raise NotImplementedError()
-
-
-@cli.command()
-def degiro_account_pull() -> None:
-    """Fetches Degiro's account statement and outputs a CSV file."""
-    asyncio.run(degiro_pull(degiro.StatementType.ACCOUNT))
-
-
-@cli.command()
-def degiro_portfolio_pull() -> None:
-    """Fetches Degiro's portfolio statement and outputs a CSV file."""
-    asyncio.run(degiro_pull(degiro.StatementType.PORTFOLIO))
-
-
-async def degiro_pull(statement_type: degiro.StatementType) -> None:
-    op_client = await connect_op()
-    creds = await degiro.fetch_credentials(op_client)
-    async with playwrightutils.new_page(Browser.FIREFOX, headless=False) as page:
-        await degiro.login(page, creds, op_client)
-        statement = await degiro.fetch_statement(page, statement_type)
-
-    sys.stdout.buffer.write(statement)
-
-
-@cli.command()
-@click.pass_context
-def pull_easyride_receipts(ctx) -> None:
-    """Fetches EasyRide receipt PDFs."""
-    config = ctx.obj["config"]
-
-    async def run():
-        easyride.fetch_and_archive_receipts(
-            await gmail.fetch_credentials(await connect_op()),
-            PurePath(config["download_directory"]),
+    if trace_file:
+        playwright_trace_file = (
+            trace_file.with_suffix(".playwright.zip") if trace_playwright else None
         )
+        ctx.with_resource(tracing.record(trace_file, playwright_trace_file))
+        ctx.with_resource(tracing.span(f"command {ctx.invoked_subcommand}"))
 
-    asyncio.run(run())
-
-
-@cli.command()
-def pull_finpension() -> None:
-    """Prints Finpension’s portfolio total.
-
-    It will print a line with the value like "12123.12\n"."""
-
-    async def run():
-        async with async_playwright() as pw:
-            browser = await pw.firefox.launch(headless=False)
-            page = await browser.new_page()
-            await finpension.login(
-                page, await finpension.fetch_credentials(await connect_op())
-            )
-            value = await finpension.fetch_current_total(page)
-            print(value)
-
-    asyncio.run(run())
-
-
-def decode_ib_wire_instructions(csvf: typing.TextIO) -> dict[str, str]:
-    """
-    Decodes IB wire instructions
-
-    :param csv typing.TextIO
-    :rtype dict[str, str]
-    """
-    result = dict()
-    for row in csv.DictReader(csvf):
-        result[row["key"]] = row["value"]
-    return result
-
-
-@cli.command()
-def ib_cancel_pending_deposits() -> None:
-    """Cancels all pending deposits.
-
-    Outputs a CSV with wire instructions.
-
-    Example use:
-
-        ib-cancel-pending-deposits
-    """
-
-    async def run():
-        credentials = await ib.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(Browser.FIREFOX, headless=False) as page:
-            await ib.login(page, credentials)
-            await ib.cancel_pending_deposits(page)
-
-    asyncio.run(run())
-
-
-@cli.command()
-def ib_activity_pull() -> None:
-    """Pulls Interactive Brokers' activity statement.
-
-    Outputs the statement CSV to stdout.
-    """
-    downloads_path = Path("/tmp")
-
-    async def run():
-        credentials = await ib.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(
-            Browser.FIREFOX, headless=False, downloads_path=downloads_path
-        ) as page:
-            await ib.login(page, credentials)
-            statement = await ib.fetch_statement(page, ib.StatementType.ACTIVITY)
-            sys.stdout.buffer.write(statement)
-
-    asyncio.run(run())
-
-
-@cli.command()
-@click.option(
-    "--source", required=True, type=click.Choice(["CS", "BCGE"], case_sensitive=False)
-)
-@click.option("--amount", required=True)
-def ib_set_up_incoming_deposit(source, amount) -> None:
-    """Sets up an incoming deposit on Interactive Brokers.
-
-    Outputs a CSV with wire instructions.
-
-    Example use:
-
-        ib-set-up-incoming-deposit --source=cs --amount=21.37
-    """
-    ib_source: ib.DepositSource = (
-        ib.DepositSource.BCGE if source == "BCGE" else ib.DepositSource.CHARLES_SCHWAB
-    )
-
-    async def run() -> ib.SourceBankDepositInformation:
-        credentials: ib.Credentials = await ib.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(Browser.FIREFOX, headless=False) as page:
-            await ib.login(page, credentials)
-            instructions: ib.SourceBankDepositInformation = await ib.deposit(
-                page, ib_source, decimal.Decimal(amount)
-            )
-            return instructions
-
-    instructions = asyncio.run(run())
-
-    writer = csv.DictWriter(sys.stdout, fieldnames=["key", "value"], delimiter=",")
-    writer.writeheader()
-    writer.writerow(
-        {
-            "key": "transfer_to",
-            "value": instructions.transfer_to,
-        }
+    metrics_directory = Path(
+        config.get(METRICS_DIRECTORY_CFG_KEY)
+        or Path(config_file.name).parent / "metrics"
     )
-    writer.writerow(
-        {
-            "key": "iban",
-            "value": instructions.iban,
-        }
+    ctx.obj["metrics_directory"] = metrics_directory
+    ctx.obj["watermarks_file"] = Path(
+        config.get(WATERMARKS_FILE_CFG_KEY)
+        or Path(config_file.name).parent / "watermarks.json"
     )
-    writer.writerow(
-        {
-            "key": "beneficiary_bank",
-            "value": instructions.beneficiary_bank,
-        }
+    ctx.obj["ledger_directory"] = Path(
+        config.get(LEDGER_DIRECTORY_CFG_KEY) or Path(config_file.name).parent / "ledger"
     )
-    writer.writerow(
-        {
-            "key": "for_further_credit",
-            "value": instructions.for_further_credit,
-        }
+    ctx.obj["receipts_index"] = Path(
+        config.get(RECEIPTS_INDEX_CFG_KEY)
+        or Path(config_file.name).parent / "receipts.sqlite3"
     )
-
-
-@cli.command()
-def pull_mbank() -> None:
-    """Fetches mBank's data and outputs a CSV file."""
-
-    async def run():
-        creds = await mbank.fetch_credentials(await connect_op())
-        async with playwrightutils.new_page(Browser.FIREFOX) as p:
-            statement = await mbank.login_and_fetch_history(p, creds)
-        sys.stdout.buffer.write(statement)
-
-    asyncio.run(run())
-
-
-@cli.command()
-@click.option(
-    "--download-directory",
-    required=True,
-    help="The target download directory.",
-    type=click.Path(exists=True, file_okay=False, writable=True),
-)
-@click.pass_context
-def revolut_pull(ctx, download_directory) -> None:
-    """Fetches Revolut data into CSV files."""
-    config = read_config_from_context(ctx)
-    download_directory = Path(download_directory)
-
-    async def run():
-        async with playwrightutils.new_page(
-            browser_type=Browser.FIREFOX, downloads_path=download_directory
-        ) as p:
-            await revolut.login_and_download_statements(
-                p, download_directory, config["revolut_currencies"]
+    if not replay_har and ctx.invoked_subcommand not in UNMETERED_COMMANDS:
+        textfile_directory = config.get(METRICS_TEXTFILE_DIRECTORY_CFG_KEY)
+        ctx.with_resource(
+            metrics.record_run(
+                ctx.invoked_subcommand,
+                metrics_directory,
+                Path(textfile_directory) if textfile_directory else None,
             )
-
-    asyncio.run(run())
-
-
-@cli.command()
-def pull_splitwise() -> None:
-    """Fetches the Splitwise statement."""
-
-    async def run():
-        creds = await splitwise.fetch_credentials(await connect_op())
-        csv = splitwise.export_balances_to_csv(splitwise.fetch_balances(creds))
-        sys.stdout.buffer.write(csv)
-
-    asyncio.run(run())
-
-
-@cli.command()
-@click.pass_context
-def pull_galaxus(ctx) -> None:
-    """Fetches Digitec-Galaxus receipts in text format."""
-    config = ctx.obj["config"]
-    download_directory = PurePath(config["download_directory"])
-
-    async def run():
-        with contextlib.closing(
-            gmail.connect(await gmail.fetch_credentials(await connect_op()))
-        ) as inbox:
-            for bill in galaxus.fetch_and_archive_bills(inbox):
-                with open(download_directory / (bill.subject + ".galaxus"), "w") as f:
-                    f.write(bill.payload)
-
-    asyncio.run(run())
-
-
-@cli.command()
-@click.pass_context
-def pull_google_play_mail(ctx) -> None:
-    """Fetches Google Play receipts in text format."""
-    config = ctx.obj["config"]
-    download_directory = PurePath(config["download_directory"])
-
-    async def run():
-        with contextlib.closing(
-            gmail.connect(await gmail.fetch_credentials(await connect_op()))
-        ) as inbox:
-            for bill in google_play_mail.fetch_and_archive_bills(inbox):
-                with open(download_directory / (bill.subject + ".email"), "w") as f:
-                    f.write(bill.payload)
-
-    asyncio.run(run())
-
-
-@cli.command()
-@click.pass_context
-def pull_patreon(ctx) -> None:
-    """Fetches Patreon receipts in text format."""
-    config = ctx.obj["config"]
-
-    async def run():
-        patreon.fetch_and_archive_receipts(
-            await gmail.fetch_credentials(await connect_op()),
-            PurePath(config["download_directory"]),
         )
 
-    asyncio.run(run())
-
-
-@cli.command()
-@click.pass_context
-def pull_uber_eats(ctx) -> None:
-    """Fetches Uber Eats receipts in text format."""
-    config = ctx.obj["config"]
-    download_dir = PurePath(config["download_directory"])
-
-    async def run():
-        for title, content in ubereats.fetch_and_archive_bills(
-            await gmail.fetch_credentials(await connect_op())
-        ):
-            with open(download_dir / (title + ".ubereats"), "w") as f:
-                f.write(content)
-
-    asyncio.run(run())
-
-
-async def connect_op() -> op.OpSdkClient:
-    op_service_account_auth_token = op.fetch_service_account_auth_token()
-    return await op.OpSdkClient.connect(
-        service_account_auth_token=op_service_account_auth_token
-    )
+    if record_har:
+        ctx.with_resource(har.use_har(har.Har(record_har, har.HarMode.RECORD)))
+    elif replay_har:
+        ctx.with_resource(har.use_har(har.Har(replay_har, har.HarMode.REPLAY)))
+
+    if profiler:
+        profiler_kind = profiling.Profiler(profiler)
+        ctx.with_resource(
+            profiling.profile(
+                profiler_kind,
+                profile_output
+                or Path(f"{ctx.invoked_subcommand}{profiler_kind.file_suffix}"),
+                profile_top,
+                sys.stderr,
+            )
+        )
 
 
 def main():
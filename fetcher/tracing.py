@@ -0,0 +1,188 @@
+"""Lightweight tracing of fetcher steps.
+
+Instrumented code marks its steps with `span` or `traced`. Spans are recorded
+only while a recording is active (see `record`) or someone listens (see
+`listen`), so they cost next to nothing otherwise.
+
+A recording is saved in the Chrome trace event format, which chrome://tracing
+and https://ui.perfetto.dev can open. Every asyncio task gets its own track, so
+concurrent steps don't overlap.
+"""
+
+import asyncio
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import typing
+import weakref
+from pathlib import Path
+
+logger = logging.getLogger("fetcher.tracing")
+
+F = typing.TypeVar("F", bound=typing.Callable[..., typing.Any])
+
+
+class Recorder:
+    """Collects spans as Chrome trace events."""
+
+    def __init__(self, playwright_trace_path: Path | None = None):
+        self.playwright_trace_path = playwright_trace_path
+        self.events: list[dict] = []
+        self._pid = os.getpid()
+        self._origin_ns = time.perf_counter_ns()
+        self._task_tids: weakref.WeakKeyDictionary[asyncio.Task, int] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._next_tid = 1
+        self._lock = threading.Lock()
+        self._name_track(0, "main")
+
+    def _name_track(self, tid: int, name: str) -> None:
+        self.events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": self._pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+        )
+
+    def current_tid(self) -> int:
+        """Returns the track of the current asyncio task (0 outside tasks)."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        with self._lock:
+            tid = self._task_tids.get(task)
+            if tid is None:
+                tid = self._next_tid
+                self._next_tid += 1
+                self._task_tids[task] = tid
+                self._name_track(tid, task.get_name())
+            return tid
+
+    def add_span(
+        self, name: str, start_ns: int, end_ns: int, tid: int, args: dict
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": "fetcher",
+            "ph": "X",
+            "ts": (start_ns - self._origin_ns) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self._pid,
+            "tid": tid,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def to_json(self) -> dict:
+        return {"traceEvents": self.events, "displayTimeUnit": "ms"}
+
+
+_recorder: Recorder | None = None
+
+# Called with the name, the duration in seconds, and the error of every
+# finished span.
+SpanListener = typing.Callable[[str, float, BaseException | None], None]
+_listeners: list[SpanListener] = []
+
+
+@contextlib.contextmanager
+def record(
+    path: Path, playwright_trace_path: Path | None = None
+) -> typing.Iterator[Recorder]:
+    """Records spans and saves them to `path` on exit.
+
+    :param path Path: The Chrome trace event JSON file.
+    :param playwright_trace_path Path | None: If set, browser contexts record a
+        Playwright trace into this zip file.
+    """
+    global _recorder
+    if _recorder is not None:
+        raise Exception("A trace is already being recorded.")
+    recorder = _recorder = Recorder(playwright_trace_path)
+    try:
+        yield recorder
+    finally:
+        _recorder = None
+        path.write_text(json.dumps(recorder.to_json()))
+        logger.info(f"Saved the trace to {path}.")
+
+
+def playwright_trace_path() -> Path | None:
+    """Returns where to save a Playwright trace if one is requested."""
+    return _recorder.playwright_trace_path if _recorder else None
+
+
+@contextlib.contextmanager
+def listen(listener: SpanListener) -> typing.Iterator[None]:
+    """Calls `listener` for every span finished within the context."""
+    _listeners.append(listener)
+    try:
+        yield
+    finally:
+        _listeners.remove(listener)
+
+
+@contextlib.contextmanager
+def span(name: str, **args) -> typing.Iterator[None]:
+    """Records the enclosed block as a step.
+
+    :param name str: The step's name, e.g., "degiro.login".
+    :param args: Extra JSON-serializable details shown with the span.
+    """
+    recorder = _recorder
+    if recorder is None and not _listeners:
+        yield
+        return
+    tid = recorder.current_tid() if recorder else 0
+    error: BaseException | None = None
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        args["error"] = repr(e)
+        raise
+    finally:
+        end_ns = time.perf_counter_ns()
+        if recorder:
+            recorder.add_span(name, start_ns, end_ns, tid, args)
+        for listener in list(_listeners):
+            listener(name, (end_ns - start_ns) / 1e9, error)
+
+
+def traced(fn: F) -> F:
+    """Records every call of a (coroutine) function as a step.
+
+    The step is named after the function, e.g., "degiro.login".
+    """
+    name = f"{fn.__module__.removeprefix('fetcher.')}.{fn.__qualname__}"
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return typing.cast(F, async_wrapper)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return typing.cast(F, wrapper)
@@ -1,5 +1,4 @@
 """This module fetches the Uber Eats bill email."""
-import contextlib
 import email.message
 import quopri
 from typing import Generator, Tuple
@@ -24,13 +23,12 @@ def get_payments_string(soup) -> str:
 
 
 def fetch_and_archive_bills(
-        creds: gmail.Credentials) -> Generator[Tuple[str, str], None, None]:
-    with contextlib.closing(gmail.connect(creds)) as inbox:
-        receipt_mail_numbers = inbox.search_inbox("order with Uber Eats")
-        for receipt_mail_number in receipt_mail_numbers:
-            msg = inbox.fetch(receipt_mail_number)
-            html_page = quopri.decodestring(
-                get_html_payload(msg).encode('ascii'))
-            soup = BeautifulSoup(html_page, features='html.parser')
-            yield (msg['Date'], get_payments_string(soup))
-            inbox.archive(receipt_mail_number)
+    inbox: gmail.InboxProtocol
+) -> Generator[Tuple[str, str], None, None]:
+    receipt_mail_numbers = inbox.search_inbox("order with Uber Eats")
+    for receipt_mail_number in receipt_mail_numbers:
+        msg = inbox.fetch(receipt_mail_number)
+        html_page = quopri.decodestring(get_html_payload(msg).encode('ascii'))
+        soup = BeautifulSoup(html_page, features='html.parser')
+        yield (msg['Date'], get_payments_string(soup))
+        inbox.archive(receipt_mail_number)
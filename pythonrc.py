@@ -28,7 +28,7 @@ from fetcher.playwrightutils import (
     Browser,
     get_browser_type,
 )
-from fetcher.tool import connect_op  # noqa: F401
+from fetcher.cliutils import connect_op  # noqa: F401
 
 D = decimal.Decimal
 
@@ -73,4 +73,5 @@ def start():
 
 
 async def open_1password_client() -> op.OpSdkClient:
-    return await op.OpSdkClient.connect(op.fetch_service_account_auth_token())
+    return await op.OpSdkClient.connect(
+        await op.fetch_service_account_auth_token())
@@ -0,0 +1,582 @@
+"""An in-process IMAP4rev1 server for end-to-end tests of gmail.Gmail.
+
+Unlike fake_inbox.FakeInbox, it goes through imaplib and the IMAP protocol, so
+tests and benchmarks exercise the real client code paths and pay for every
+round trip.
+
+It supports a single INBOX and the commands the fetchers need: CAPABILITY,
+LOGIN, SELECT, SEARCH, FETCH (RFC822, BODY[...], BODY.PEEK[...], BODYSTRUCTURE
+and a few more), STORE, EXPUNGE, CLOSE, UID, IDLE, NOOP and LOGOUT. All
+connections share the INBOX. Sequence numbers are not kept per session, so
+concurrent sessions that expunge see each other's changes immediately.
+
+Example:
+
+    with FakeImapServer(latency=0.01) as server:
+        server.mailbox.deliver(raw_message)
+        imap = imaplib.IMAP4(server.host, server.port)
+        ...
+        print(server.commands)  # Round trips by command.
+"""
+import collections
+import dataclasses
+import email
+import email.header
+import email.message
+import email.policy
+import functools
+import imaplib
+import re
+import select
+import socket
+import socketserver
+import threading
+import time
+import typing
+
+CAPABILITIES = 'IMAP4rev1 IDLE UIDPLUS'
+IDLE_POLL_SECONDS = 0.02
+SHUTDOWN_POLL_SECONDS = 0.05
+
+
+class ImapError(Exception):
+    """A command that the server rejects with BAD."""
+
+
+@dataclasses.dataclass
+class StoredMessage:
+    uid: int
+    raw: bytes
+    internal_date: float
+    flags: set[str] = dataclasses.field(default_factory=set)
+
+    @functools.cached_property
+    def message(self) -> email.message.Message:
+        return email.message_from_bytes(self.raw, policy=email.policy.compat32)
+
+    @property
+    def header(self) -> bytes:
+        end = self.raw.find(b'\r\n\r\n')
+        return self.raw if end == -1 else self.raw[:end + 4]
+
+    @property
+    def text(self) -> bytes:
+        return self.raw[len(self.header):]
+
+
+class Mailbox:
+    """The INBOX shared by all connections."""
+
+    def __init__(self):
+        self.messages: list[StoredMessage] = []
+        self.next_uid = 1
+        self.lock = threading.RLock()
+
+    def deliver(self, raw: bytes, flags: set[str] | None = None) -> int:
+        """Appends a message and returns its UID.
+
+        Lines must end with CRLF, e.g., `msg.as_bytes(policy=email.policy.SMTP)`.
+        """
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append(
+                StoredMessage(uid, raw, time.time(), set(flags or ())))
+            return uid
+
+    def expunge(self) -> list[int]:
+        """Removes deleted messages and returns their sequence numbers.
+
+        The numbers are in descending order, so that each is valid at the time
+        it is reported.
+        """
+        with self.lock:
+            expunged = [
+                i + 1 for i, m in enumerate(self.messages)
+                if '\\Deleted' in m.flags
+            ]
+            self.messages = [
+                m for m in self.messages if '\\Deleted' not in m.flags
+            ]
+            return expunged[::-1]
+
+
+def parse_arguments(line: str) -> list:
+    """Parses command arguments into atoms, strings and nested lists.
+
+    >>> parse_arguments('1:* (UID BODY.PEEK[HEADER.FIELDS (SUBJECT)])')
+    ['1:*', ['UID', 'BODY.PEEK[HEADER.FIELDS (SUBJECT)]']]
+    >>> parse_arguments('SUBJECT "Quoted \\\\"text\\\\""')
+    ['SUBJECT', 'Quoted "text"']
+    """
+    stack: list[list] = [[]]
+    i = 0
+    try:
+        while i < len(line):
+            c = line[i]
+            if c == ' ':
+                i += 1
+            elif c == '(':
+                stack.append([])
+                i += 1
+            elif c == ')':
+                if len(stack) == 1:
+                    raise ImapError('Unbalanced parentheses.')
+                inner = stack.pop()
+                stack[-1].append(inner)
+                i += 1
+            elif c == '"':
+                chars = []
+                i += 1
+                while line[i] != '"':
+                    if line[i] == '\\':
+                        i += 1
+                    chars.append(line[i])
+                    i += 1
+                stack[-1].append(''.join(chars))
+                i += 1
+            else:
+                start, brackets = i, 0
+                while i < len(line) and (brackets or line[i] not in ' ()'):
+                    brackets += {'[': 1, ']': -1}.get(line[i], 0)
+                    i += 1
+                stack[-1].append(line[start:i])
+    except IndexError as e:
+        raise ImapError('Unterminated string.') from e
+    if len(stack) != 1:
+        raise ImapError('Unbalanced parentheses.')
+    return stack[0]
+
+
+def parse_set(spec: str, largest: int) -> set[int]:
+    """Parses a sequence or UID set, e.g., "1,3:5,7:*".
+
+    >>> sorted(parse_set('1,3:4,6:*', 7))
+    [1, 3, 4, 6, 7]
+    """
+    numbers: set[int] = set()
+    for part in spec.split(','):
+        first, _, last = part.partition(':')
+        low = largest if first == '*' else int(first)
+        high = low if not last else largest if last == '*' else int(last)
+        low, high = min(low, high), max(low, high)
+        numbers.update(range(low, high + 1))
+    return numbers
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def literal(data: bytes) -> bytes:
+    return b'{%d}\r\n' % len(data) + data
+
+
+def decoded_header(msg: email.message.Message, name: str) -> str:
+    value = msg.get(name)
+    if value is None:
+        return ''
+    return str(email.header.make_header(email.header.decode_header(value)))
+
+
+def subparts(part: email.message.Message) -> list[email.message.Message]:
+    return typing.cast(list[email.message.Message], part.get_payload())
+
+
+def body_structure(part: email.message.Message) -> str:
+    if part.is_multipart():
+        children = ''.join(body_structure(p) for p in subparts(part))
+        return f'({children} {quote(part.get_content_subtype().upper())})'
+    params = (part.get_params() or [])[1:]
+    params_str = ('(' + ' '.join(
+        f'{quote(k.upper())} {quote(v)}'
+        for k, v in params) + ')') if params else 'NIL'
+    body = part_body(part)
+    encoding = part.get('Content-Transfer-Encoding', '7BIT').upper()
+    fields = (f'{quote(part.get_content_maintype().upper())} ' +
+              f'{quote(part.get_content_subtype().upper())} {params_str} ' +
+              f'NIL NIL {quote(encoding)} {len(body)}')
+    if part.get_content_maintype() == 'text':
+        fields += f' {body.count(b"\n")}'
+    return f'({fields})'
+
+
+def part_body(part: email.message.Message) -> bytes:
+    raw = part.as_bytes(policy=email.policy.SMTP)
+    end = raw.find(b'\r\n\r\n')
+    return raw if end == -1 else raw[end + 4:]
+
+
+def find_part(msg: email.message.Message,
+              path: list[int]) -> email.message.Message:
+    part = msg
+    for index in path:
+        if part.is_multipart():
+            children = subparts(part)
+            if not 1 <= index <= len(children):
+                raise ImapError(f'No such part: {index}.')
+            part = children[index - 1]
+        elif index != 1:
+            raise ImapError(f'No such part: {index}.')
+    return part
+
+
+BODY_ITEM = re.compile(r'^BODY(\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$',
+                       re.IGNORECASE)
+FETCH_MACROS = {
+    'FAST': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE'],
+    'ALL': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE'],
+    'FULL': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE', 'BODY'],
+}
+
+
+def body_section(stored: StoredMessage, section: str) -> bytes:
+    """Returns the content of a BODY[section] fetch item."""
+    upper = section.upper()
+    if upper == '':
+        return stored.raw
+    if upper == 'HEADER':
+        return stored.header
+    if upper == 'TEXT':
+        return stored.text
+    if upper.startswith('HEADER.FIELDS'):
+        names = {n.upper() for n in parse_arguments(section)[1]}
+        lines = [
+            f'{name}: {value}\r\n'.encode('utf-8')
+            for name, value in stored.message.items()
+            if (name.upper() in names) != upper.startswith('HEADER.FIELDS.NOT')
+        ]
+        return b''.join(lines) + b'\r\n'
+    try:
+        path = [int(p) for p in section.split('.')]
+    except ValueError as e:
+        raise ImapError(f'Unsupported section: {section}.') from e
+    return part_body(find_part(stored.message, path))
+
+
+def fetch_item(stored: StoredMessage, item: str) -> tuple[bytes, bool]:
+    """Returns the item's response and whether it marks the message seen."""
+    name = item.upper()
+    if name == 'UID':
+        return b'UID %d' % stored.uid, False
+    if name == 'FLAGS':
+        return f'FLAGS ({" ".join(sorted(stored.flags))})'.encode(), False
+    if name == 'INTERNALDATE':
+        date = imaplib.Time2Internaldate(stored.internal_date)
+        return f'INTERNALDATE {date}'.encode(), False
+    if name == 'RFC822.SIZE':
+        return b'RFC822.SIZE %d' % len(stored.raw), False
+    if name == 'RFC822':
+        return b'RFC822 ' + literal(stored.raw), True
+    if name == 'RFC822.HEADER':
+        return b'RFC822.HEADER ' + literal(stored.header), False
+    if name == 'RFC822.TEXT':
+        return b'RFC822.TEXT ' + literal(stored.text), True
+    if name in ('BODYSTRUCTURE', 'BODY'):
+        return f'{name} {body_structure(stored.message)}'.encode(), False
+    match = BODY_ITEM.match(item)
+    if not match:
+        raise ImapError(f'Unsupported fetch item: {item}.')
+    peek, section, start, length = match.groups()
+    data = body_section(stored, section)
+    response_name = f'BODY[{section.upper()}]'
+    if start is not None:
+        data = data[int(start):int(start) + int(length)]
+        response_name += f'<{start}>'
+    return response_name.encode() + b' ' + literal(data), not peek
+
+
+class ImapHandler(socketserver.StreamRequestHandler):
+    server: 'FakeImapServer'
+
+    def setup(self):
+        super().setup()
+        self.authenticated = False
+        self.selected = False
+        self.server.track(self.connection)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.server.untrack(self.connection)
+
+    def send(self, data: bytes) -> None:
+        self.wfile.write(data)
+
+    def handle(self):
+        self.send(f'* OK [CAPABILITY {CAPABILITIES}] Fake IMAP ready\r\n'.
+                  encode())
+        while line := self.rfile.readline():
+            tag, _, rest = line.decode('utf-8').rstrip('\r\n').partition(' ')
+            command, _, arguments = rest.partition(' ')
+            command = command.upper()
+            if command == 'UID':
+                sub_command, _, arguments = arguments.partition(' ')
+                command = f'UID {sub_command.upper()}'
+            self.server.count(command)
+            try:
+                untagged, completion = self.dispatch(command, arguments)
+                response = b''.join(untagged) + f'{tag} OK {completion}\r\n'.encode()
+            except ImapError as e:
+                response = f'{tag} BAD {e}\r\n'.encode()
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            self.send(response)
+            if command == 'LOGOUT':
+                return
+
+    def dispatch(self, command: str, arguments: str) -> tuple[list[bytes], str]:
+        args = parse_arguments(arguments)
+        if command == 'CAPABILITY':
+            return [f'* CAPABILITY {CAPABILITIES}\r\n'.encode()], 'CAPABILITY'
+        if command == 'NOOP':
+            return [], 'NOOP'
+        if command == 'LOGOUT':
+            return [b'* BYE Logging out\r\n'], 'LOGOUT'
+        if command == 'LOGIN':
+            if len(args) != 2:
+                raise ImapError('LOGIN expects a user and a password.')
+            self.authenticated = True
+            return [], 'LOGIN'
+        if not self.authenticated:
+            raise ImapError('Not authenticated.')
+        if command in ('SELECT', 'EXAMINE'):
+            if not args or args[0].upper() != 'INBOX':
+                raise ImapError('Only INBOX exists.')
+            self.selected = True
+            with self.server.mailbox.lock:
+                exists = len(self.server.mailbox.messages)
+                next_uid = self.server.mailbox.next_uid
+            return [
+                b'* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n',
+                b'* %d EXISTS\r\n' % exists,
+                b'* 0 RECENT\r\n',
+                b'* OK [UIDVALIDITY 1]\r\n',
+                b'* OK [UIDNEXT %d]\r\n' % next_uid,
+            ], '[READ-WRITE] SELECT'
+        if command == 'IDLE':
+            return self.idle(), 'IDLE'
+        if not self.selected:
+            raise ImapError('No mailbox selected.')
+        if command == 'CLOSE':
+            self.server.mailbox.expunge()
+            self.selected = False
+            return [], 'CLOSE'
+        if command == 'EXPUNGE':
+            return [
+                b'* %d EXPUNGE\r\n' % n
+                for n in self.server.mailbox.expunge()
+            ], 'EXPUNGE'
+        use_uid = command.startswith('UID ')
+        command = command.removeprefix('UID ')
+        if command == 'SEARCH':
+            return [self.search(args, use_uid)], 'SEARCH'
+        if command == 'FETCH':
+            return self.fetch(args, use_uid), 'FETCH'
+        if command == 'STORE':
+            return self.store(args, use_uid), 'STORE'
+        raise ImapError(f'Unsupported command: {command}.')
+
+    def select_messages(self, spec: str,
+                        use_uid: bool) -> list[tuple[int, StoredMessage]]:
+        """Returns the (sequence number, message) pairs in a set."""
+        messages = self.server.mailbox.messages
+        if not messages:
+            return []
+        if use_uid:
+            uids = parse_set(spec, messages[-1].uid)
+            return [(i + 1, m) for i, m in enumerate(messages)
+                    if m.uid in uids]
+        numbers = parse_set(spec, len(messages))
+        return [(n, messages[n - 1]) for n in sorted(numbers)
+                if 1 <= n <= len(messages)]
+
+    def search(self, args: list, use_uid: bool) -> bytes:
+        if len(args) >= 2 and str(args[0]).upper() == 'CHARSET':
+            args = args[2:]
+        with self.server.mailbox.lock:
+            found = [(i + 1, m)
+                     for i, m in enumerate(self.server.mailbox.messages)
+                     if self.matches_all(args, i + 1, m)]
+        numbers = [m.uid if use_uid else n for n, m in found]
+        return ('* SEARCH' + ''.join(f' {n}' for n in numbers) +
+                '\r\n').encode()
+
+    def matches_all(self, keys: list, number: int,
+                    stored: StoredMessage) -> bool:
+        keys = list(keys)
+        while keys:
+            if not self.matches(keys, number, stored):
+                return False
+        return True
+
+    def matches(self, keys: list, number: int, stored: StoredMessage) -> bool:
+        """Consumes one search key from `keys` and matches it."""
+        key = keys.pop(0)
+        if isinstance(key, list):
+            return self.matches_all(key, number, stored)
+        upper = key.upper()
+        flag_keys = {
+            'SEEN': '\\Seen',
+            'DELETED': '\\Deleted',
+            'FLAGGED': '\\Flagged',
+            'ANSWERED': '\\Answered',
+        }
+        if upper == 'ALL':
+            return True
+        if upper in flag_keys:
+            return flag_keys[upper] in stored.flags
+        if upper.startswith('UN') and upper[2:] in flag_keys:
+            return flag_keys[upper[2:]] not in stored.flags
+        if upper == 'NOT':
+            return not self.matches(keys, number, stored)
+        if upper == 'OR':
+            left = self.matches(keys, number, stored)
+            right = self.matches(keys, number, stored)
+            return left or right
+        if upper in ('SUBJECT', 'FROM', 'TO'):
+            needle = keys.pop(0).lower()
+            return needle in decoded_header(stored.message, upper).lower()
+        if upper == 'BODY':
+            return keys.pop(0).lower().encode() in stored.text.lower()
+        if upper == 'UID':
+            return stored.uid in parse_set(keys.pop(0),
+                                           self.server.mailbox.next_uid)
+        if re.fullmatch(r'[\d:,*]+', key):
+            return number in parse_set(key,
+                                       len(self.server.mailbox.messages))
+        raise ImapError(f'Unsupported search key: {key}.')
+
+    def fetch(self, args: list, use_uid: bool) -> list[bytes]:
+        if len(args) != 2:
+            raise ImapError('FETCH expects a set and items.')
+        spec, items = args
+        if isinstance(items, str):
+            items = FETCH_MACROS.get(items.upper(), [items])
+        if use_uid and 'UID' not in (i.upper() for i in items):
+            items = ['UID', *items]
+        responses = []
+        with self.server.mailbox.lock:
+            for number, stored in self.select_messages(spec, use_uid):
+                parts = []
+                for item in items:
+                    part, marks_seen = fetch_item(stored, item)
+                    parts.append(part)
+                    if marks_seen:
+                        stored.flags.add('\\Seen')
+                responses.append(b'* %d FETCH (' % number + b' '.join(parts) +
+                                 b')\r\n')
+        return responses
+
+    def store(self, args: list, use_uid: bool) -> list[bytes]:
+        if len(args) < 3:
+            raise ImapError('STORE expects a set, an action and flags.')
+        spec, action, *flags = args
+        if len(flags) == 1 and isinstance(flags[0], list):
+            flags = flags[0]
+        action = action.upper()
+        silent = action.endswith('.SILENT')
+        action = action.removesuffix('.SILENT')
+        if action not in ('FLAGS', '+FLAGS', '-FLAGS'):
+            raise ImapError(f'Unsupported STORE action: {action}.')
+        responses = []
+        with self.server.mailbox.lock:
+            for number, stored in self.select_messages(spec, use_uid):
+                if action == 'FLAGS':
+                    stored.flags = set(flags)
+                elif action == '+FLAGS':
+                    stored.flags.update(flags)
+                else:
+                    stored.flags.difference_update(flags)
+                if not silent:
+                    part, _ = fetch_item(stored, 'FLAGS')
+                    uid = b'UID %d ' % stored.uid if use_uid else b''
+                    responses.append(b'* %d FETCH (' % number + uid + part +
+                                     b')\r\n')
+        return responses
+
+    def idle(self) -> list[bytes]:
+        """Reports new messages until the client sends DONE."""
+        # Count before the continuation, so that a message delivered right
+        # after the client sees it is still reported.
+        with self.server.mailbox.lock:
+            exists = len(self.server.mailbox.messages)
+        self.send(b'+ idling\r\n')
+        while True:
+            readable, _, _ = select.select([self.connection], [], [],
+                                           IDLE_POLL_SECONDS)
+            if readable:
+                if self.rfile.readline().strip().upper() != b'DONE':
+                    raise ImapError('Expected DONE.')
+                return []
+            with self.server.mailbox.lock:
+                current = len(self.server.mailbox.messages)
+            if current != exists:
+                exists = current
+                self.send(b'* %d EXISTS\r\n' % exists)
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    """Serves a Mailbox over IMAP on localhost.
+
+    :param latency: Seconds added to every command's round trip.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, mailbox: Mailbox | None = None, latency: float = 0.0):
+        super().__init__(('127.0.0.1', 0), ImapHandler)
+        self.mailbox = mailbox or Mailbox()
+        self.latency = latency
+        # The number of round trips by command, e.g., "FETCH" or "UID FETCH".
+        self.commands: collections.Counter[str] = collections.Counter()
+        self._commands_lock = threading.Lock()
+        self._connections: set[socket.socket] = set()
+        self._connections_lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        args=(SHUTDOWN_POLL_SECONDS, ),
+                                        daemon=True)
+
+    @property
+    def host(self) -> str:
+        return str(self.server_address[0])
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def count(self, command: str) -> None:
+        with self._commands_lock:
+            self.commands[command] += 1
+
+    def track(self, connection: socket.socket) -> None:
+        with self._connections_lock:
+            self._connections.add(connection)
+
+    def untrack(self, connection: socket.socket) -> None:
+        with self._connections_lock:
+            self._connections.discard(connection)
+
+    def __enter__(self) -> 'FakeImapServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+        # Handlers run in daemon threads, which server_close doesn't wait for,
+        # so close the connections that clients left open.
+        with self._connections_lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            self.shutdown_request(connection)
+
+
+def connect(server: FakeImapServer) -> imaplib.IMAP4:
+    """Connects, logs in and selects the INBOX, like gmail.connect."""
+    imap = imaplib.IMAP4(server.host, server.port)
+    imap.login('johndoe@gmail.com', 'app-password')
+    imap.select()
+    return imap
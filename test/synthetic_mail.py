@@ -0,0 +1,116 @@
+"""Synthetic receipt emails for mail fetcher tests and benchmarks.
+
+The messages mimic the layouts that the Galaxus, Google Play, Uber Eats and
+EasyRide fetchers parse. Each function returns the raw message with CRLF line
+endings, ready for fake_imap_server.Mailbox.deliver.
+"""
+import email.message
+import email.policy
+import email.utils
+import functools
+import quopri
+import typing
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from .file_extra import read_file
+
+TO = 'johndoe@gmail.com'
+# 2023-04-12 10:40:49 UTC
+FIRST_DATE = 1681296049
+GOOGLE_PLAY_EMAIL = 'test/data/google-play-mail-2023-05-04-bytes.email'
+GALAXUS_PAYLOAD = 'test/data/galaxus-payload-2023-04-12.txt'
+
+
+def to_bytes(msg: email.message.Message) -> bytes:
+    return msg.as_bytes(policy=email.policy.SMTP)
+
+
+@functools.cache
+def read_data_file(path: str) -> bytes:
+    return read_file(path, bytes_mode=True)
+
+
+def date(i: int) -> str:
+    return email.utils.formatdate(FIRST_DATE + i * 3600)
+
+
+def galaxus_receipt(i: int) -> bytes:
+    msg = email.message.Message()
+    msg.add_header('Subject',
+                   f'Danke =?UTF-8?B?ZsO8cg==?= deine Bestellung {85231628 + i}')
+    msg.add_header('To', TO)
+    msg.add_header('Date', date(i))
+    msg.add_header('From', 'Galaxus <noreply@notifications.galaxus.ch>')
+    msg.add_header('Content-Type', 'text/html; charset=utf-8')
+    msg.add_header('Content-Transfer-Encoding', 'quoted-printable')
+    msg.add_header('MIME-Version', '1.0')
+    msg.set_payload(read_data_file(GALAXUS_PAYLOAD).decode('utf-8'))
+    return to_bytes(msg)
+
+
+def google_play_receipt(i: int) -> bytes:
+    msg = email.message_from_bytes(read_data_file(GOOGLE_PLAY_EMAIL))
+    msg.replace_header('Subject',
+                       f'Your Google Play Order Receipt from order {i}')
+    msg.replace_header('Date', date(i))
+    return to_bytes(msg)
+
+
+def uber_eats_receipt(i: int) -> bytes:
+    html = ('<html><body><div><table><tbody>' +
+            '<tr><td><p>Payments</p></td></tr>' +
+            f'<tr><td>Visa ****1234 CHF {20 + i % 30}.50</td></tr>' +
+            '</tbody></table></div></body></html>')
+    msg = email.message.Message()
+    msg.add_header('Subject', 'Your Wednesday evening order with Uber Eats')
+    msg.add_header('To', TO)
+    msg.add_header('Date', date(i))
+    msg.add_header('From', 'Uber Receipts <noreply@uber.com>')
+    msg.add_header('Content-Type', 'text/html; charset=utf-8')
+    msg.add_header('Content-Transfer-Encoding', 'quoted-printable')
+    msg.set_payload(quopri.encodestring(html.encode()).decode('ascii'))
+    return to_bytes(msg)
+
+
+def easyride_receipt(i: int) -> bytes:
+    msg = MIMEMultipart('mixed')
+    msg['Subject'] = 'EasyRide Quittung'
+    msg['To'] = TO
+    msg['Date'] = date(i)
+    msg['From'] = 'SBB CFF FFS <noreply@sbb.ch>'
+    body = MIMEMultipart('alternative')
+    body.attach(MIMEText('Ihre Quittung ist im Anhang.', 'plain'))
+    body.attach(MIMEText('<p>Ihre Quittung ist im Anhang.</p>', 'html'))
+    msg.attach(body)
+    pdf = MIMEApplication(b'%PDF-1.4\n' + bytes(2048), 'pdf')
+    pdf.add_header('Content-Disposition',
+                   'attachment',
+                   filename=f'easyride-{i}.pdf')
+    msg.attach(pdf)
+    return to_bytes(msg)
+
+
+def newsletter(i: int) -> bytes:
+    msg = MIMEText('Our deals of the week.\n' * 50, 'plain')
+    msg['Subject'] = f'Weekly deals #{i}'
+    msg['To'] = TO
+    msg['Date'] = date(i)
+    msg['From'] = 'Shop <news@shop.example>'
+    return to_bytes(msg)
+
+
+MESSAGE_KINDS: dict[str, typing.Callable[[int], bytes]] = {
+    'galaxus': galaxus_receipt,
+    'google-play': google_play_receipt,
+    'uber-eats': uber_eats_receipt,
+    'easyride': easyride_receipt,
+    'newsletter': newsletter,
+}
+
+
+def corpus(n: int) -> list[bytes]:
+    """Returns n distinct messages that cycle through all kinds."""
+    makers = list(MESSAGE_KINDS.values())
+    return [makers[i % len(makers)](i // len(makers)) for i in range(n)]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import pathlib
+import tempfile
+import unittest
+
+from fetcher import agent
+
+
+class AgentTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.socket_path = pathlib.Path(self.tmp_dir.name) / "agent.sock"
+        self.fetches = 0
+
+    async def asyncTearDown(self):
+        self.server_task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.server_task
+        self.tmp_dir.cleanup()
+
+    async def fetch_token(self) -> str:
+        self.fetches += 1
+        return f"token{self.fetches}"
+
+    async def start_agent(self, **kwargs) -> None:
+        self.server_task = asyncio.create_task(
+            agent.Agent(self.fetch_token, **kwargs).serve(self.socket_path))
+        while not self.socket_path.exists():
+            await asyncio.sleep(0.01)
+
+    async def test_serves_token_from_memory(self):
+        await self.start_agent()
+
+        self.assertEqual(await agent.fetch_token(self.socket_path), "token1")
+        self.assertEqual(await agent.fetch_token(self.socket_path), "token1")
+        self.assertEqual(self.fetches, 1)
+        self.assertEqual(self.socket_path.stat().st_mode & 0o777, 0o600)
+
+    async def test_refetches_token_after_ttl(self):
+        await self.start_agent(ttl_seconds=0.05)
+
+        self.assertEqual(await agent.fetch_token(self.socket_path), "token1")
+        await asyncio.sleep(0.1)
+        self.assertEqual(await agent.fetch_token(self.socket_path), "token2")
+
+    async def test_rejects_other_users(self):
+        await self.start_agent(allowed_uid=os.getuid() + 1)
+
+        with self.assertLogs("fetcher.agent", "WARNING"):
+            self.assertIsNone(await agent.fetch_token(self.socket_path))
+        self.assertEqual(self.fetches, 0)
+
+    async def test_returns_none_without_agent(self):
+        self.server_task = asyncio.create_task(asyncio.sleep(10))
+
+        self.assertIsNone(await agent.fetch_token(self.socket_path))
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import doctest
+import gzip
+import os
+import pathlib
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from fetcher import archive
+from fetcher.archive import Archive, DirectoryOutput
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(archive))
+    return tests
+
+
+class ArchiveTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name) / 'archive'
+        self.archive = Archive(self.directory)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def objects(self):
+        return sorted(p.name for p in self.directory.glob('objects/*/*'))
+
+    def manifest(self):
+        with contextlib.closing(
+                sqlite3.connect(self.directory / 'manifest.sqlite3')) as c:
+            return c.execute('SELECT provider, day, name, link FROM entries ' +
+                             'ORDER BY seq').fetchall()
+
+    def test_saves_a_readable_link(self):
+        link = self.archive.save('galaxus', 'Bestellung.galaxus', b'receipt',
+                                 date(2024, 3, 1))
+
+        self.assertEqual(link,
+                         self.directory / 'galaxus' / 'Bestellung.galaxus.gz')
+        self.assertTrue(link.is_symlink())
+        self.assertFalse(os.path.isabs(os.readlink(link)))
+        with gzip.open(link) as f:
+            self.assertEqual(f.read(), b'receipt')
+        self.assertEqual(self.manifest(),
+                         [('galaxus', '2024-03-01', 'Bestellung.galaxus',
+                           'galaxus/Bestellung.galaxus.gz')])
+
+    def test_skips_identical_content(self):
+        first = self.archive.save('patreon', 'patreon_1.txt', b'receipt')
+        second = self.archive.save('patreon', 'patreon_2.txt', b'receipt')
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.objects()), 1)
+        self.assertEqual(len(self.manifest()), 1)
+        self.assertEqual(
+            [p.name for p in (self.directory / 'patreon').iterdir()],
+            ['patreon_1.txt.gz'])
+
+    def test_shares_objects_between_providers(self):
+        self.archive.save('easyride', 'receipt.pdf', b'%PDF')
+        self.archive.save('revolut', 'receipt.pdf', b'%PDF')
+
+        self.assertEqual(len(self.objects()), 1)
+        self.assertEqual(len(self.manifest()), 2)
+
+    def test_disambiguates_colliding_names(self):
+        self.archive.save('ubereats', 'Your order.ubereats', b'pizza')
+        link = self.archive.save('ubereats', 'Your order.ubereats', b'sushi')
+
+        self.assertRegex(link.name, r'^Your order\.[0-9a-f]{8}\.ubereats\.gz$')
+        with gzip.open(link) as f:
+            self.assertEqual(f.read(), b'sushi')
+
+    def test_reuses_the_link_of_an_interrupted_save(self):
+        self.archive.save('ubereats', 'Your order.ubereats', b'pizza')
+        (self.directory / 'manifest.sqlite3').unlink()
+
+        link = self.archive.save('ubereats', 'Your order.ubereats', b'pizza')
+
+        self.assertEqual(link.name, 'Your order.ubereats.gz')
+        self.assertEqual(len(self.manifest()), 1)
+
+    def test_rejects_paths_as_names(self):
+        with self.assertRaisesRegex(Exception, 'Invalid archive name'):
+            self.archive.save('galaxus', '../receipt.galaxus', b'receipt')
+
+
+class DirectoryOutputTestCase(unittest.TestCase):
+
+    def test_saves_under_the_name(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = DirectoryOutput(pathlib.Path(tmp_dir)).save(
+                'easyride', 'receipt.pdf', b'%PDF')
+
+            self.assertEqual(path, pathlib.Path(tmp_dir) / 'receipt.pdf')
+            self.assertEqual(path.read_bytes(), b'%PDF')
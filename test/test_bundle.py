@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import email
+import json
+import pathlib
+import tarfile
+import tempfile
+import unittest
+from datetime import date
+
+import click
+
+from fetcher import galaxus
+from fetcher.bundle import INDEX_MEMBER, write_bundle
+from fetcher.cliutils import open_receipt_output
+
+from . import fake_inbox, synthetic_mail
+
+
+def read_members(path: pathlib.Path) -> dict[str, bytes]:
+    with tarfile.open(path, 'r:gz') as tar:
+        return {
+            m.name: tar.extractfile(m).read()  # type: ignore
+            for m in tar.getmembers()
+        }
+
+
+class BundleTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp_dir.name) / 'receipts.tar.gz'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_writes_files_and_an_index(self):
+        with write_bundle(self.path) as bundle:
+            bundle.save('galaxus', 'Bestellung.galaxus', b'Kabel',
+                        date(2024, 3, 1))
+            bundle.save('patreon', 'patreon_1.txt', b'$5.00')
+            self.assertFalse(self.path.exists())
+
+        members = read_members(self.path)
+        self.assertEqual(list(members), [
+            'galaxus/Bestellung.galaxus', 'patreon/patreon_1.txt', INDEX_MEMBER
+        ])
+        self.assertEqual(members['galaxus/Bestellung.galaxus'], b'Kabel')
+        index = json.loads(members[INDEX_MEMBER])
+        self.assertEqual(index[0]['member'], 'galaxus/Bestellung.galaxus')
+        self.assertEqual(index[0]['day'], '2024-03-01')
+        self.assertEqual(index[0]['size'], 5)
+        self.assertEqual(index[1]['provider'], 'patreon')
+
+    def test_keeps_one_copy_of_identical_content(self):
+        with write_bundle(self.path) as bundle:
+            first = bundle.save('ubereats', 'order.ubereats', b'pizza')
+            second = bundle.save('ubereats', 'order.ubereats', b'pizza')
+            other = bundle.save('ubereats', 'order.ubereats', b'sushi')
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(read_members(self.path)), 3)
+
+    def test_leaves_nothing_behind_on_failure(self):
+        with self.assertRaises(RuntimeError):
+            with write_bundle(self.path) as bundle:
+                bundle.save('galaxus', 'Bestellung.galaxus', b'Kabel')
+                raise RuntimeError()
+
+        self.assertEqual(list(pathlib.Path(self.tmp_dir.name).iterdir()), [])
+
+    def test_refuses_to_overwrite_a_bundle(self):
+        self.path.write_bytes(b'')
+
+        with self.assertRaisesRegex(Exception, 'already exists'):
+            with write_bundle(self.path):
+                pass
+
+
+class ReceiptOutputTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+        self.bundle = self.directory / 'receipts.tar.gz'
+        self.inbox = fake_inbox.FakeInbox()
+        self.inbox.add_message_to_inbox(
+            email.message_from_bytes(synthetic_mail.galaxus_receipt(0)))
+        self.ctx = click.Context(click.Command('pull-galaxus'),
+                                 obj={
+                                     'config': {
+                                         'download_directory':
+                                         str(self.directory)
+                                     },
+                                     'receipts_index':
+                                     self.directory / 'receipts.sqlite3',
+                                 })
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def fetch(self, bundle, fail=False):
+        with self.ctx:
+            with open_receipt_output(self.ctx, self.inbox,
+                                     bundle) as (output, inbox):
+                for bill in galaxus.fetch_and_archive_bills(inbox):
+                    output.save('galaxus', bill.subject + '.galaxus',
+                                bill.payload.encode())
+                self.assertEqual(self.inbox.entries[0].state,
+                                 fake_inbox.ENTRY_STATE.INBOX)
+                if fail:
+                    raise RuntimeError()
+
+    def test_archives_emails_after_the_bundle_is_complete(self):
+        self.fetch(self.bundle)
+
+        self.assertEqual(self.inbox.entries[0].state,
+                         fake_inbox.ENTRY_STATE.ARCHIVE)
+        self.assertIn('galaxus/Danke für deine Bestellung 85231628.galaxus',
+                      read_members(self.bundle))
+
+    def test_keeps_emails_if_the_bundle_fails(self):
+        with self.assertRaises(RuntimeError):
+            self.fetch(self.bundle, fail=True)
+
+        self.assertEqual(self.inbox.entries[0].state,
+                         fake_inbox.ENTRY_STATE.INBOX)
+        self.assertFalse(self.bundle.exists())
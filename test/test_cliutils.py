@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import io
+import os
+import typing
+import unittest
+
+from fetcher import cliutils, statements
+
+
+@contextlib.contextmanager
+def closed_pipe_stdout() -> typing.Iterator[None]:
+    """Redirects stdout into a pipe whose reader is closed."""
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    stdout = io.TextIOWrapper(open(write_fd, 'wb'))
+    try:
+        with contextlib.redirect_stdout(stdout):
+            yield
+    finally:
+        # Closing retries the failed flush.
+        with contextlib.suppress(BrokenPipeError):
+            stdout.close()
+
+
+class WriteStdoutTestCase(unittest.TestCase):
+
+    def test_raises_on_a_closed_pipe(self):
+        with closed_pipe_stdout():
+            with self.assertRaises(BrokenPipeError):
+                cliutils.write_stdout(b'statement')
+
+    def test_statement_output_raises_on_a_closed_pipe(self):
+        with closed_pipe_stdout():
+            with self.assertRaises(BrokenPipeError):
+                cliutils.write_statement_output('raw', b'12174.52\n',
+                                                statements.from_mbank)
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+import doctest
+
+from fetcher import dateutils
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(dateutils))
+    return tests
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 import datetime
+import doctest
+import time
 import unittest
 
-from fetcher import degiro
+from fetcher import degiro, op
+from fetcher.dateutils import DateRange
 
 date = datetime.date
 
 
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(degiro))
+    return tests
+
+
 class DegiroTestCase(unittest.TestCase):
     def test_get_account_overview_url(self):
         from_date = date(1991, 1, 1)
@@ -17,3 +25,71 @@ class DegiroTestCase(unittest.TestCase):
             ('https://trader.degiro.nl/trader/#/account-overview' +
              '?fromDate=1991-01-01&toDate=2020-12-31&aggregateCashFunds=true' +
              '&currency=All'))
+
+    def test_make_statement_requests_requests_portfolio_once(self):
+        windows = [
+            DateRange(date(2024, 1, 1), date(2024, 1, 31)),
+            DateRange(date(2024, 2, 1), date(2024, 2, 29)),
+        ]
+
+        self.assertEqual(
+            degiro.make_statement_requests([
+                degiro.StatementType.PORTFOLIO, degiro.StatementType.ACCOUNT,
+                degiro.StatementType.ACCOUNT
+            ], windows), [
+                degiro.StatementRequest(degiro.StatementType.PORTFOLIO),
+                degiro.StatementRequest(degiro.StatementType.ACCOUNT,
+                                        windows[0]),
+                degiro.StatementRequest(degiro.StatementType.ACCOUNT,
+                                        windows[1]),
+            ])
+
+    def test_account_statement_url_keeps_urls_without_dates(self):
+        window = DateRange(date(2024, 1, 1), date(2024, 1, 31))
+        new_window = DateRange(date(2024, 2, 1), date(2024, 2, 29))
+
+        self.assertIsNone(
+            degiro.account_statement_url('blob:https://trader.degiro.nl/1',
+                                         window, new_window))
+        self.assertIsNone(
+            degiro.account_statement_url(
+                'https://trader.degiro.nl/csv?from=2024-01-01', window,
+                new_window))
+        self.assertEqual(
+            degiro.account_statement_url(
+                'https://trader.degiro.nl/csv' +
+                '?lang=de&fromDate=2024-01-01&toDate=2024-01-31', window,
+                new_window),
+            'https://trader.degiro.nl/csv' +
+            '?lang=de&fromDate=2024-02-01&toDate=2024-02-29')
+
+
+class FakeOpClient:
+
+    def __init__(self):
+        self.totp_fetches = 0
+
+    async def get_item_totp(self, vault_name: str, item_name: str) -> op.Totp:
+        self.totp_fetches += 1
+        return op.Totp('654321', 30, fetched_at=time.time())
+
+
+class DegiroTotpTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_keeps_valid_totp(self):
+        op_client = FakeOpClient()
+        totp = op.Totp('123456', 10**9, fetched_at=time.time())
+
+        self.assertEqual(
+            await degiro.fresh_totp(totp, op_client),  # type: ignore
+            totp)
+        self.assertEqual(op_client.totp_fetches, 0)
+
+    async def test_refreshes_expiring_totp(self):
+        op_client = FakeOpClient()
+        totp = op.Totp('123456', 1, fetched_at=time.time() - 10)
+
+        self.assertEqual(
+            (await degiro.fresh_totp(totp, op_client)).code,  # type: ignore
+            '654321')
+        self.assertEqual(op_client.totp_fetches, 1)
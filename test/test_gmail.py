@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import doctest
+import socket
+import time
+import unittest
+
+from fetcher import galaxus, gmail, google_play_mail
+
+from . import fake_imap_server, synthetic_mail
+from .fake_imap_server import FakeImapServer
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(fake_imap_server))
+    return tests
+
+
+class GmailImapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = self.enterContext(FakeImapServer())
+        for make in synthetic_mail.MESSAGE_KINDS.values():
+            self.server.mailbox.deliver(make(0))
+        # Logs out on cleanup unless the test already did.
+        self.imap = self.enterContext(fake_imap_server.connect(self.server))
+        self.inbox = gmail.Gmail(self.imap)
+        self.server.commands.clear()
+
+    def test_searches_fetches_and_archives(self):
+        nums = self.inbox.search_inbox('Uber Eats')
+        self.assertEqual(nums, [b'3'])
+
+        msg = self.inbox.fetch(nums[0])
+        self.assertEqual(msg['From'], 'Uber Receipts <noreply@uber.com>')
+        self.inbox.archive(nums[0])
+        self.inbox.close()
+
+        self.assertEqual(self.server.commands, {
+            'SEARCH': 1,
+            'FETCH': 1,
+            'STORE': 1,
+            'CLOSE': 1,
+            'LOGOUT': 1
+        })
+        self.assertEqual(len(self.server.mailbox.messages), 4)
+
+    def test_searches_decoded_subjects(self):
+        self.assertEqual(self.inbox.search_inbox('r deine Bestellung'), [b'1'])
+
+    def test_fetches_and_archives_bills(self):
+        galaxus_bills = list(galaxus.fetch_and_archive_bills(self.inbox))
+        google_play_bills = list(
+            google_play_mail.fetch_and_archive_bills(self.inbox))
+
+        self.assertEqual(
+            [b.subject for b in galaxus_bills],
+            ['Danke für deine Bestellung 85231628'])
+        self.assertIn('Gesamtbetrag', galaxus_bills[0].payload)
+        self.assertEqual(
+            [b.subject for b in google_play_bills],
+            ['Your Google Play Order Receipt from order 0'])
+        self.assertEqual(self.imap.search(None, 'DELETED'),
+                         ('OK', [b'1 2']))
+        self.assertEqual(self.server.commands['FETCH'], 2)
+
+    def test_uid_peek_and_bodystructure(self):
+        typ, data = self.imap.uid('SEARCH', 'SUBJECT "EasyRide"')
+        self.assertEqual((typ, data), ('OK', [b'4']))
+
+        typ, data = self.imap.uid(
+            'FETCH', '4', '(BODY.PEEK[HEADER.FIELDS (SUBJECT)] BODYSTRUCTURE)')
+        self.assertEqual(typ, 'OK')
+        self.assertEqual(data[0][1], b'Subject: EasyRide Quittung\r\n\r\n')
+        self.assertIn(b'"APPLICATION" "PDF"', data[1])
+        self.assertIn(b'"MIXED"', data[1])
+
+        typ, data = self.imap.fetch('4', '(FLAGS)')
+        self.assertEqual(data, [b'4 (FLAGS ())'])
+        self.imap.fetch('4', '(BODY[2])')
+        typ, data = self.imap.fetch('4', '(FLAGS)')
+        self.assertEqual(data, [b'4 (FLAGS (\\Seen))'])
+
+    def test_expunge(self):
+        self.imap.store('1:2', '+FLAGS', '\\Deleted')
+        typ, data = self.imap.expunge()
+        self.assertEqual((typ, data), ('OK', [b'2', b'1']))
+        self.assertEqual(self.inbox.search_inbox('Uber Eats'), [b'1'])
+
+    def test_rejects_unsupported_commands(self):
+        with self.assertRaises(self.imap.error):
+            self.imap.search(None, 'LARGER 10')
+
+
+class ImapServerTestCase(unittest.TestCase):
+
+    def test_adds_latency_to_round_trips(self):
+        with (FakeImapServer(latency=0.05) as server,
+              fake_imap_server.connect(server) as imap):
+            start = time.perf_counter()
+            imap.noop()
+            self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_idle_reports_new_messages(self):
+        with FakeImapServer() as server:
+            with socket.create_connection((server.host, server.port)) as s:
+                f = s.makefile('rwb', buffering=0)
+                f.readline()
+                f.write(b'a1 LOGIN john password\r\n')
+                self.assertEqual(f.readline(), b'a1 OK LOGIN\r\n')
+                f.write(b'a2 IDLE\r\n')
+                self.assertEqual(f.readline(), b'+ idling\r\n')
+
+                server.mailbox.deliver(synthetic_mail.newsletter(0))
+
+                self.assertEqual(f.readline(), b'* 1 EXISTS\r\n')
+                f.write(b'DONE\r\n')
+                self.assertEqual(f.readline(), b'a2 OK IDLE\r\n')
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+import base64
+import doctest
+import json
+import pathlib
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+from playwright.async_api import Error, async_playwright
+
+from fetcher import har, playwrightutils, tool
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(har))
+    return tests
+
+
+def har_entry(method: str, url: str, body: str) -> dict:
+    return {
+        "startedDateTime": "2024-01-01T00:00:00.000Z",
+        "time": 1,
+        "request": {
+            "method": method,
+            "url": url,
+            "httpVersion": "HTTP/1.1",
+            "cookies": [],
+            "headers": [{
+                "name": "Cookie",
+                "value": "session=secret"
+            }],
+            "queryString": [],
+            "postData": {
+                "mimeType": "application/x-www-form-urlencoded",
+                "text": "password=secret",
+            },
+            "headersSize": -1,
+            "bodySize": -1,
+        },
+        "response": {
+            "status": 200,
+            "statusText": "OK",
+            "httpVersion": "HTTP/1.1",
+            "cookies": [],
+            "headers": [{
+                "name": "Content-Type",
+                "value": "text/html"
+            }],
+            "content": {
+                "size": len(body),
+                "mimeType": "text/html",
+                "text": base64.b64encode(body.encode()).decode(),
+                "encoding": "base64",
+            },
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": -1,
+        },
+        "cache": {},
+        "timings": {
+            "send": 0,
+            "wait": 1,
+            "receive": 0
+        },
+    }
+
+
+class HarTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_sanitize_har_file(self):
+        path = self.directory / "flow.har"
+        path.write_text(
+            json.dumps({
+                "log": {
+                    "entries":
+                    [har_entry("POST", "https://bank.test/login", "Welcome")]
+                }
+            }))
+
+        har.sanitize_har_file(path)
+
+        text = path.read_text()
+        self.assertNotIn("secret", text)
+        self.assertIn("https://bank.test/login", text)
+        self.assertEqual(list(self.directory.iterdir()), [path])
+
+    def test_sanitize_har_redacts_tokens(self):
+        login = har_entry("POST", "https://bank.test/api/login?lang=en",
+                          '{"sessionId": "secret"}')
+        login["request"]["headers"] += [{
+            "name": "X-Auth-Token",
+            "value": "secret"
+        }, {
+            "name": "X-CSRF-Header",
+            "value": "secret"
+        }]
+        statement = har_entry(
+            "GET", "https://bank.test/statement?access_token=secret&year=2024",
+            "Statement")
+        statement["request"]["queryString"] = [{
+            "name": "access_token",
+            "value": "secret"
+        }, {
+            "name": "year",
+            "value": "2024"
+        }]
+
+        sanitized = har.sanitize_har({"log": {"entries": [login, statement]}})
+
+        self.assertNotIn("secret", json.dumps(sanitized))
+        login, statement = sanitized["log"]["entries"]
+        self.assertEqual(login["request"]["url"],
+                         "https://bank.test/api/login?lang=en")
+        self.assertNotIn("text", login["response"]["content"])
+        self.assertEqual(
+            statement["request"]["url"],
+            "https://bank.test/statement?access_token=REDACTED&year=2024")
+        self.assertEqual(statement["request"]["queryString"][1]["value"],
+                         "2024")
+        self.assertEqual(
+            base64.b64decode(statement["response"]["content"]["text"]),
+            b"Statement")
+
+    def test_use_har_restores_previous_har(self):
+        outer = har.Har(self.directory / "a.har", har.HarMode.RECORD)
+        inner = har.Har(self.directory / "b.har", har.HarMode.REPLAY)
+        with har.use_har(outer):
+            with har.use_har(inner):
+                self.assertEqual(har.current_har(), inner)
+            self.assertEqual(har.current_har(), outer)
+        self.assertIsNone(har.current_har())
+
+    def test_cli_rejects_record_and_replay(self):
+        config_path = self.directory / "fetcher.json"
+        config_path.write_text(json.dumps({"logging_file": ""}))
+        har_path = self.directory / "flow.har"
+        har_path.write_text("{}")
+        result = CliRunner().invoke(tool.cli, [
+            f"--config_file={config_path}", f"--record-har={har_path}",
+            f"--replay-har={har_path}", "stats"
+        ],
+                                    obj={})
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("exclusive", result.output)
+
+
+class HarBrowserTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        async with async_playwright() as pw:
+            if not pathlib.Path(pw.chromium.executable_path).exists():
+                self.skipTest("Chromium is not installed.")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.har_path = pathlib.Path(self.tmp_dir.name) / "flow.har"
+
+    async def asyncTearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_replays_offline(self):
+        self.har_path.write_text(
+            json.dumps({
+                "log": {
+                    "version": "1.2",
+                    "creator": {
+                        "name": "test",
+                        "version": "1"
+                    },
+                    "entries": [
+                        har_entry("GET", "https://bank.test/", "<p>Balance</p>")
+                    ],
+                }
+            }))
+        replay = har.Har(self.har_path, har.HarMode.REPLAY)
+
+        async with playwrightutils.new_stack(playwrightutils.Browser.CHROMIUM,
+                                             headless=True,
+                                             har=replay) as (_, _, _, page):
+            await page.goto("https://bank.test/")
+            self.assertEqual(await page.text_content("p"), "Balance")
+            with self.assertRaises(Error):
+                await page.goto("https://bank.test/missing")
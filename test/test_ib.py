@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+import datetime
+import doctest
+import json
+import pathlib
+import tempfile
+import textwrap
+import unittest
+
+from click.testing import CliRunner
+
+from fetcher import ib, tool
+from fetcher.dateutils import DateRange
+
+date = datetime.date
+
+STATEMENT = ("\ufeff" + textwrap.dedent("""\
+    Statement,Header,Field Name,Field Value
+    Statement,Data,Title,Activity Statement
+    Trades,Header,DataDiscriminator,Asset Category,Currency
+    Trades,Data,Order,Forex,CHF
+    Trades,Header,DataDiscriminator,Asset Category,Symbol
+    Trades,Data,Order,Stocks,VXUS
+
+    Dividends,Header,Currency,Description,Amount
+    Dividends,Data,USD,"VT, Cash
+    Dividend",1.23
+    Trades,Data,Order,Stocks,BND
+    """)).encode("utf-8")
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(ib))
+    return tests
+
+
+class IbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def stitch(self, *statements: bytes) -> str:
+        paths = []
+        for i, statement in enumerate(statements):
+            paths.append(self.directory / f'activity_{i}.csv')
+            paths[-1].write_bytes(statement)
+        return ib.stitch_activity_statements(paths).decode('utf-8')
+
+    def test_split_into_statement_windows(self):
+        windows = ib.split_into_statement_windows(date(2021, 1, 1),
+                                                  date(2023, 3, 31))
+
+        self.assertEqual(windows, [
+            DateRange(date(2021, 1, 1), date(2021, 12, 31)),
+            DateRange(date(2022, 1, 1), date(2022, 12, 31)),
+            DateRange(date(2023, 1, 1), date(2023, 3, 31)),
+        ])
+
+    def test_stitch_activity_statements(self):
+        first = ("\ufeff" + textwrap.dedent("""\
+            Statement,Header,Field Name,Field Value
+            Statement,Data,Title,Activity Statement
+            Trades,Header,DataDiscriminator,Asset Category,Symbol
+            Trades,Data,Order,Stocks,VT
+            Trades,Data,Order,Stocks,VXUS
+            """)).encode("utf-8")
+        second = ("\ufeff" + textwrap.dedent("""\
+            Statement,Header,Field Name,Field Value
+            Statement,Data,Title,Activity Statement
+            Trades,Header,DataDiscriminator,Asset Category,Currency
+            Trades,Data,Order,Forex,CHF
+            Trades,Header,DataDiscriminator,Asset Category,Symbol
+            Trades,Data,Order,Stocks,VXUS
+            Trades,Data,Order,Stocks,BND
+            Dividends,Header,Currency,Description,Amount
+            Dividends,Data,USD,"VT, Cash Dividend",1.23
+            """)).encode("utf-8")
+
+        self.assertEqual(
+            self.stitch(first, second),
+            textwrap.dedent("""\
+            Statement,Header,Field Name,Field Value
+            Statement,Data,Title,Activity Statement
+            Trades,Header,DataDiscriminator,Asset Category,Symbol
+            Trades,Data,Order,Stocks,VT
+            Trades,Data,Order,Stocks,VXUS
+            Trades,Data,Order,Stocks,BND
+            Trades,Header,DataDiscriminator,Asset Category,Currency
+            Trades,Data,Order,Forex,CHF
+            Dividends,Header,Currency,Description,Amount
+            Dividends,Data,USD,"VT, Cash Dividend",1.23
+            """))
+
+    def test_stitch_keeps_repeated_rows_within_a_statement(self):
+        first = textwrap.dedent("""\
+            Fees,Header,Currency,Date,Amount
+            Fees,Data,USD,2024-01-02,-1.00
+            Fees,Data,USD,2024-01-02,-1.00
+            """).encode("utf-8")
+        second = textwrap.dedent("""\
+            Fees,Header,Currency,Date,Amount
+            Fees,Data,USD,2024-01-02,-1.00
+            Fees,Data,USD,2024-01-02,-1.00
+            Fees,Data,USD,2025-01-02,-1.00
+            """).encode("utf-8")
+
+        self.assertEqual(
+            self.stitch(first, second),
+            textwrap.dedent("""\
+            Fees,Header,Currency,Date,Amount
+            Fees,Data,USD,2024-01-02,-1.00
+            Fees,Data,USD,2024-01-02,-1.00
+            Fees,Data,USD,2025-01-02,-1.00
+            """))
+
+    def test_stitch_keeps_the_last_summary(self):
+        first = textwrap.dedent("""\
+            Net Asset Value,Header,Asset Class,Total
+            Net Asset Value,Data,Cash,100
+            Trades,Header,Symbol
+            Trades,Data,VT
+            """).encode("utf-8")
+        second = textwrap.dedent("""\
+            Net Asset Value,Header,Asset Class,Total
+            Net Asset Value,Data,Cash,120
+            Trades,Header,Symbol
+            Trades,Data,BND
+            """).encode("utf-8")
+
+        self.assertEqual(
+            self.stitch(first, second),
+            textwrap.dedent("""\
+            Net Asset Value,Header,Asset Class,Total
+            Net Asset Value,Data,Cash,120
+            Trades,Header,Symbol
+            Trades,Data,VT
+            Trades,Data,BND
+            """))
+
+    def test_stitch_keeps_a_reappearing_section_under_its_header(self):
+        self.assertEqual(
+            self.stitch(STATEMENT),
+            textwrap.dedent("""\
+            Statement,Header,Field Name,Field Value
+            Statement,Data,Title,Activity Statement
+            Trades,Header,DataDiscriminator,Asset Category,Currency
+            Trades,Data,Order,Forex,CHF
+            Trades,Header,DataDiscriminator,Asset Category,Symbol
+            Trades,Data,Order,Stocks,VXUS
+            Trades,Data,Order,Stocks,BND
+            Dividends,Header,Currency,Description,Amount
+            Dividends,Data,USD,"VT, Cash
+            Dividend",1.23
+            """))
+
+
+class IbCommandsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = pathlib.Path(self.tmp_dir.name) / 'fetcher.json'
+        self.config.write_text(json.dumps({'logging_file': None}))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_backfill_rejects_a_reversed_range(self):
+        result = CliRunner().invoke(tool.cli, [
+            f'--config_file={self.config}', 'ib-activity-backfill',
+            '--from-date=2024-06-01', '--to-date=2024-01-01'
+        ],
+                                    obj={})
+
+        self.assertEqual(result.exit_code, 2, result.output)
+        self.assertIn('after the last day', result.output)
+
+
+class ActivityStatementTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp_dir.name) / 'activity.csv'
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_indexes_sections(self):
+        sections = ib.index_sections(STATEMENT)
+
+        self.assertEqual(list(sections), ['Statement', 'Trades', 'Dividends'])
+        self.assertEqual(len(sections['Trades']), 2)
+        for start, end in sections['Dividends']:
+            self.assertTrue(STATEMENT[start:end].startswith(b'Dividends,'))
+
+    def test_reads_sections_from_a_file(self):
+        self.path.write_bytes(STATEMENT)
+
+        with ib.ActivityStatement.open(self.path) as statement:
+            trades = list(statement.rows('Trades'))
+            dividends = list(statement.rows('Dividends'))
+
+        self.assertEqual([row[1] for row in trades],
+                         ['Header', 'Data', 'Header', 'Data', 'Data'])
+        self.assertEqual(trades[-1][-1], 'BND')
+        self.assertEqual(
+            dividends[1],
+            ['Dividends', 'Data', 'USD', 'VT, Cash\nDividend', '1.23'])
+
+    def test_reads_an_empty_file(self):
+        self.path.write_bytes(b'')
+
+        with ib.ActivityStatement.open(self.path) as statement:
+            self.assertEqual(statement.sections, {})
+            self.assertEqual(list(statement.rows('Trades')), [])
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+import doctest
+import json
+import pathlib
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from fetcher import ledger, tool
+from fetcher.ledger import Ledger
+
+HEADER = [['Date', 'Description', 'Amount']]
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(ledger))
+    return tests
+
+
+class LedgerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name) / 'ledger'
+        self.ledger = Ledger.open(self.directory, 'bcge')
+
+    def tearDown(self):
+        self.ledger.close()
+        self.tmp_dir.cleanup()
+
+    def export(self):
+        with self.ledger.export() as rows:
+            return list(rows)
+
+    def test_merges_overlapping_statements(self):
+        march = [['2024-03-01', 'Migros', '-12.50'],
+                 ['2024-03-20', 'Salary', '5000.00']]
+        april = [['2024-03-20', 'Salary', '5000.00'],
+                 ['2024-04-02', 'Coop', '-7.80']]
+
+        self.assertEqual(self.ledger.merge(HEADER, march), 2)
+        self.assertEqual(self.ledger.merge(HEADER, april), 1)
+        self.assertEqual(self.ledger.merge(HEADER, april), 0)
+        self.assertEqual(self.ledger.count(), 3)
+        self.assertEqual(self.ledger.header, HEADER)
+
+    def test_keeps_repeated_rows_of_a_statement(self):
+        coffee = ['2024-03-01', 'Cafe', '-4.50']
+
+        self.assertEqual(self.ledger.merge(HEADER, [coffee, coffee]), 2)
+        self.assertEqual(self.ledger.merge(HEADER, [coffee]), 0)
+        self.assertEqual(self.ledger.merge(HEADER, [coffee] * 3), 1)
+
+    def test_rejects_a_different_header(self):
+        self.ledger.merge(HEADER, [])
+
+        with self.assertRaisesRegex(Exception, "differs from the ledger's"):
+            self.ledger.merge([['Datum', 'Betrag']], [['2024-03-01', '-1']])
+
+    def test_exports_only_new_rows(self):
+        self.ledger.merge(HEADER, [['2024-03-01', 'Migros', '-12.50']])
+        self.assertEqual(self.export(), [['2024-03-01', 'Migros', '-12.50']])
+        self.assertEqual(self.export(), [])
+
+        self.ledger.merge(HEADER, [['2024-03-01', 'Migros', '-12.50'],
+                                   ['2024-04-02', 'Coop', '-7.80']])
+        self.assertEqual(self.export(), [['2024-04-02', 'Coop', '-7.80']])
+
+    def test_repeats_a_failed_export(self):
+        self.ledger.merge(HEADER, [['2024-03-01', 'Migros', '-12.50']])
+
+        with self.assertRaises(RuntimeError):
+            with self.ledger.export() as rows:
+                list(rows)
+                raise RuntimeError()
+        self.assertEqual(self.export(), [['2024-03-01', 'Migros', '-12.50']])
+
+    def test_rejects_account_names_with_paths(self):
+        with self.assertRaisesRegex(Exception, 'Invalid account name'):
+            Ledger.open(self.directory, '../bcge')
+
+
+class LedgerCommandsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = pathlib.Path(self.tmp_dir.name) / 'fetcher.json'
+        self.config.write_text(json.dumps({'logging_file': None}))
+        self.runner = CliRunner()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def invoke(self, *args, input=None):
+        result = self.runner.invoke(tool.cli,
+                                    [f'--config_file={self.config}', *args],
+                                    input=input,
+                                    obj={},
+                                    catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0, result.output)
+        return result
+
+    def test_merges_and_exports(self):
+        self.invoke('ledger-merge',
+                    '--delimiter=;',
+                    'mbank',
+                    input='Data;Kwota\r\n2024-03-01;-5,00\r\n')
+        self.invoke('ledger-merge',
+                    '--delimiter=;',
+                    'mbank',
+                    input=('Data;Kwota\r\n2024-03-01;-5,00\r\n' +
+                           '2024-03-02;-6,00\r\n'))
+
+        # Click's runner normalizes the CSV's CRLF line endings.
+        self.assertEqual(self.invoke('ledger-export', 'mbank').stdout,
+                         'Data;Kwota\n2024-03-01;-5,00\n2024-03-02;-6,00\n')
+        self.assertEqual(
+            self.invoke('ledger-export', 'mbank').stdout, 'Data;Kwota\n')
+        self.assertTrue(
+            (pathlib.Path(self.tmp_dir.name) / 'ledger' /
+             'mbank.sqlite3').exists())
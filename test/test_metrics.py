@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import doctest
+import json
+import pathlib
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+from fetcher import metrics, tool, tracing
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(metrics))
+    return tests
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records_steps_counters_and_failures(self):
+        textfile_directory = self.directory / "textfile"
+        with metrics.record_run("pull-test", self.directory,
+                                textfile_directory):
+            with tracing.span("test.login"):
+                metrics.increment("bytes_downloaded", 10)
+            with self.assertRaises(ValueError):
+                with tracing.span("test.fetch"):
+                    with tracing.span("test.parse"):
+                        raise ValueError()
+            metrics.increment("bytes_downloaded", 5)
+        metrics.increment("bytes_downloaded", 100)  # Outside of the run.
+
+        [record] = metrics.read_history(self.directory)
+        self.assertEqual(record["command"], "pull-test")
+        self.assertEqual(record["status"], "ok")
+        self.assertEqual(set(record["steps"]),
+                         {"test.login", "test.fetch", "test.parse"})
+        self.assertEqual(record["failures"], {"test.parse": 1})
+        self.assertEqual(record["counters"], {"bytes_downloaded": 15})
+        prom = (textfile_directory / "pull-test.prom").read_text()
+        self.assertIn("# TYPE findata_bytes_downloaded_total counter", prom)
+        self.assertIn(
+            'findata_bytes_downloaded_total{command="pull-test"} 15', prom)
+        self.assertIn(
+            'findata_step_failures_total{command="pull-test",' +
+            'step="test.parse"} 1', prom)
+
+    def test_appends_to_history(self):
+        for _ in range(2):
+            with metrics.record_run("pull-test", self.directory):
+                pass
+        with metrics.record_run("pull-test", self.directory) as run:
+            run.discarded = True
+        self.assertEqual(len(metrics.read_history(self.directory)), 2)
+        self.assertEqual(list(self.directory.glob("*.prom")), [])
+
+    def test_summarize(self):
+        records = [{
+            "command": "pull-test",
+            "duration_seconds": float(i),
+            "status": "ok" if i else "error",
+            "steps": {
+                "test.login": {
+                    "calls": 1,
+                    "total_seconds": i / 10
+                }
+            },
+            "failures": {},
+        } for i in range(11)]
+        run, login = metrics.summarize(records)
+        self.assertEqual(run.step, metrics.RUN_STEP)
+        self.assertEqual((run.runs, run.failures), (11, 1))
+        self.assertAlmostEqual(run.p50_seconds, 5.0)
+        self.assertAlmostEqual(run.p95_seconds, 9.5)
+        self.assertEqual(login.step, "test.login")
+        self.assertAlmostEqual(login.p95_seconds, 0.95)
+
+
+class CliMetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+        self.config_path = self.directory / "fetcher.json"
+        self.config_path.write_text(json.dumps({"logging_file": ""}))
+        self.metrics_directory = self.directory / "metrics"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def invoke(self, *args: str):
+        return CliRunner().invoke(
+            tool.cli, [f"--config_file={self.config_path}", *args], obj={})
+
+    def test_records_failed_runs_and_prints_stats(self):
+        wire_instructions = self.directory / "wire.csv"
+        wire_instructions.write_text("key,value\n")
+        result = self.invoke("cs-send-wire-to-ib", "--amount=1",
+                             str(wire_instructions))
+        self.assertIsInstance(result.exception, NotImplementedError)
+
+        [record] = metrics.read_history(self.metrics_directory)
+        self.assertEqual(record["command"], "cs-send-wire-to-ib")
+        self.assertEqual(record["status"], "error")
+
+        result = self.invoke("stats")
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("cs-send-wire-to-ib", result.output)
+        # The stats command itself is not recorded.
+        self.assertEqual(len(metrics.read_history(self.metrics_directory)),
+                         1)
+
+    def test_does_not_record_help(self):
+        result = self.invoke("pull-bcge", "--help")
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(metrics.read_history(self.metrics_directory), [])
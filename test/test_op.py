@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+import doctest
+import pathlib
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from fetcher import op
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(op))
+    return tests
+
+
+class FakeSecrets:
+
+    def __init__(self, secrets: dict[str, str]):
+        self.secrets = secrets
+        self.calls: list[list[str]] = []
+
+    async def resolve_all(self, references: list[str]):
+        self.calls.append(references)
+        return SimpleNamespace(
+            individual_responses={
+                r: (SimpleNamespace(
+                    content=SimpleNamespace(secret=self.secrets[r]),
+                    error=None) if r in self.secrets else SimpleNamespace(
+                        content=None, error="not found"))
+                for r in references
+            })
+
+
+class OpSdkClientTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        op._resolved_secrets.clear()
+        self.secrets = FakeSecrets({
+            "op://v/i/username": "john",
+            "op://v/i/password": "hunter2",
+        })
+        self.client = op.OpSdkClient(
+            SimpleNamespace(secrets=self.secrets))  # type: ignore
+
+    def tearDown(self):
+        op._resolved_secrets.clear()
+
+    async def test_read_many_resolves_once_per_process(self):
+        self.assertEqual(
+            await self.client.read_fields("v", "i", ["username", "password"]),
+            ["john", "hunter2"])
+        self.assertEqual(await self.client.read("v", "i", "password"),
+                         "hunter2")
+        self.assertEqual(
+            await self.client.read_many(
+                ["op://v/i/password", "op://v/i/password"]),
+            ["hunter2", "hunter2"])
+
+        self.assertEqual(self.secrets.calls,
+                         [["op://v/i/username", "op://v/i/password"]])
+
+    async def test_read_many_raises_on_unresolved_reference(self):
+        with self.assertRaisesRegex(Exception, "op://v/i/pin"):
+            await self.client.read_many(["op://v/i/username", "op://v/i/pin"])
+        self.assertEqual(op._resolved_secrets, {})
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeVaults:
+
+    def __init__(self):
+        self.list_calls = 0
+
+    async def list(self):
+        self.list_calls += 1
+        return [SimpleNamespace(title="Automated Findata", id="v1")]
+
+
+class FakeItems:
+
+    def __init__(self):
+        self.list_calls = 0
+        self.get_calls = 0
+        self.item_id = "i1"
+        self.get_error: Exception | None = None
+
+    async def list(self, vault_id: str):
+        self.list_calls += 1
+        return [SimpleNamespace(title="degiro.nl", id=self.item_id)]
+
+    async def get(self, vault_id: str, item_id: str):
+        self.get_calls += 1
+        if self.get_error is not None:
+            raise self.get_error
+        if (vault_id, item_id) != ("v1", self.item_id):
+            raise Exception("Item not found.")
+        totp = SimpleNamespace(field_type="Totp",
+                               value="otpauth://totp/Degiro?period=30",
+                               details=SimpleNamespace(
+                                   content=SimpleNamespace(
+                                       error_message=None, code="123456")))
+        return SimpleNamespace(fields=[totp])
+
+
+class IdIndexTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp_dir.name) / "findata" / "index.json"
+        self.clock = FakeClock()
+        self.vaults = FakeVaults()
+        self.items = FakeItems()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def new_client(self) -> op.OpSdkClient:
+        return op.OpSdkClient(
+            SimpleNamespace(vaults=self.vaults,
+                            items=self.items),  # type: ignore
+            op.IdIndex(self.path, ttl_seconds=60, clock=self.clock))
+
+    async def test_totp_uses_persisted_index(self):
+        self.assertEqual(
+            (await self.new_client().get_item_totp("Automated Findata",
+                                                   "degiro.nl")).code, "123456")
+        self.assertEqual(
+            (await self.new_client().get_item_totp("Automated Findata",
+                                                   "degiro.nl")).code, "123456")
+
+        self.assertEqual(self.vaults.list_calls, 1)
+        self.assertEqual(self.items.list_calls, 1)
+        self.assertEqual(self.items.get_calls, 2)
+
+    async def test_index_expires(self):
+        await self.new_client().get_vault_id("Automated Findata")
+        self.clock.now += 61
+        await self.new_client().get_vault_id("Automated Findata")
+
+        self.assertEqual(self.vaults.list_calls, 2)
+
+    async def test_lookup_miss_refreshes_index(self):
+        client = self.new_client()
+
+        self.assertIsNone(await client.get_vault_id("Personal"))
+        self.assertIsNone(await client.get_vault_id("Personal"))
+
+        self.assertEqual(self.vaults.list_calls, 2)
+
+    async def test_stale_item_id_rebuilds_index(self):
+        await self.new_client().get_item_totp("Automated Findata",
+                                              "degiro.nl")
+        self.items.item_id = "i2"
+
+        self.assertEqual(
+            (await self.new_client().get_item_totp("Automated Findata",
+                                                   "degiro.nl")).code, "123456")
+        self.assertEqual(self.items.list_calls, 2)
+
+    async def test_other_errors_keep_the_index(self):
+        await self.new_client().get_item_totp("Automated Findata",
+                                              "degiro.nl")
+        self.items.get_error = ConnectionError("Connection reset.")
+
+        with self.assertRaises(ConnectionError):
+            await self.new_client().get_item_totp("Automated Findata",
+                                                  "degiro.nl")
+        self.assertEqual(self.vaults.list_calls, 1)
+        self.assertEqual(self.items.list_calls, 1)
+        self.assertEqual(self.items.get_calls, 2)
+
+    async def test_missing_item_raises_after_one_rebuild(self):
+        with self.assertRaisesRegex(Exception, "Could not find the gone item"):
+            await self.new_client().get_item_totp("Automated Findata", "gone")
+
+        self.assertEqual(self.items.list_calls, 2)
@@ -0,0 +1,401 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import doctest
+import http.server
+import pathlib
+import re
+import tempfile
+import threading
+import unittest
+from typing import NamedTuple
+
+from playwright.async_api import async_playwright
+
+from fetcher import ib, playwrightutils
+from fetcher.har import Har, HarMode, use_har
+
+from .file_extra import read_file
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(playwrightutils))
+    return tests
+
+
+class FakePage:
+
+    def __init__(self, context: "FakeContext"):
+        self.context = context
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+        self.context.open_pages -= 1
+
+
+class FakeContext:
+
+    def __init__(self):
+        self.pages: list[FakePage] = []
+        self.open_pages = 0
+        self.max_open_pages = 0
+
+    async def new_page(self) -> FakePage:
+        page = FakePage(self)
+        self.pages.append(page)
+        self.open_pages += 1
+        self.max_open_pages = max(self.max_open_pages, self.open_pages)
+        return page
+
+
+class MapOnNewPagesTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_keeps_order_and_concurrency_limit(self):
+        context = FakeContext()
+
+        async def job(page, item: int) -> int:
+            # Finish later items first to shuffle completion order.
+            await asyncio.sleep(0.01 * (5 - item))
+            return item * 10
+
+        results = await playwrightutils.map_on_new_pages(
+            context, job, range(5), max_concurrency=2)  # type: ignore
+
+        self.assertEqual(results, [0, 10, 20, 30, 40])
+        self.assertEqual(len(context.pages), 5)
+        self.assertEqual(context.max_open_pages, 2)
+        self.assertTrue(all(p.closed for p in context.pages))
+
+    async def test_closes_pages_on_failure(self):
+        context = FakeContext()
+
+        async def job(page, item: int) -> int:
+            raise ValueError(item)
+
+        with self.assertRaises(ExceptionGroup):
+            await playwrightutils.map_on_new_pages(
+                context, job, [1], max_concurrency=1)  # type: ignore
+        self.assertTrue(all(p.closed for p in context.pages))
+
+
+class StatementHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a statement only to requests with the session cookie."""
+
+    def do_GET(self):
+        if (self.headers.get("Cookie") != "session=s3cr3t"
+                or self.headers.get("User-Agent") != "Firefox"):
+            self.send_response(403)
+            self.end_headers()
+            return
+        body = f"statement for {self.path}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpSessionTestCase(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                      StatementHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        cookie = {
+            "name": "session",
+            "value": "s3cr3t",
+            "domain": "127.0.0.1",
+            "path": "/",
+            "expires": -1,
+            "httpOnly": True,
+            "secure": False,
+            "sameSite": "Lax",
+        }
+        self.state = playwrightutils.SessionState(
+            storage_state={
+                "cookies": [cookie],  # type: ignore
+                "origins": []
+            },
+            headers={"User-Agent": "Firefox"})
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_uses_exported_session(self):
+        async with (async_playwright() as pw,
+                    playwrightutils.new_http_session(self.state, pw) as s):
+            self.assertEqual(
+                await s.get(f"{self.url}/export", params={"year": 2024}),
+                b"statement for /export?year=2024")
+            with tempfile.TemporaryDirectory() as d:
+                path = pathlib.Path(d) / "statement.csv"
+                await s.download(f"{self.url}/export", path)
+                self.assertEqual(path.read_bytes(),
+                                 b"statement for /export")
+
+    async def test_falls_back_to_browser_without_session(self):
+        state = playwrightutils.SessionState(storage_state={},
+                                             headers={})
+
+        async def browser_fetch() -> bytes:
+            return b"browser statement"
+
+        async with (async_playwright() as pw,
+                    playwrightutils.new_http_session(state, pw) as s):
+            with self.assertLogs("fetcher.playwrightutils", "WARNING"):
+                self.assertEqual(
+                    await playwrightutils.fetch_with_browser_fallback(
+                        lambda: s.get(f"{self.url}/export"), browser_fetch),
+                    b"browser statement")
+
+    async def test_uses_browser_while_a_har_is_active(self):
+
+        async def http_fetch() -> bytes:
+            raise AssertionError("The HTTP fetch bypasses the HAR.")
+
+        async def browser_fetch() -> bytes:
+            return b"browser statement"
+
+        with use_har(Har(pathlib.Path("flow.har"), HarMode.REPLAY)):
+            self.assertEqual(
+                await playwrightutils.fetch_with_browser_fallback(
+                    http_fetch, browser_fetch), b"browser statement")
+
+
+class FakeRequest:
+
+    async def all_headers(self) -> dict[str, str]:
+        return {
+            "user-agent": "Firefox",
+            "accept-language": "de-CH",
+            "referer": "https://trader.degiro.nl/trader/",
+            "cookie": "session=s3cr3t",
+            "host": "trader.degiro.nl",
+        }
+
+
+class FakeStatePage:
+    url = "https://trader.degiro.nl/trader/"
+
+    async def evaluate(self, expression: str):
+        return ["Firefox", ["de-CH", "en"]]
+
+
+class FakeStateContext:
+
+    def __init__(self):
+        self.pages = [FakeStatePage()]
+
+    async def storage_state(self):
+        return {"cookies": [], "origins": []}
+
+
+class ExportSessionStateTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_exports_the_headers_of_a_request(self):
+        state = await playwrightutils.export_session_state(
+            FakeStateContext(), FakeRequest())  # type: ignore
+
+        self.assertEqual(
+            state.headers, {
+                "user-agent": "Firefox",
+                "accept-language": "de-CH",
+                "referer": "https://trader.degiro.nl/trader/",
+            })
+
+    async def test_derives_headers_from_the_page(self):
+        state = await playwrightutils.export_session_state(
+            FakeStateContext())  # type: ignore
+
+        self.assertEqual(
+            state.headers, {
+                "User-Agent": "Firefox",
+                "Accept-Language": "de-CH,en",
+                "Referer": "https://trader.degiro.nl/trader/",
+            })
+
+
+class FakeResponse:
+
+    def __init__(self, url: str, payload):
+        self.url = url
+        self.payload = payload
+
+    async def json(self):
+        if self.payload is None:
+            raise ValueError("Not JSON.")
+        return self.payload
+
+
+class FakeEventPage:
+
+    def __init__(self):
+        self.listeners = []
+
+    def on(self, event: str, listener) -> None:
+        self.assert_response_event(event)
+        self.listeners.append(listener)
+
+    def remove_listener(self, event: str, listener) -> None:
+        self.assert_response_event(event)
+        self.listeners.remove(listener)
+
+    def emit(self, response: FakeResponse) -> None:
+        for listener in self.listeners:
+            listener(response)
+
+    @staticmethod
+    def assert_response_event(event: str) -> None:
+        assert event == "response", f"Unexpected event: {event}."
+
+
+class CaptureJsonResponseTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_resolves_with_first_parsed_payload(self):
+        page = FakeEventPage()
+
+        def parse(payload):
+            return payload.get("total")
+
+        async with playwrightutils.capture_json_response(
+                page,  # type: ignore
+                re.compile(r"/api/"),
+                parse) as total:
+            page.emit(FakeResponse("https://bank.ch/api/user", {"name": "X"}))
+            page.emit(FakeResponse("https://bank.ch/api/html", None))
+            page.emit(FakeResponse("https://bank.ch/static", {"total": 1}))
+            page.emit(FakeResponse("https://bank.ch/api/sum", {"total": 2}))
+            self.assertEqual(await total, 2)
+        self.assertEqual(page.listeners, [])
+
+    async def test_uses_the_fallback_if_nothing_is_captured(self):
+        page = FakeEventPage()
+
+        async def fallback() -> int:
+            return 3
+
+        async with playwrightutils.capture_json_response(
+                page,  # type: ignore
+                re.compile(r"/api/"),
+                lambda payload: None) as total:
+            self.assertEqual(
+                await playwrightutils.race_capture(total, fallback), 3)
+
+    async def test_cancels_the_fallback_once_captured(self):
+        page = FakeEventPage()
+        fallback_started = asyncio.Event()
+        fallback_cancelled = asyncio.Event()
+
+        async def fallback() -> int:
+            fallback_started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                fallback_cancelled.set()
+                raise
+            return 3
+
+        async with playwrightutils.capture_json_response(
+                page,  # type: ignore
+                re.compile(r"/api/"),
+                lambda payload: payload["total"]) as total:
+            race = asyncio.create_task(
+                playwrightutils.race_capture(total, fallback))
+            await fallback_started.wait()
+            page.emit(FakeResponse("https://bank.ch/api/sum", {"total": 2}))
+            self.assertEqual(await race, 2)
+        await asyncio.wait_for(fallback_cancelled.wait(), 1)
+
+
+class FakeLocator:
+
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.round_trips = 0
+
+    async def evaluate_all(self, expression: str, arg) -> list[dict]:
+        self.round_trips += 1
+        self.arg = arg
+        return self.rows
+
+
+class ExtractAllTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def test_reads_all_rows_in_one_round_trip(self):
+        locator = FakeLocator([{"labels": [f"k{i}", f"v{i}"]} for i in range(100)])
+
+        rows = await playwrightutils.extract_all(
+            locator,  # type: ignore
+            ib.DepositInformationRow,
+            ib.DEPOSIT_INFORMATION_ROW_FIELDS)
+
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows[1].key_value(), ("k1", "v1"))
+        self.assertEqual(locator.round_trips, 1)
+        self.assertEqual(
+            locator.arg,
+            {"labels": {
+                "selector": "label",
+                "attribute": None,
+                "multiple": True
+            }})
+
+
+async def is_chromium_installed(pw) -> bool:
+    return pathlib.Path(pw.chromium.executable_path).exists()
+
+
+class ExtractAllBrowserTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.pw = await async_playwright().start()
+        if not await is_chromium_installed(self.pw):
+            await self.pw.stop()
+            self.skipTest("Chromium is not installed.")
+        self.browser = await self.pw.chromium.launch()
+        self.page = await self.browser.new_page()
+        await self.page.set_content(
+            read_file("test/data/ib-deposit-instructions.html"))
+
+    async def asyncTearDown(self):
+        await self.browser.close()
+        await self.pw.stop()
+
+    async def test_extracts_fields(self):
+        rows = await playwrightutils.extract_all(
+            self.page.locator("div.row"), Row, {
+                "key": playwrightutils.Field("label"),
+                "labels": playwrightutils.Field("label", multiple=True),
+                "cls": playwrightutils.Field(attribute="class"),
+                "missing": playwrightutils.Field("span"),
+            })
+
+        self.assertEqual(rows[0], Row(
+            key="Transfer Funds to Beneficiary/Account Title",
+            labels=[
+                "Transfer Funds to Beneficiary/Account Title",
+                "Interactive Brokers LLC"
+            ],
+            cls="row",
+            missing=None))
+        self.assertEqual(len(rows), 5)
+
+    async def test_scrapes_ib_deposit_information(self):
+        self.assertEqual(
+            await ib.scrape_deposit_information(self.page),
+            ib.SourceBankDepositInformation(
+                transfer_to="Interactive Brokers LLC",
+                iban="CH00 0000 0000 0000 0000 0",
+                beneficiary_bank="UBS Switzerland AG",
+                for_further_credit="U1234567 John Doe"))
+
+
+class Row(NamedTuple):
+    key: str | None
+    labels: list[str | None]
+    cls: str | None
+    missing: str | None
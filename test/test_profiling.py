@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import io
+import pathlib
+import pstats
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from fetcher import profiling
+
+
+def parse(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+async def parse_in_task(n: int) -> int:
+    await asyncio.sleep(0)
+    return parse(n)
+
+
+async def parse_concurrently() -> None:
+    await asyncio.gather(parse_in_task(1000), parse_in_task(2000))
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+        self.summary = io.StringIO()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cpu_profile_covers_asyncio_tasks(self):
+        output = self.directory / "run.pstats"
+        with profiling.profile(profiling.Profiler.CPU, output, 10,
+                               self.summary):
+            asyncio.run(parse_concurrently())
+
+        stats = pstats.Stats(str(output)).stats
+        calls = {
+            function: primitive_calls
+            for (_, _, function), (primitive_calls, *_) in stats.items()
+        }
+        self.assertEqual(calls["parse"], 2)
+        self.assertIn("parse_in_task", calls)
+        self.assertIn("Top 10 by own time", self.summary.getvalue())
+
+    def test_alloc_profile_shows_the_peak(self):
+        output = self.directory / "run.tracemalloc"
+        with profiling.profile(profiling.Profiler.ALLOC, output, 5,
+                               self.summary):
+            retained = [bytes(1000) for _ in range(100)]
+            time.sleep(10 * profiling.ALLOC_SAMPLE_SECONDS)
+            del retained
+
+        snapshot = tracemalloc.Snapshot.load(str(output))
+        self.assertGreater(
+            sum(s.size for s in snapshot.statistics("filename")
+                if s.traceback[0].filename == __file__), 100_000)
+        self.assertIn("Peak traced memory", self.summary.getvalue())
+        self.assertIn("at the sampled peak", self.summary.getvalue())
+        self.assertIn("test_profiling.py", self.summary.getvalue())
+        self.assertFalse(tracemalloc.is_tracing())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+import doctest
+import json
+import pathlib
+import tempfile
+import unittest
+from datetime import date
+
+from click.testing import CliRunner
+
+from fetcher import receipts, tool
+from fetcher.archive import Archive
+from fetcher.receipts import (
+    IndexingOutput,
+    Receipt,
+    ReceiptIndex,
+    parse_receipt,
+    read_receipt_file,
+)
+
+from .file_extra import read_file
+
+GALAXUS_TEXT = ('Wed, 12 Apr 2023 10:40:49 +0000 (UTC)\n' + '1×\n' +
+                'Burgerstein\n' + 'Omega 3 DHA (100 Stück, Tabletten)\n' +
+                '39.20\n' + 'Gesamtbetrag\n' + '39.20\n\n' +
+                'Zahlungsmittel:PayPal\n')
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(receipts))
+    return tests
+
+
+class ParseReceiptTestCase(unittest.TestCase):
+
+    def test_parses_galaxus(self):
+        receipt = parse_receipt('galaxus',
+                                'Danke für deine Bestellung 85231628.galaxus',
+                                GALAXUS_TEXT)
+
+        self.assertEqual(receipt.subject,
+                         'Danke für deine Bestellung 85231628')
+        self.assertEqual(receipt.day, date(2023, 4, 12))
+        self.assertEqual(receipt.amount, '39.20')
+
+    def test_parses_google_play(self):
+        receipt = parse_receipt(
+            'google_play', 'Your Google Play Order Receipt.email',
+            read_file('test/data/google-play-mail-2023-05-04-contents.txt'))
+
+        self.assertEqual(receipt.day, date(2023, 5, 4))
+        self.assertEqual(receipt.amount, 'CHF 15.90')
+
+    def test_parses_patreon(self):
+        receipt = parse_receipt('patreon', 'patreon_1681296049000.txt',
+                                'You paid $5.00 to a creator.')
+
+        self.assertEqual(receipt.day, date.fromtimestamp(1681296049))
+        self.assertEqual(receipt.amount, '$5.00')
+
+    def test_tolerates_unknown_layouts(self):
+        receipt = parse_receipt('galaxus', 'Bestellung.galaxus', 'Hallo')
+
+        self.assertIsNone(receipt.day)
+        self.assertIsNone(receipt.amount)
+
+
+class ReceiptIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = ReceiptIndex(
+            pathlib.Path(self.tmp_dir.name) / 'receipts.sqlite3')
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_finds_receipts_by_text(self):
+        self.index.add(
+            Receipt('galaxus', 'Bestellung 1', 'Burgerstein Omega 3',
+                    date(2023, 3, 14), '39.20'))
+        self.index.add(
+            Receipt('ubereats', 'Order', 'Pizza Margherita',
+                    date(2023, 4, 1), 'CHF 20.50'))
+
+        hits = self.index.search('omega')
+
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].provider, 'galaxus')
+        self.assertEqual(hits[0].day, date(2023, 3, 14))
+        self.assertEqual(hits[0].amount, '39.20')
+        self.assertEqual(hits[0].snippet, 'Burgerstein [Omega] 3')
+
+    def test_ignores_diacritics(self):
+        self.index.add(Receipt('galaxus', 'Bestellung', 'Schutzhülle', None,
+                               None))
+
+        self.assertEqual(len(self.index.search('schutzhulle')), 1)
+
+    def test_filters_by_provider_and_date(self):
+        for day in [date(2023, 2, 28), date(2023, 3, 15), date(2023, 4, 1)]:
+            self.index.add(
+                Receipt('galaxus', f'Bestellung {day}', 'Kabel', day, None))
+        self.index.add(
+            Receipt('patreon', 'patreon_1', 'Kabel', date(2023, 3, 2), None))
+
+        hits = self.index.search('kabel',
+                                 provider='galaxus',
+                                 start=date(2023, 3, 1),
+                                 end=date(2023, 3, 31))
+
+        self.assertEqual([h.day for h in hits], [date(2023, 3, 15)])
+
+    def test_indexes_a_receipt_once(self):
+        receipt = Receipt('galaxus', 'Bestellung', 'Kabel', None, None)
+
+        self.assertTrue(self.index.add(receipt))
+        self.assertFalse(self.index.add(receipt))
+        self.assertEqual(len(self.index.search('kabel')), 1)
+
+    def test_indexes_saved_receipts_and_archive_links(self):
+        archive = Archive(pathlib.Path(self.tmp_dir.name) / 'archive')
+        output = IndexingOutput(archive, self.index)
+
+        output.save('galaxus', 'Bestellung 1.galaxus', GALAXUS_TEXT.encode())
+        link = archive.save('ubereats',
+                            'Wed, 12 Apr 2023 18:00:00 +0200.ubereats',
+                            b'Pizza CHF 20.50')
+        output.save('easyride', 'receipt.pdf', b'%PDF')
+
+        self.assertEqual(len(self.index.search('burgerstein')), 1)
+        self.assertEqual(self.index.search('pizza'), [])
+        self.assertIsNone(read_receipt_file(archive.directory / 'objects'))
+        self.assertEqual(self.index.add_all([read_receipt_file(link)] * 2), 1)
+        self.assertEqual(self.index.search('pizza')[0].amount, 'CHF 20.50')
+
+
+class ReceiptsCommandsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tmp_dir.name)
+        self.config = self.directory / 'fetcher.json'
+        self.config.write_text(json.dumps({'logging_file': None}))
+        self.runner = CliRunner()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def invoke(self, *args):
+        return self.runner.invoke(tool.cli,
+                                  [f'--config_file={self.config}', *args],
+                                  obj={},
+                                  catch_exceptions=False)
+
+    def test_indexes_and_searches_receipts(self):
+        downloads = self.directory / 'downloads'
+        downloads.mkdir()
+        (downloads / 'Danke für deine Bestellung 1.galaxus').write_text(
+            GALAXUS_TEXT, encoding='utf-8')
+        (downloads / 'statement.csv').write_text('Date,Amount\n')
+
+        result = self.invoke('receipts-index', str(downloads))
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('Indexed 1 new receipts.', result.output)
+        result = self.invoke('receipts-search', 'burgerstein')
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('2023-04-12 galaxus', result.stdout)
+        self.assertIn('Danke für deine Bestellung 1', result.stdout)
+
+    def test_rejects_invalid_queries(self):
+        result = self.invoke('receipts-search', '"unterminated')
+
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn('Invalid value for QUERY', result.output)
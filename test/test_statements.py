@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import doctest
+import io
+import json
+import unittest
+from datetime import date
+from decimal import Decimal
+
+from fetcher import statements
+from fetcher.statements import Record, Statement, from_mbank, write_jsonl
+
+from .file_extra import read_file
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(statements))
+    return tests
+
+
+def make_statement() -> Statement:
+    statement = Statement()
+    statement.append('transaction', 19480, -150000, 'PLN', 'Kino')
+    statement.append('transaction', 19481, 0, 'PLN', 'Przelew „zwrot”')
+    statement.append('balance', 19481, 121745200, 'CHF', 'Finpension')
+    return statement
+
+
+class StatementTestCase(unittest.TestCase):
+
+    def test_normalizes_mbank_output(self):
+        statement = from_mbank(
+            read_file('test/data/mbank-transactions-2023-04-30-output.csv').
+            encode('utf-8'))
+
+        records = list(statement)
+        self.assertEqual(
+            records[0],
+            Record('transaction', date(2023, 4, 28), Decimal('-15'), 'PLN',
+                   'RoŚŁĄ'))
+        self.assertEqual(len(statement.descriptions.values), 1)
+
+    def test_writes_jsonl(self):
+        f = io.BytesIO()
+
+        write_jsonl(make_statement(), f)
+
+        lines = [json.loads(line) for line in f.getvalue().splitlines()]
+        self.assertEqual(
+            lines[0], {
+                'kind': 'transaction',
+                'day': '2023-05-03',
+                'amount': '-15',
+                'currency': 'PLN',
+                'description': 'Kino'
+            })
+        self.assertEqual(lines[1]['amount'], '0')
+        self.assertEqual(lines[1]['description'], 'Przelew „zwrot”')
+        self.assertEqual(lines[2]['amount'], '12174.52')
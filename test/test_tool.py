@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import pkgutil
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import click
+
+import fetcher.commands
+from fetcher import tool
+
+
+class LazyGroupTestCase(unittest.TestCase):
+
+    def test_registry_matches_commands(self):
+        ctx = click.Context(tool.cli)
+        for name, lazy_command in tool.COMMANDS.items():
+            with self.subTest(name=name):
+                command = tool.cli.get_command(ctx, name)
+                assert command is not None
+                self.assertEqual(command.name, name)
+                self.assertEqual(command.get_short_help_str(limit=1000),
+                                 lazy_command.short_help)
+
+    def test_registry_covers_all_command_modules(self):
+        registered_modules = {
+            c.import_path.split(":")[0]
+            for c in tool.COMMANDS.values()
+        }
+        for module in pkgutil.iter_modules(fetcher.commands.__path__):
+            self.assertIn(f"fetcher.commands.{module.name}",
+                          registered_modules)
+
+    def test_unknown_command(self):
+        self.assertIsNone(
+            tool.cli.get_command(click.Context(tool.cli), "no-such-command"))
+
+    def test_help_does_not_import_commands(self):
+        # Run in a fresh interpreter, because other tests import providers.
+        script = textwrap.dedent("""
+            import sys
+            from click.testing import CliRunner
+            from fetcher import tool
+            result = CliRunner().invoke(tool.cli, ["--help"], obj={})
+            assert result.exit_code == 0, result.output
+            assert "pull-bcge" in result.output, result.output
+            loaded = [m for m in ("fetcher.commands.bcge", "playwright", "bs4",
+                                  "onepassword", "splitwise")
+                      if m in sys.modules]
+            assert not loaded, loaded
+            """)
+        subprocess.run([sys.executable, "-c", script], check=True)
+
+    def test_completion_lists_registered_commands(self):
+        ctx = click.Context(tool.cli)
+        items = tool.cli.shell_complete(ctx, "pull-g")
+        self.assertEqual([i.value for i in items],
+                         ["pull-galaxus", "pull-google-play-mail"])
+        self.assertEqual(items[0].help,
+                         "Fetches Digitec-Galaxus receipts in text format.")
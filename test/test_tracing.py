@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import pathlib
+import tempfile
+import unittest
+
+from fetcher import tracing
+
+
+@tracing.traced
+async def step(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+@tracing.traced
+def failing_step() -> None:
+    raise ValueError("boom")
+
+
+class TracingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.trace_path = pathlib.Path(self.tmp_dir.name) / "trace.json"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_spans(self) -> list[dict]:
+        with open(self.trace_path) as f:
+            return [
+                e for e in json.load(f)["traceEvents"] if e["ph"] == "X"
+            ]
+
+    def test_spans_are_no_ops_without_a_recording(self):
+        with tracing.span("untraced"):
+            pass
+        self.assertEqual(asyncio.run(step(0)), "done")
+        self.assertIsNone(tracing.playwright_trace_path())
+
+    def test_records_spans(self):
+        with tracing.record(self.trace_path):
+            with tracing.span("outer", provider="test"):
+                asyncio.run(step(0.01))
+        spans = {s["name"]: s for s in self.read_spans()}
+        self.assertEqual(set(spans), {"outer", "test.test_tracing.step"})
+        self.assertEqual(spans["outer"]["args"], {"provider": "test"})
+        self.assertGreaterEqual(spans["test.test_tracing.step"]["dur"],
+                                10_000)
+
+    def test_concurrent_tasks_get_separate_tracks(self):
+
+        async def run():
+            await asyncio.gather(step(0.01), step(0.01))
+
+        with tracing.record(self.trace_path):
+            asyncio.run(run())
+        tids = {s["tid"] for s in self.read_spans()}
+        self.assertEqual(len(tids), 2)
+
+    def test_records_errors(self):
+        with tracing.record(self.trace_path):
+            with self.assertRaises(ValueError):
+                failing_step()
+        [span] = self.read_spans()
+        self.assertEqual(span["args"], {"error": "ValueError('boom')"})
+
+    def test_exposes_playwright_trace_path(self):
+        zip_path = self.trace_path.with_suffix(".zip")
+        with tracing.record(self.trace_path, zip_path):
+            self.assertEqual(tracing.playwright_trace_path(), zip_path)
+        self.assertIsNone(tracing.playwright_trace_path())
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import doctest
+import json
+import pathlib
+import tempfile
+import unittest
+from datetime import date
+
+from fetcher import watermarks
+from fetcher.dateutils import DateRange
+from fetcher.watermarks import WatermarkStore
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(watermarks))
+    return tests
+
+
+class WatermarkStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.tmp_dir.name) / 'state' / 'wm.json'
+        self.store = WatermarkStore(self.path)
+        self.default = DateRange(date(2024, 3, 1), date(2024, 6, 10))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_uses_the_default_without_a_watermark(self):
+        self.assertIsNone(self.store.get('bcge'))
+        self.assertEqual(self.store.window('bcge', self.default),
+                         self.default)
+
+    def test_starts_before_the_watermark(self):
+        self.store.record('bcge', DateRange(date(2024, 1, 1),
+                                            date(2024, 6, 1)))
+
+        self.assertEqual(json.loads(self.path.read_text()),
+                         {'bcge': '2024-06-01'})
+        self.assertEqual(self.store.window('bcge', self.default),
+                         DateRange(date(2024, 5, 25), date(2024, 6, 10)))
+        self.assertEqual(self.store.window('bcge', self.default, full=True),
+                         self.default)
+        self.assertIsNone(self.store.get('ib.activity'))
+
+    def test_moves_only_forward_and_without_gaps(self):
+        self.store.record('ib', DateRange(date(2024, 1, 1), date(2024, 6, 1)))
+
+        self.store.record('ib', DateRange(date(2024, 1, 1), date(2024, 5, 1)))
+        self.assertEqual(self.store.get('ib'), date(2024, 6, 1))
+        self.store.record('ib', DateRange(date(2024, 6, 5),
+                                          date(2024, 6, 10)))
+        self.assertEqual(self.store.get('ib'), date(2024, 6, 1))
+        self.store.record('ib', DateRange(date(2024, 6, 2),
+                                          date(2024, 6, 10)))
+        self.assertEqual(self.store.get('ib'), date(2024, 6, 10))
@@ -1,21 +1,35 @@
-pull_bcge  # unused function (fetcher/tool.py:107)
-pull_bcgecc  # unused function (fetcher/tool.py:124)
-coop_supercard_pull  # unused function (fetcher/tool.py:138)
-cs_send_wire_to_ib  # unused function (fetcher/tool.py:151)
-wire_instructions_csv  # unused variable (fetcher/tool.py:156)
-degiro_account_pull  # unused function (fetcher/tool.py:166)
-degiro_portfolio_pull  # unused function (fetcher/tool.py:172)
-pull_easyride_receipts  # unused function (fetcher/tool.py:189)
-pull_finpension  # unused function (fetcher/tool.py:204)
-decode_ib_wire_instructions  # unused function (fetcher/tool.py:222)
-ib_cancel_pending_deposits  # unused function (fetcher/tool.py:235)
-ib_activity_pull  # unused function (fetcher/tool.py:256)
-ib_set_up_incoming_deposit  # unused function (fetcher/tool.py:278)
-pull_mbank  # unused function (fetcher/tool.py:329)
-pull_mbank_helper  # unused function (fetcher/tool.py:341)
-revolut_pull  # unused function (fetcher/tool.py:348)
-pull_splitwise  # unused function (fetcher/tool.py:371)
-pull_galaxus  # unused function (fetcher/tool.py:383)
-pull_google_play_mail  # unused function (fetcher/tool.py:403)
-pull_patreon  # unused function (fetcher/tool.py:423)
-pull_uber_eats  # unused function (fetcher/tool.py:438)
+pull_bcge  # unused function (fetcher/commands/bcge.py:14)
+pull_bcgecc  # unused function (fetcher/commands/bcgecc.py:13)
+coop_supercard_pull  # unused function (fetcher/commands/coop_supercard.py:8)
+degiro_account_pull  # unused function (fetcher/commands/degiro.py:19)
+degiro_portfolio_pull  # unused function (fetcher/commands/degiro.py:25)
+degiro_pull  # unused function (fetcher/commands/degiro.py:31)
+pull_easyride_receipts  # unused function (fetcher/commands/easyride.py:12)
+pull_finpension  # unused function (fetcher/commands/finpension.py:12)
+pull_galaxus  # unused function (fetcher/commands/galaxus.py:13)
+pull_google_play_mail  # unused function (fetcher/commands/google_play_mail.py:13)
+cs_send_wire_to_ib  # unused function (fetcher/commands/ib.py:18)
+wire_instructions_csv  # unused variable (fetcher/commands/ib.py:22)
+decode_ib_wire_instructions  # unused function (fetcher/commands/ib.py:32)
+ib_cancel_pending_deposits  # unused function (fetcher/commands/ib.py:45)
+ib_activity_pull  # unused function (fetcher/commands/ib.py:66)
+ib_activity_backfill  # unused function (fetcher/commands/ib.py:88)
+ib_set_up_incoming_deposit  # unused function (fetcher/commands/ib.py:138)
+ledger_merge  # unused function (fetcher/commands/ledger.py:13)
+ledger_export  # unused function (fetcher/commands/ledger.py:48)
+receipts_index  # unused function (fetcher/commands/receipts.py:13)
+receipts_search  # unused function (fetcher/commands/receipts.py:40)
+pull_mbank  # unused function (fetcher/commands/mbank.py:13)
+pull_patreon  # unused function (fetcher/commands/patreon.py:12)
+revolut_pull  # unused function (fetcher/commands/revolut.py:13)
+pull_splitwise  # unused function (fetcher/commands/splitwise.py:12)
+pull_uber_eats  # unused function (fetcher/commands/ubereats.py:12)
+selector  # unused variable (fetcher/playwrightutils.py:110)
+attribute  # unused variable (fetcher/playwrightutils.py:112)
+multiple  # unused variable (fetcher/playwrightutils.py:114)
+_.get_command  # unused method (fetcher/tool.py:135)
+_.format_commands  # unused method (fetcher/tool.py:145)
+ALLOC  # unused variable (fetcher/profiling.py:29)
+HAR_DIRECTORY_DEFAULT  # unused variable (fetcher/har.py:22)
+_.size  # unused attribute (fetcher/bundle.py:43)
+_.mtime  # unused attribute (fetcher/bundle.py:44)